@@ -1,49 +1,222 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.exc import SQLAlchemyError
 from app.core.config import settings
-from app.schemas.query import QueryRequest, QueryResponse, QueryExecuteRequest, QueryExecuteResponse
+from app.schemas.query import (
+    QueryRequest, QueryResponse, QueryExecuteRequest, QueryExecuteResponse,
+    BatchQueryRequest, BatchQueryItem, BatchQueryResponse
+)
 from app.services.llm_service import enhanced_llm_service
-from app.db.database import get_db, get_db_uri, engine
+from app.services.llm_scheduler import SchedulerRejected, current_caller
+from app.services.query_gate import query_gate
+from app.services.result_stream import ndjson_stream, json_stream
+from app.services.database_registry import (
+    database_registry, current_database, DatabaseContext, UnknownDatabase, DEFAULT_DATABASE
+)
+from app.db.database import get_db, SessionLocal
 from app.db.models import QueryHistory
-import pandas as pd
+import json
 
 router = APIRouter()
 
+def _save_history(db: Session, natural_query: str, sql: str, status: str = "success"):
+    """Persist a generated query to the history table"""
+    history = QueryHistory(
+        natural_query=natural_query,
+        generated_sql=sql,
+        status=status
+    )
+    db.add(history)
+    db.commit()
+
+def _gate_sql(sql: str, engine, streaming: bool = False):
+    """Run the pre-execution gate; returns (sql_to_run, report or None when disabled).
+    Streamed results are not limited, only checked against the streaming row ceiling."""
+    if not settings.sql_gate_enabled:
+        return sql, None
+    if streaming:
+        gated_sql, report = query_gate.analyze(sql, engine, inject_limit=False, max_rows=settings.sql_stream_max_rows)
+    else:
+        gated_sql, report = query_gate.analyze(sql, engine)
+    if report["verdict"] != "ok":
+        print(f"🚧 Query gate: {report['verdict']} ({'; '.join(report['reasons'])})")
+    return gated_sql, report
+
+def _identify_caller(http_request: Request):
+    """Tag LLM work with the API caller so the scheduler can share capacity fairly"""
+    caller = http_request.headers.get("x-client-id")
+    if not caller and http_request.client:
+        caller = http_request.client.host
+    current_caller.set(caller or "anonymous")
+
+async def select_database(database: Optional[str] = None):
+    """Resolve the `database` query parameter and make it the target of this request,
+    keeping it open until the request is done"""
+    try:
+        db_context = database_registry.acquire(database or DEFAULT_DATABASE)
+    except UnknownDatabase:
+        raise HTTPException(status_code=404, detail=f"Unknown database '{database}'")
+    current_database.set(db_context.name)
+    try:
+        yield db_context
+    finally:
+        database_registry.release(db_context)
+
+class _HeldStreamingResponse(StreamingResponse):
+    """StreamingResponse that keeps its database open until the response is over.
+
+    The body can outlive the request's dependencies, so the hold is taken when
+    the response is built and released when it has been served, however that
+    ends: finished, failed, or the client gone before the body ever started.
+    """
+
+    def __init__(self, db_context: DatabaseContext, content, on_close=None, **kwargs):
+        super().__init__(content, **kwargs)
+        self.db_context = database_registry.acquire(db_context.name)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                # A body that never started never ran its own cleanup
+                await self.body_iterator.aclose()
+                if self.on_close is not None:
+                    await self.on_close()
+            finally:
+                database_registry.release(self.db_context)
+
 @router.post("/generate-sql", response_model=QueryResponse)
-async def generate_sql_endpoint(request: QueryRequest, db: Session = Depends(get_db)):
+async def generate_sql_endpoint(request: QueryRequest, http_request: Request, db: Session = Depends(get_db),
+                                db_context: DatabaseContext = Depends(select_database)):
+    _identify_caller(http_request)
     try:
         # Generate SQL using RAG + LLM
-        sql = enhanced_llm_service.generate_sql(request.natural_query, get_db_uri())
+        sql = await enhanced_llm_service.agenerate_sql(request.natural_query, db_context.url)
         
-        # Save to history
-        history = QueryHistory(
-            natural_query=request.natural_query,
-            generated_sql=sql,
-            status="success"
-        )
-        db.add(history)
-        db.commit()
+        # Add a LIMIT if needed and attach the planner's cost estimate
+        sql, gate = await run_in_threadpool(_gate_sql, sql, db_context.engine)
         
-        return QueryResponse(sql=sql, status="success")
+        # Save to history off the event loop
+        await run_in_threadpool(_save_history, db, request.natural_query, sql)
+        
+        return QueryResponse(sql=sql, status="success", gate=gate)
+    
+    except SchedulerRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     
     except Exception as e:
         print(f"SQL Generation Error: {str(e)}")
         return QueryResponse(sql="", status="error", error=str(e))
 
+def _save_history_bulk(db: Session, rows: list):
+    """Persist many generated queries in a single transaction"""
+    db.add_all([
+        QueryHistory(natural_query=natural_query, generated_sql=sql, status=status)
+        for natural_query, sql, status in rows
+    ])
+    db.commit()
+
+def _record_history(natural_query: str, sql: str, status: str = "success"):
+    """Persist history with a fresh session, for work that outlives the request scope"""
+    db = SessionLocal()
+    try:
+        _save_history(db, natural_query, sql, status)
+    finally:
+        db.close()
+
+@router.post("/generate-sql/stream")
+async def generate_sql_stream_endpoint(request: QueryRequest, http_request: Request,
+                                       db_context: DatabaseContext = Depends(select_database)):
+    """Stream SQL generation as Server-Sent Events"""
+    # Refuse before the 200 and the event stream start, like the non-streaming endpoint
+    try:
+        enhanced_llm_service.scheduler.check()
+    except SchedulerRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    
+    async def event_stream():
+        # The response body is produced outside the handler's context
+        current_database.set(db_context.name)
+        _identify_caller(http_request)
+        try:
+            async for event, data in enhanced_llm_service.astream_sql(request.natural_query, db_context.url):
+                if event == "done":
+                    data["sql"], data["gate"] = await run_in_threadpool(_gate_sql, data["sql"], db_context.engine)
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+                if event == "done":
+                    await run_in_threadpool(_record_history, request.natural_query, data["sql"])
+        except SchedulerRejected as e:
+            # The queue filled up after the check above; the status line is already sent
+            yield f"event: error\ndata: {json.dumps({'status': 'error', 'error': str(e), 'retry_after': e.retry_after})}\n\n"
+        except Exception as e:
+            print(f"SQL Streaming Error: {str(e)}")
+            yield f"event: error\ndata: {json.dumps({'status': 'error', 'error': str(e)})}\n\n"
+    
+    return _HeldStreamingResponse(
+        db_context,
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/generate-sql/batch", response_model=BatchQueryResponse)
+async def generate_sql_batch_endpoint(request: BatchQueryRequest, http_request: Request, db: Session = Depends(get_db),
+                                      db_context: DatabaseContext = Depends(select_database)):
+    if len(request.natural_queries) > settings.batch_max_questions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch size {len(request.natural_queries)} exceeds limit of {settings.batch_max_questions}"
+        )
+    
+    _identify_caller(http_request)
+    try:
+        generated = await enhanced_llm_service.agenerate_sql_batch(request.natural_queries, db_context.url)
+        
+        items = [
+            BatchQueryItem(natural_query=question, sql=sql, status=status, error=error)
+            for question, (sql, status, error) in zip(request.natural_queries, generated)
+        ]
+        
+        # One bulk insert for the whole batch
+        await run_in_threadpool(
+            _save_history_bulk, db,
+            [(item.natural_query, item.sql, item.status) for item in items]
+        )
+        
+        return BatchQueryResponse(results=items, status="success")
+    
+    except Exception as e:
+        print(f"Batch SQL Generation Error: {str(e)}")
+        return BatchQueryResponse(results=[], status="error", error=str(e))
+
 @router.post("/execute-sql", response_model=QueryExecuteResponse)
-async def execute_sql_endpoint(request: QueryExecuteRequest):
+async def execute_sql_endpoint(request: QueryExecuteRequest, db_context: DatabaseContext = Depends(select_database)):
     try:
-        # Execute SQL and return results
-        df = pd.read_sql(request.sql, engine)
-        results = df.to_dict('records')
-        columns = df.columns.tolist()
+        # Refuse queries the planner expects to be too expensive
+        sql, gate = await run_in_threadpool(_gate_sql, request.sql, db_context.engine)
+        if gate is not None and gate["verdict"] == "rejected":
+            return QueryExecuteResponse(
+                results=[],
+                columns=[],
+                status="error",
+                error=f"Query rejected by cost gate: {'; '.join(gate['reasons'])}",
+                gate=gate
+            )
+        
+        # Execute on the async pool so a slow query does not hold up other requests
+        columns, rows, _ = await db_context.execute(sql)
+        results = [dict(zip(columns, row)) for row in rows]
         
         return QueryExecuteResponse(
             results=results,
             columns=columns,
-            status="success"
+            status="success",
+            gate=gate
         )
     
     except Exception as e:
@@ -55,23 +228,57 @@ async def execute_sql_endpoint(request: QueryExecuteRequest):
             error=str(e)
         )
 
+@router.post("/execute-sql/stream")
+async def execute_sql_stream_endpoint(request: QueryExecuteRequest, format: str = "ndjson",
+                                      db_context: DatabaseContext = Depends(select_database)):
+    """Stream query results from a server-side cursor as NDJSON or as one chunked JSON document"""
+    if format not in ("ndjson", "json"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'json'")
+    
+    sql, gate = await run_in_threadpool(_gate_sql, request.sql, db_context.engine, True)
+    if gate is not None and gate["verdict"] == "rejected":
+        raise HTTPException(
+            status_code=400,
+            detail={"error": f"Query rejected by cost gate: {'; '.join(gate['reasons'])}", "gate": gate}
+        )
+    
+    # Start the query before answering so errors still get a proper status code
+    batches = db_context.stream(sql, settings.sql_stream_fetch_size)
+    try:
+        columns, _ = await batches.__anext__()
+    except Exception as e:
+        await batches.aclose()
+        print(f"SQL Execution Error: {str(e)}")
+        raise HTTPException(status_code=400, detail={"error": str(e), "gate": gate})
+    
+    if format == "ndjson":
+        body, media_type = ndjson_stream(columns, batches, gate), "application/x-ndjson"
+    else:
+        body, media_type = json_stream(columns, batches, gate), "application/json"
+    return _HeldStreamingResponse(
+        db_context,
+        body,
+        on_close=batches.aclose,
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/schema")
-async def get_schema():
-    """Get database schema information"""
+async def get_schema(db_context: DatabaseContext = Depends(select_database)):
+    """Get database schema information from the shared catalog snapshot"""
     try:
-        inspector = inspect(engine)
-        
-        schema_info = {}
-        for table_name in inspector.get_table_names():
-            columns = inspector.get_columns(table_name)
-            schema_info[table_name] = [
+        snapshot = await run_in_threadpool(lambda: db_context.catalog.snapshot)
+        schema_info = {
+            table_name: [
                 {
                     "name": col["name"],
-                    "type": str(col["type"]),
+                    "type": col["type"],
                     "nullable": col["nullable"]
                 }
                 for col in columns
             ]
+            for table_name, columns in snapshot.schema_info.items()
+        }
         
         return {"schema": schema_info, "status": "success"}
     
@@ -79,49 +286,65 @@ async def get_schema():
         return {"schema": {}, "status": "error", "error": str(e)}
 
 @router.get("/schema/reload")
-async def reload_schema():
+async def reload_schema(db_context: DatabaseContext = Depends(select_database)):
     """Reload database schema"""
     try:
-        # Import here to avoid circular imports
-        from app.services.rag_service import rag_service
+        rag_service = db_context.rag
+        
+        # Cached answers are keyed on the schema fingerprint, so a changed
+        # schema invalidates them on the next lookup
+        try:
+            await run_in_threadpool(rag_service.refresh_schema_fingerprint)
+        except Exception as e:
+            print(f"Warning: Could not refresh schema fingerprint: {e}")
         
-        # Clear and repopulate knowledge base
+        # Re-index only the tables whose fingerprint changed
+        knowledge_sync = None
         try:
-            rag_service.populate_knowledge_base()
+            knowledge_sync = await run_in_threadpool(rag_service.populate_knowledge_base, rag_service.schema_info)
         except Exception as e:
             print(f"Warning: Could not refresh knowledge base: {e}")
         
-        # Get fresh schema info
-        engine_local = create_engine(settings.database_url)
-        inspector = inspect(engine_local)
-        
-        schema_info = []
-        for table_name in inspector.get_table_names():
-            columns = inspector.get_columns(table_name)
-            schema_info.append({
-                "name": table_name,
-                "columns": [
-                    {
-                        "name": col["name"],
-                        "type": str(col["type"]),
-                        "nullable": col["nullable"],
-                        "primary_key": col.get("primary_key", False)
-                    }
-                    for col in columns
-                ]
-            })
+        # The fingerprint refresh above reloaded the shared catalog snapshot
+        schema_info = await run_in_threadpool(lambda: db_context.catalog.snapshot.describe())
         
         return {
             "success": True,
             "message": f"Schema reloaded successfully. Found {len(schema_info)} tables.",
-            "tables": schema_info
+            "tables": schema_info,
+            "knowledge_sync": knowledge_sync
         }
     except Exception as e:
         print(f"Schema reload error: {e}")
         raise HTTPException(status_code=500, detail=f"Schema reload failed: {str(e)}")
 
+@router.get("/databases")
+async def list_databases():
+    """Configured databases and the pools of the ones currently open"""
+    return {"databases": database_registry.get_stats(), "status": "success"}
+
+@router.get("/llm/status")
+async def get_llm_status():
+    """Get LLM, cache, hedging, circuit breaker and scheduler status"""
+    return {"llm": enhanced_llm_service.get_llm_status(), "status": "success"}
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Get SQL answer cache and embedding cache statistics"""
+    return {
+        "cache": enhanced_llm_service.cache.get_stats(),
+        "embeddings": enhanced_llm_service.rag.embedder.get_stats(),
+        "status": "success"
+    }
+
+@router.get("/knowledge/stats")
+async def get_knowledge_stats(verify: bool = False, db_context: DatabaseContext = Depends(select_database)):
+    """Get knowledge base item counts by type; verify=true recounts them from the collection"""
+    stats = await run_in_threadpool(db_context.rag.get_knowledge_stats, verify)
+    return {"knowledge": stats, "status": "success"}
+
 @router.post("/execute-custom-sql")
-async def execute_custom_sql(request: dict):
+async def execute_custom_sql(request: dict, db_context: DatabaseContext = Depends(select_database)):
     """Execute custom PostgreSQL commands"""
     try:
         sql_query = request.get("sql", "").strip()
@@ -137,46 +360,41 @@ async def execute_custom_sql(request: dict):
             if keyword in sql_upper:
                 raise HTTPException(status_code=403, detail=f"Command '{keyword}' is not allowed")
         
-        engine_local = create_engine(settings.database_url)
-        
-        with engine_local.connect() as conn:
-            if sql_upper.strip().startswith("SELECT"):
-                # SELECT query
-                result = conn.execute(text(sql_query))
-                rows = result.fetchall()
-                columns = list(result.keys()) if rows else []
-                
-                data = []
-                for row in rows:
-                    row_dict = {}
-                    for i, col in enumerate(columns):
-                        value = row[i]
-                        # Handle datetime and decimal types
-                        if hasattr(value, 'isoformat'):
-                            value = value.isoformat()
-                        elif hasattr(value, '__float__'):
-                            value = float(value)
-                        row_dict[col] = value
-                    data.append(row_dict)
-                
-                return {
-                    "success": True,
-                    "type": "select",
-                    "columns": columns,
-                    "data": data,
-                    "row_count": len(data)
-                }
-            else:
-                # Non-SELECT query
-                result = conn.execute(text(sql_query))
-                conn.commit()
-                
-                return {
-                    "success": True,
-                    "type": "modification",
-                    "message": f"Query executed successfully. Rows affected: {result.rowcount if hasattr(result, 'rowcount') else 'N/A'}",
-                    "rows_affected": result.rowcount if hasattr(result, 'rowcount') else None
-                }
+        if sql_upper.strip().startswith("SELECT"):
+            # SELECT query
+            columns, rows, _ = await db_context.execute(sql_query)
+            columns = columns if rows else []
+            
+            data = []
+            for row in rows:
+                row_dict = {}
+                for i, col in enumerate(columns):
+                    value = row[i]
+                    # Handle datetime and decimal types
+                    if hasattr(value, 'isoformat'):
+                        value = value.isoformat()
+                    elif hasattr(value, '__float__'):
+                        value = float(value)
+                    row_dict[col] = value
+                data.append(row_dict)
+            
+            return {
+                "success": True,
+                "type": "select",
+                "columns": columns,
+                "data": data,
+                "row_count": len(data)
+            }
+        else:
+            # Non-SELECT query
+            _, _, rowcount = await db_context.execute(sql_query, commit=True)
+            
+            return {
+                "success": True,
+                "type": "modification",
+                "message": f"Query executed successfully. Rows affected: {rowcount if rowcount is not None else 'N/A'}",
+                "rows_affected": rowcount
+            }
                 
     except Exception as e:
         print(f"SQL execution error: {e}")
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     database_url: str
@@ -7,6 +7,125 @@ class Settings(BaseSettings):
     google_api_key: Optional[str] = None
     secret_key: str
     
+    # SQL generation pipeline
+    llm_max_concurrency: int = 8
+    llm_request_timeout: float = 30.0
+    batch_max_questions: int = 500
+    batch_max_concurrency: int = 4
+    llm_model_state_path: str = "./llm_model.json"
+    prompt_token_budget: int = 1500
+    
+    # LLM provider ("gemini" or "stub" for local testing) and hedged requests
+    llm_provider: str = "gemini"
+    llm_hedging_enabled: bool = False
+    llm_hedge_percentile: float = 0.95
+    llm_hedge_min_delay: float = 0.5
+    llm_hedge_default_delay: float = 5.0
+    llm_hedge_models: str = ""
+    llm_stub_latency: float = 0.2
+    llm_stub_slow_rate: float = 0.0
+    llm_stub_slow_latency: float = 5.0
+    
+    # Circuit breaker and adaptive per-call timeouts around the LLM
+    llm_breaker_failure_threshold: float = 0.5
+    llm_breaker_min_requests: int = 10
+    llm_breaker_window_seconds: float = 60.0
+    llm_breaker_open_seconds: float = 30.0
+    llm_breaker_half_open_calls: int = 2
+    llm_breaker_slow_call_seconds: float = 20.0
+    llm_timeout_multiplier: float = 3.0
+    llm_timeout_min: float = 5.0
+    
+    # LLM scheduler: provider rate budgets (0 = unlimited) and queue limits
+    llm_requests_per_minute: float = 0
+    llm_tokens_per_minute: float = 0
+    llm_expected_output_tokens: int = 256
+    llm_queue_max_interactive: int = 100
+    llm_queue_max_batch: int = 1000
+    
+    # Rule-based fast path that answers simple questions without the LLM
+    intent_engine_enabled: bool = True
+    intent_confidence_threshold: float = 0.85
+    # Lowest confidence a match may have to be used as the fallback when the LLM fails
+    intent_fallback_min_confidence: float = 0.5
+    
+    # Pre-execution gate: EXPLAIN cost thresholds and default LIMIT for SELECTs
+    sql_gate_enabled: bool = True
+    sql_gate_default_limit: int = 1000
+    sql_gate_warn_cost: float = 100000.0
+    sql_gate_max_cost: float = 10000000.0
+    sql_gate_max_rows: float = 1000000.0
+    sql_gate_explain_timeout_ms: int = 2000
+    
+    # Streamed results (/execute-sql/stream): rows per server-side cursor fetch; no LIMIT is injected
+    sql_stream_fetch_size: int = 1000
+    sql_stream_max_rows: float = 100000000.0
+    
+    # Shared embedding engine: micro-batching and a content-hash cache on disk
+    embedding_model: str = "all-MiniLM-L6-v2"
+    embedding_cache_path: str = "./embedding_cache.db"
+    embedding_memory_entries: int = 10000
+    embedding_max_batch: int = 64
+    embedding_max_wait_ms: float = 5.0
+    
+    # Retrieval backend: "chroma" or the in-process "numpy" index
+    vector_backend: str = "chroma"
+    vector_index_path: str = "./vector_index"
+    vector_index_dtype: str = "float32"
+    
+    # Retrieval: "hybrid" (BM25 pre-filter + dense re-rank), "dense" or "lexical"
+    retrieval_mode: str = "hybrid"
+    lexical_candidates: int = 50
+    rrf_k: int = 60
+    
+    # Named databases besides database_url (served as "default"), as JSON: {"sales": "postgresql://..."}
+    databases: Dict[str, str] = {}
+    database_max_active: int = 8
+    database_pool_size: int = 5
+    database_max_overflow: int = 10
+    database_pool_recycle_seconds: int = 1800
+    database_pool_timeout_seconds: float = 10.0
+    # Run /execute-sql and /execute-custom-sql on an asyncio driver (asyncpg, aiosqlite) when one is available
+    database_async_execution: bool = True
+
+    # Schemas to introspect, comma-separated; empty means the connection's default schema
+    schema_catalog_schemas: str = ""
+    
+    # Sample rows for knowledge base context: parallel, time-boxed, narrow columns only
+    sample_rows: int = 3
+    sample_max_workers: int = 4
+    sample_statement_timeout_ms: int = 2000
+    sample_budget_seconds: float = 30.0
+    sample_tablesample_min_rows: int = 100000
+    sample_max_value_chars: int = 100
+    
+    # Join paths from the foreign-key graph
+    join_path_max_hops: int = 3
+    join_path_hub_degree: int = 50
+    join_path_max_tables: int = 4
+    
+    # Dictionary of low-cardinality text column values for grounding literals
+    value_index_enabled: bool = True
+    value_index_path: str = "./value_index.json"
+    value_index_max_distinct: int = 100
+    value_index_max_value_chars: int = 64
+    value_match_threshold: float = 0.5
+    value_match_limit: int = 5
+    
+    # Learned question -> SQL examples: capped, deduplicated by question similarity, written in batches
+    learned_examples_max: int = 2000
+    learned_examples_similarity: float = 0.95
+    learned_examples_batch_size: int = 20
+    learned_examples_flush_seconds: float = 30.0
+    learned_examples_half_life_days: float = 14.0
+    
+    # Semantic NL->SQL answer cache
+    sql_cache_enabled: bool = True
+    sql_cache_max_entries: int = 1000
+    sql_cache_max_bytes: int = 16 * 1024 * 1024
+    sql_cache_ttl_seconds: float = 3600.0
+    sql_cache_similarity_threshold: float = 0.92
+    
     class Config:
         env_file = ".env"
 
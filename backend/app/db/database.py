@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, MetaData, text
+from sqlalchemy import create_engine, make_url, MetaData, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
@@ -25,4 +25,31 @@ def test_connection():
         return True
     except Exception as e:
         print(f"Database connection failed: {e}")
-        return False
\ No newline at end of file
+        return False
+
+# Async drivers for the sync drivers a database_url may name
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+}
+
+def to_async_url(url: str):
+    """The same database with an asyncio driver, or None if there is none (or it would be a different database)"""
+    parsed = make_url(url)
+    if parsed.drivername in ASYNC_DRIVERS.values() or parsed.drivername == "postgresql+psycopg":
+        return url
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    if driver is None:
+        return None
+    if driver.startswith("sqlite") and parsed.database in (None, "", ":memory:"):
+        # A second in-memory connection would be an empty database
+        return None
+    query = dict(parsed.query)
+    if driver == "postgresql+asyncpg" and "sslmode" in query:
+        # asyncpg takes `ssl` instead of libpq's `sslmode`
+        query["ssl"] = query.pop("sslmode")
+    return parsed.set(drivername=driver, query=query).render_as_string(hide_password=False)
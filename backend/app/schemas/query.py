@@ -1,14 +1,36 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class QueryRequest(BaseModel):
     natural_query: str
 
+class QueryGateReport(BaseModel):
+    verdict: str
+    estimated_cost: Optional[float] = None
+    estimated_rows: Optional[float] = None
+    limit_injected: bool = False
+    reasons: List[str] = []
+
 class QueryResponse(BaseModel):
     sql: str
     status: str
     error: Optional[str] = None
+    gate: Optional[QueryGateReport] = None
+
+class BatchQueryRequest(BaseModel):
+    natural_queries: List[str]
+
+class BatchQueryItem(BaseModel):
+    natural_query: str
+    sql: str
+    status: str
+    error: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryItem]
+    status: str
+    error: Optional[str] = None
 
 class QueryExecuteRequest(BaseModel):
     sql: str
@@ -17,4 +39,5 @@ class QueryExecuteResponse(BaseModel):
     results: list
     columns: list
     status: str
-    error: Optional[str] = None
\ No newline at end of file
+    error: Optional[str] = None
+    gate: Optional[QueryGateReport] = None
\ No newline at end of file
@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import deque
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the circuit is open"""
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker driven by error rate and slow calls.
+
+    Outcomes are kept for a rolling time window. The circuit opens when at
+    least min_requests calls in the window fail (or exceed slow_call_seconds)
+    at failure_threshold or above. After open_seconds it goes half-open and
+    lets half_open_max_calls trial requests through: success closes it, any
+    failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: float = 0.5, min_requests: int = 10,
+                 window_seconds: float = 60.0, open_seconds: float = 30.0,
+                 half_open_max_calls: int = 2, slow_call_seconds: float = 20.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.min_requests = min_requests
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.slow_call_seconds = slow_call_seconds
+
+        self.state = self.CLOSED
+        self._outcomes = deque()      # (timestamp, failed)
+        self._opened_at = 0.0
+        self._trial_calls = 0
+        self._trial_successes = 0
+        self._lock = threading.Lock()
+
+        self.times_opened = 0
+        self.rejected = 0
+
+    def is_open(self) -> bool:
+        """True while calls would be refused, without reserving a trial slot"""
+        with self._lock:
+            self._maybe_half_open()
+            if self.state == self.OPEN:
+                return True
+            return self.state == self.HALF_OPEN and self._trial_calls >= self.half_open_max_calls
+
+    def allow_request(self) -> bool:
+        """Reserve permission for one call; every allowed call must be recorded"""
+        with self._lock:
+            self._maybe_half_open()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and self._trial_calls < self.half_open_max_calls:
+                self._trial_calls += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, latency: float = 0.0):
+        if latency > self.slow_call_seconds:
+            self.record_failure()
+            return
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._trial_successes += 1
+                if self._trial_successes >= self.half_open_max_calls:
+                    print(f"✅ Circuit '{self.name}' closed after successful trial calls")
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                return
+            self._add_outcome(False)
+
+    def record_failure(self):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._open()
+                return
+            self._add_outcome(True)
+            failures = sum(1 for _, failed in self._outcomes if failed)
+            total = len(self._outcomes)
+            if self.state == self.CLOSED and total >= self.min_requests and failures / total >= self.failure_threshold:
+                self._open()
+
+    def release(self):
+        """Give back a reserved call that ended without an outcome (e.g. cancelled)"""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._trial_calls > 0:
+                self._trial_calls -= 1
+
+    def get_state(self):
+        with self._lock:
+            self._maybe_half_open()
+            self._trim()
+            failures = sum(1 for _, failed in self._outcomes if failed)
+            return {
+                "state": self.state,
+                "window_requests": len(self._outcomes),
+                "window_failures": failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+                "retry_in_seconds": max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+                if self.state == self.OPEN else 0.0
+            }
+
+    def _open(self):
+        print(f"🔌 Circuit '{self.name}' opened, sending traffic to the fallback for {self.open_seconds}s")
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+        self._outcomes.clear()
+
+    def _maybe_half_open(self):
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            print(f"🔌 Circuit '{self.name}' half-open, allowing trial requests")
+            self.state = self.HALF_OPEN
+            self._trial_calls = 0
+            self._trial_successes = 0
+
+    def _add_outcome(self, failed: bool):
+        self._outcomes.append((time.monotonic(), failed))
+        self._trim()
+
+    def _trim(self):
+        cutoff = time.monotonic() - self.window_seconds
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
@@ -0,0 +1,396 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from sqlalchemy import create_engine, text
+from app.core.config import settings
+from app.db.database import engine as default_engine, to_async_url
+from app.services.schema_catalog import SchemaCatalog, schema_catalog
+from app.services.table_sampler import TableSampler, table_sampler
+from app.services.value_index import ValueIndex, value_index
+from app.services.rag_service import RAGService, rag_service
+from app.services.query_cache import SemanticQueryCache, query_cache
+from app.services.intent_engine import IntentEngine, intent_engine
+
+DEFAULT_DATABASE = "default"
+
+# Database the current request works against; set by the API from its `database` parameter
+current_database = ContextVar("current_database", default=DEFAULT_DATABASE)
+
+class UnknownDatabase(KeyError):
+    pass
+
+def _suffixed(path: str, name: str) -> str:
+    """./value_index.json -> ./value_index_sales.json"""
+    root, ext = os.path.splitext(path)
+    return f"{root}_{name}{ext}"
+
+class DatabaseContext:
+    """Everything bound to one named database: its pooled engines, catalog snapshot, sampler,
+    value dictionary, knowledge base collection, SQL cache and intent lexicon.
+
+    User queries run through execute() or stream() on an async engine
+    (asyncpg, aiosqlite) created on first use, so a slow query only holds its
+    own connection instead of a worker thread. Without an async driver they
+    fall back to the sync pool in a worker thread.
+    """
+
+    def __init__(self, name: str, url: str, engine, catalog, sampler, values, rag, cache, intents,
+                 pool_options: dict = None):
+        self.name = name
+        self.url = url
+        self.engine = engine
+        self.catalog = catalog
+        self.sampler = sampler
+        self.values = values
+        self.rag = rag
+        self.cache = cache
+        self.intents = intents
+        self.pool_options = pool_options or {}
+        self.opened_at = time.time()
+        self.last_used = time.monotonic()
+        # Requests, response streams and the warm-up thread holding this database open
+        self.users = 0
+        self._async_url = to_async_url(url) if settings.database_async_execution else None
+        self._async_engine = None
+        self._lock = threading.Lock()
+        self.execution_stats = {
+            "queries": 0, "errors": 0, "active": 0, "peak_active": 0,
+            "total_seconds": 0.0, "max_seconds": 0.0, "pool_wait_seconds": 0.0, "max_pool_wait_seconds": 0.0
+        }
+
+    @property
+    def async_engine(self):
+        """Async engine for user queries, or None if the dialect has no usable async driver"""
+        if self._async_engine is None and self._async_url is not None:
+            with self._lock:
+                if self._async_engine is None and self._async_url is not None:
+                    try:
+                        from sqlalchemy.ext.asyncio import create_async_engine
+
+                        self._async_engine = create_async_engine(self._async_url, pool_pre_ping=True, **self.pool_options)
+                        print(f"⚡ Async engine for '{self.name}' ({self._async_engine.dialect.driver})")
+                    except Exception as e:
+                        print(f"⚠️ No async driver for '{self.name}', executing in worker threads: {e}")
+                        self._async_url = None
+        return self._async_engine
+
+    @asynccontextmanager
+    async def connect(self):
+        """Async connection from the pool, timing the wait for it"""
+        start = time.perf_counter()
+        async with self.async_engine.connect() as conn:
+            waited = time.perf_counter() - start
+            self.execution_stats["pool_wait_seconds"] += waited
+            self.execution_stats["max_pool_wait_seconds"] = max(self.execution_stats["max_pool_wait_seconds"], waited)
+            yield conn
+
+    async def execute(self, sql: str, commit: bool = False):
+        """Run one statement; returns (columns, rows, rowcount)"""
+        stats = self.execution_stats
+        stats["queries"] += 1
+        stats["active"] += 1
+        stats["peak_active"] = max(stats["peak_active"], stats["active"])
+        start = time.perf_counter()
+        try:
+            if self.async_engine is None:
+                return await asyncio.to_thread(self._execute_sync, sql, commit)
+            async with self.connect() as conn:
+                result = await conn.execute(text(sql))
+                columns, rows = (list(result.keys()), result.fetchall()) if result.returns_rows else ([], [])
+                if commit:
+                    await conn.commit()
+                return columns, rows, result.rowcount
+        except Exception:
+            stats["errors"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stats["active"] -= 1
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+    async def stream(self, sql: str, fetch_size: int = 1000):
+        """Yield (columns, rows) batches from a server-side cursor; the first batch is empty and
+        arrives as soon as the query starts returning, so callers learn the columns (or the error) early"""
+        stats = self.execution_stats
+        stats["queries"] += 1
+        stats["active"] += 1
+        stats["peak_active"] = max(stats["peak_active"], stats["active"])
+        start = time.perf_counter()
+        try:
+            if self.async_engine is None:
+                batches = self._stream_sync(sql, fetch_size)
+                try:
+                    async for batch in batches:
+                        yield batch
+                finally:
+                    await batches.aclose()
+                return
+            async with self.connect() as conn:
+                # stream() keeps the cursor open on the server and fetches fetch_size rows at a time
+                result = await conn.stream(text(sql).execution_options(yield_per=fetch_size))
+                columns = list(result.keys())
+                yield columns, []
+                async for rows in result.partitions(fetch_size):
+                    yield columns, rows
+        except Exception:
+            stats["errors"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stats["active"] -= 1
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+    async def _stream_sync(self, sql: str, fetch_size: int):
+        # One dedicated thread, since a DBAPI cursor should stay on the thread that opened it
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"stream-{self.name}")
+        conn = None
+        try:
+            conn = await loop.run_in_executor(executor, self.engine.connect)
+            result = await loop.run_in_executor(
+                executor,
+                lambda: conn.execution_options(stream_results=True, yield_per=fetch_size).execute(text(sql))
+            )
+            columns = list(result.keys())
+            yield columns, []
+            while True:
+                rows = await loop.run_in_executor(executor, result.fetchmany, fetch_size)
+                if not rows:
+                    break
+                yield columns, rows
+        finally:
+            if conn is not None:
+                await loop.run_in_executor(executor, conn.close)
+            executor.shutdown(wait=False)
+
+    def _execute_sync(self, sql: str, commit: bool):
+        with self.engine.connect() as conn:
+            result = conn.execute(text(sql))
+            columns, rows = (list(result.keys()), result.fetchall()) if result.returns_rows else ([], [])
+            if commit:
+                conn.commit()
+            return columns, rows, result.rowcount
+
+    def close(self):
+        """Write buffered knowledge base changes and close the sync pool"""
+        try:
+            self.rag.flush()
+        except Exception as e:
+            print(f"⚠️ Could not flush the knowledge base of '{self.name}': {e}")
+        self.engine.dispose()
+        if self._async_engine is not None:
+            # Async connections can only be closed on their event loop; just drop the pool
+            self._async_engine.sync_engine.dispose(close=False)
+        print(f"🔌 Closed database '{self.name}'")
+
+    async def aclose(self):
+        """close(), closing the async pool's connections on the running loop"""
+        if self._async_engine is not None:
+            await self._async_engine.dispose()
+            self._async_engine = None
+        await asyncio.to_thread(self.close)
+
+    def get_stats(self):
+        stats = self.execution_stats
+        return {
+            "name": self.name,
+            "dialect": self.engine.dialect.name,
+            "pool": self.engine.pool.status(),
+            "async_pool": self._async_engine.pool.status() if self._async_engine is not None else None,
+            "execution": {
+                **stats,
+                "avg_seconds": round(stats["total_seconds"] / stats["queries"], 4) if stats["queries"] else None
+            },
+            "tables": len(self.catalog._snapshot.tables) if self.catalog._snapshot is not None else None,
+            "rag_ready": self.rag.ready,
+            "cache": self.cache.get_stats(),
+            "users": self.users,
+            "idle_seconds": round(time.monotonic() - self.last_used, 1)
+        }
+
+class DatabaseRegistry:
+    """Named database connections, opened on first use and kept warm while in use.
+
+    "default" is database_url and reuses the application's global engine,
+    catalog and knowledge base; other names come from the `databases`
+    setting. Each database gets one long-lived pooled engine, its own catalog
+    snapshot, value dictionary and vector collection (sql_knowledge_<name>),
+    so requests never create engines. At most max_active databases stay open;
+    opening another closes the least recently used idle one (never "default").
+    A database in use by acquire() is only closed once it is released.
+    """
+
+    def __init__(self, urls: dict, max_active: int = 8, pool_size: int = 5, max_overflow: int = 10,
+                 pool_recycle: int = 1800, pool_timeout: float = 10.0):
+        self.urls = {DEFAULT_DATABASE: settings.database_url, **(urls or {})}
+        self.max_active = max(1, max_active)
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_recycle = pool_recycle
+        self.pool_timeout = pool_timeout
+        self._active = OrderedDict()
+        self._active[DEFAULT_DATABASE] = DatabaseContext(
+            DEFAULT_DATABASE, settings.database_url, default_engine,
+            schema_catalog, table_sampler, value_index, rag_service, query_cache, intent_engine,
+            pool_options=self._pool_options(settings.database_url)
+        )
+        self._lock = threading.Lock()
+        self._closing = set()
+        self.stats = {"opened": 0, "evicted": 0}
+
+    def names(self) -> list:
+        return list(self.urls)
+
+    def get(self, name: str = None) -> DatabaseContext:
+        """Context for a named database (the request's current one by default), opening it if needed"""
+        return self._get(name, hold=False)
+
+    def acquire(self, name: str = None) -> DatabaseContext:
+        """get(), keeping the database open until the matching release()"""
+        return self._get(name, hold=True)
+
+    def release(self, context: DatabaseContext):
+        """Drop a hold from acquire(), closing databases that were kept past max_active"""
+        with self._lock:
+            context.users -= 1
+            evicted = self._evict()
+        for old in evicted:
+            self._close_later(old)
+
+    def _get(self, name: str, hold: bool) -> DatabaseContext:
+        name = name or current_database.get()
+        evicted = []
+        with self._lock:
+            context = self._active.get(name)
+            if context is None:
+                if name not in self.urls:
+                    raise UnknownDatabase(name)
+                context = self._active[name] = self._open(name)
+            if hold:
+                context.users += 1
+            self._active.move_to_end(name)
+            context.last_used = time.monotonic()
+            evicted = self._evict()
+        for old in evicted:
+            self._close_later(old)
+        return context
+
+    async def aclose(self):
+        """Close every open database; used on shutdown"""
+        with self._lock:
+            contexts = list(self._active.values())
+            self._active.clear()
+        for context in contexts:
+            await context.aclose()
+
+    def _close_later(self, context: DatabaseContext):
+        # Flushing learned examples does I/O; keep it off the caller's path
+        try:
+            task = asyncio.get_running_loop().create_task(context.aclose())
+        except RuntimeError:
+            threading.Thread(target=context.close, name=f"close-{context.name}", daemon=True).start()
+            return
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def get_stats(self):
+        with self._lock:
+            active = [context.get_stats() for context in self._active.values()]
+        return {
+            "configured": self.names(),
+            "active": active,
+            "max_active": self.max_active,
+            **self.stats
+        }
+
+    def _open(self, name: str) -> DatabaseContext:
+        url = self.urls[name]
+        engine = create_engine(url, pool_pre_ping=True, **self._pool_options(url))
+        catalog = SchemaCatalog(engine, settings.schema_catalog_schemas.split(","))
+        sampler = TableSampler(
+            engine,
+            rows=settings.sample_rows,
+            max_workers=settings.sample_max_workers,
+            statement_timeout_ms=settings.sample_statement_timeout_ms,
+            budget_seconds=settings.sample_budget_seconds,
+            tablesample_min_rows=settings.sample_tablesample_min_rows,
+            max_value_chars=settings.sample_max_value_chars
+        )
+        values = ValueIndex(
+            engine,
+            path=_suffixed(settings.value_index_path, name),
+            max_distinct=settings.value_index_max_distinct,
+            max_value_chars=settings.value_index_max_value_chars,
+            match_threshold=settings.value_match_threshold,
+            max_matches=settings.value_match_limit,
+            budget_seconds=settings.sample_budget_seconds
+        )
+        rag = RAGService(
+            catalog, sampler, values,
+            collection_name=f"sql_knowledge_{name}",
+            index_path=_suffixed(settings.vector_index_path, name)
+        )
+        cache = SemanticQueryCache(
+            max_entries=settings.sql_cache_max_entries,
+            max_bytes=settings.sql_cache_max_bytes,
+            ttl_seconds=settings.sql_cache_ttl_seconds,
+            similarity_threshold=settings.sql_cache_similarity_threshold
+        )
+        context = DatabaseContext(
+            name, url, engine, catalog, sampler, values, rag, cache, IntentEngine(),
+            pool_options=self._pool_options(url)
+        )
+        self.stats["opened"] += 1
+        print(f"🔌 Opened database '{name}' ({engine.dialect.name})")
+
+        # Sync the knowledge base in the background; retrieval is empty until it is ready
+        context.users += 1
+        threading.Thread(target=self._warm_up, args=(context,), name=f"warm-{name}", daemon=True).start()
+        return context
+
+    def _warm_up(self, context: DatabaseContext):
+        try:
+            context.rag.warm_up()
+        except Exception as e:
+            print(f"❌ Warm-up of database '{context.name}' failed: {e}")
+        finally:
+            self.release(context)
+
+    def _evict(self) -> list:
+        # Only idle databases are closed; busy ones are retried on the next get() or release()
+        evicted = []
+        if len(self._active) <= self.max_active:
+            return evicted
+        idle = [key for key, context in self._active.items() if key != DEFAULT_DATABASE and context.users <= 0]
+        for name in idle[:max(0, len(self._active) - self.max_active)]:
+            evicted.append(self._active.pop(name))
+            self.stats["evicted"] += 1
+        return evicted
+
+    def _pool_options(self, url: str) -> dict:
+        # SQLite uses a per-thread or static pool without size settings
+        if url.startswith("sqlite"):
+            return {}
+        return {
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "pool_recycle": self.pool_recycle,
+            "pool_timeout": self.pool_timeout
+        }
+
+# Global instance
+database_registry = DatabaseRegistry(
+    settings.databases,
+    max_active=settings.database_max_active,
+    pool_size=settings.database_pool_size,
+    max_overflow=settings.database_max_overflow,
+    pool_recycle=settings.database_pool_recycle_seconds,
+    pool_timeout=settings.database_pool_timeout_seconds
+)
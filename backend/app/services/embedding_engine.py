@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+from app.core.config import settings
+
+class EmbeddingEngine:
+    """The one sentence-transformer used for indexing and querying.
+
+    encode() embeds a list of texts in a single forward pass, serving texts it
+    has seen before from an in-memory LRU and then from a SQLite file keyed by
+    content hash, so re-populating the knowledge base or repeating a question
+    never re-embeds the same text. aencode() micro-batches concurrent single
+    requests: they are collected for up to max_wait_ms (or until max_batch)
+    and encoded together off the event loop.
+    """
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", cache_path: str = None,
+                 memory_entries: int = 10000, max_batch: int = 64, max_wait_ms: float = 5.0):
+        self.model_name = model_name
+        self.cache_path = cache_path
+        self.memory_entries = memory_entries
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._model = None
+        self._memory = OrderedDict()
+        self._db = None
+        self._lock = threading.RLock()
+        self._encode_lock = threading.Lock()
+
+        # Micro-batching state, bound to the running event loop
+        self._loop = None
+        self._pending = []
+        self._flush_handle = None
+
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "encoded": 0, "batches": 0, "micro_batches": 0}
+
+    @property
+    def model(self):
+        """Sentence transformer, loaded on first use"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+
+                    print(f"🤖 Loading sentence transformer model {self.model_name}...")
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def encode(self, texts: list) -> np.ndarray:
+        """Embed texts as a (len(texts), dim) float32 array, one forward pass for all cache misses"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        keys = [self._key(text) for text in texts]
+        vectors = [self._memory_get(key) for key in keys]
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            from_disk = self._disk_get([keys[i] for i in missing])
+            for i in missing:
+                vector = from_disk.get(keys[i])
+                if vector is not None:
+                    vectors[i] = vector
+                    self._memory_put(keys[i], vector)
+            self.stats["disk_hits"] += len(from_disk)
+
+        # Encode each distinct missing text once
+        to_encode = OrderedDict()
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                to_encode.setdefault(keys[i], texts[i])
+        if to_encode:
+            with self._encode_lock:
+                encoded = self.model.encode(list(to_encode.values()), batch_size=self.max_batch)
+            encoded = np.asarray(encoded, dtype=np.float32)
+            fresh = dict(zip(to_encode.keys(), encoded))
+            for key, vector in fresh.items():
+                self._memory_put(key, vector)
+            self._disk_put(fresh)
+            for i, vector in enumerate(vectors):
+                if vector is None:
+                    vectors[i] = fresh[keys[i]]
+            self.stats["encoded"] += len(fresh)
+            self.stats["batches"] += 1
+
+        return np.vstack(vectors)
+
+    def encode_one(self, text: str) -> np.ndarray:
+        return self.encode([text])[0]
+
+    async def aencode(self, text: str) -> np.ndarray:
+        """Embed one text, batched with other concurrent callers"""
+        key = self._key(text)
+        vector = self._memory_get(key)
+        if vector is not None:
+            return vector
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._pending = []
+            self._flush_handle = None
+
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    async def aencode_many(self, texts: list) -> np.ndarray:
+        """Embed a list of texts off the event loop"""
+        return await asyncio.to_thread(self.encode, texts)
+
+    def get_stats(self):
+        return {
+            "model": self.model_name,
+            "memory_entries": len(self._memory),
+            "disk_cache": self.cache_path,
+            **self.stats
+        }
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self.stats["micro_batches"] += 1
+            self._loop.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch: list):
+        try:
+            vectors = await asyncio.to_thread(self.encode, [text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode()).hexdigest()
+
+    def _memory_get(self, key: str):
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+            return vector
+
+    def _memory_put(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _connection(self):
+        if self._db is None and self.cache_path:
+            self._db = sqlite3.connect(self.cache_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+            self._db.commit()
+        return self._db
+
+    def _disk_get(self, keys: list) -> dict:
+        found = {}
+        try:
+            with self._lock:
+                db = self._connection()
+                if db is None:
+                    return found
+                # SQLite caps bound parameters, so look keys up in chunks
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk)
+                    for key, blob in rows:
+                        found[key] = np.frombuffer(blob, dtype=np.float32)
+        except Exception as e:
+            print(f"⚠️ Could not read embedding cache: {e}")
+        return found
+
+    def _disk_put(self, vectors: dict):
+        try:
+            with self._lock:
+                db = self._connection()
+                if db is None:
+                    return
+                db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, vector.astype(np.float32).tobytes()) for key, vector in vectors.items()]
+                )
+                db.commit()
+        except Exception as e:
+            print(f"⚠️ Could not write embedding cache: {e}")
+
+# Global instance
+embedding_engine = EmbeddingEngine(
+    model_name=settings.embedding_model,
+    cache_path=settings.embedding_cache_path,
+    memory_entries=settings.embedding_memory_entries,
+    max_batch=settings.embedding_max_batch,
+    max_wait_ms=settings.embedding_max_wait_ms
+)
@@ -0,0 +1,493 @@
+import re
+import threading
+
+NUMERIC_TYPES = ("INT", "NUMERIC", "DECIMAL", "FLOAT", "REAL", "DOUBLE", "MONEY", "SERIAL")
+DATE_TYPES = ("DATE", "TIME")
+TEXT_TYPES = ("CHAR", "TEXT", "STRING", "CITEXT")
+
+# Columns a bare "in <Place>" / "from <Place>" refers to
+LOCATION_COLUMNS = ("city", "country", "state", "region", "location")
+
+# Questions asking to change data are never answered by the fast path
+WRITE_WORDS = re.compile(r"\b(delete|drop|remove|update|insert|create|alter|truncate|change|modify)\b")
+
+# Negation and alternatives are not understood: the filters would come out inverted or ANDed
+NEGATION_WORDS = re.compile(r"\b(not|no|never|none|neither|nor|except|excluding|without|other than)\b|n't\b")
+DISJUNCTION = re.compile(r"\b(or|either)\b")
+
+STOPWORDS = {
+    "show", "list", "get", "display", "find", "give", "fetch", "return", "see", "me", "i", "we",
+    "want", "need", "please", "can", "you", "all", "every", "any", "the", "a", "an", "of", "in",
+    "from", "with", "where", "whose", "is", "are", "was", "were", "be", "what", "which", "who",
+    "by", "per", "each", "for", "and", "to", "that", "have", "has", "had", "on", "at", "do",
+    "does", "there", "their", "it", "records", "record", "rows", "row", "entries", "entry",
+    "data", "table", "details", "information", "info"
+}
+
+AGGREGATES = [
+    (r"\b(?:how many|number of|count(?: of)?)\b", "COUNT"),
+    (r"\b(?:total|sum(?: of)?)\b", "SUM"),
+    (r"\b(?:average|avg|mean)\b", "AVG"),
+    (r"\b(?:maximum|max|highest|largest)\b", "MAX"),
+    (r"\b(?:minimum|min|lowest|smallest)\b", "MIN"),
+]
+
+# Word boundaries only around the words: "\b>" never matches after a space
+COMPARATORS = [
+    (r"(?:\b(?:greater than or equal to|at least)\b|>=)", ">="),
+    (r"(?:\b(?:less than or equal to|at most)\b|<=)", "<="),
+    (r"(?:\b(?:greater than|more than|over|above|exceeding|older than)\b|>)", ">"),
+    (r"(?:\b(?:less than|fewer than|under|below|younger than)\b|<)", "<"),
+    (r"(?:\b(?:equal to|equals)\b|=)", "="),
+]
+
+# 1000, 1,000, 12.5; never the "1" of "1,5" or "1.2.3"
+NUMBER_LITERAL = r"(\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)(?![.,]?\d|\w)"
+
+# A comparison left after filtering could not be bound; answering without it would drop the filter
+UNPARSED_COMPARISON = re.compile("|".join(words for words, _ in COMPARATORS))
+
+# Text values: quoted, Capitalised Words or a single token; apostrophes only inside words (O'Brien)
+WORD_VALUE = r"[\w.@-](?:[\w.@-]|'(?=\w))*"
+CAPITALISED_VALUE = r"[A-Z](?:[\w.@-]|'(?=\w))*(?:\s+[A-Z](?:[\w.@-]|'(?=\w))*)*"
+QUOTED_VALUE = r"'(?:[^']|'(?=\w))+'|\"[^\"]+\""
+
+# Ordering words; if top-N could not use them, a plain SELECT would answer a different question
+RANKING_WORDS = re.compile(
+    r"\b(?:top|first|highest|largest|biggest|most|lowest|smallest|cheapest|least|latest|newest|oldest|earliest|recent)\b"
+)
+
+DATE_LITERAL = r"(\d{4}-\d{2}-\d{2}|\d{4})"
+
+class IntentMatch:
+    """SQL produced by the intent engine plus how sure it is"""
+    __slots__ = ("sql", "confidence", "intent")
+
+    def __init__(self, sql: str, confidence: float, intent: str):
+        self.sql = sql
+        self.confidence = confidence
+        self.intent = intent
+
+    def __repr__(self):
+        return f"IntentMatch(intent={self.intent!r}, confidence={self.confidence:.2f}, sql={self.sql!r})"
+
+class _Column:
+    __slots__ = ("name", "kind", "aliases")
+
+    def __init__(self, name: str, type_name: str):
+        self.name = name
+        type_upper = type_name.upper()
+        if any(t in type_upper for t in DATE_TYPES):
+            self.kind = "date"
+        elif any(t in type_upper for t in NUMERIC_TYPES):
+            self.kind = "number"
+        elif any(t in type_upper for t in TEXT_TYPES):
+            self.kind = "text"
+        else:
+            self.kind = "other"
+        self.aliases = _aliases(name)
+
+class _Table:
+    __slots__ = ("name", "aliases", "columns")
+
+    def __init__(self, name: str, columns: list):
+        self.name = name
+        self.aliases = _aliases(name)
+        self.columns = [_Column(col["name"], str(col["type"])) for col in columns]
+
+def _aliases(identifier: str) -> list:
+    """Spoken forms of an identifier: order_date -> order_date, order date, order dates..."""
+    base = identifier.lower()
+    spaced = base.replace("_", " ")
+    forms = {base, spaced}
+    for form in (base, spaced):
+        if form.endswith("ies"):
+            forms.add(form[:-3] + "y")
+        elif form.endswith("s") and not form.endswith("ss"):
+            forms.add(form[:-1])
+        elif form.endswith("y"):
+            forms.add(form[:-1] + "ies")
+        else:
+            forms.add(form + "s")
+    # Longest first so "order date" wins over "order"
+    return sorted(forms, key=len, reverse=True)
+
+def _quote_ident(name: str) -> str:
+    if re.fullmatch(r"[a-z_][a-z0-9_]*", name):
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+def _quote_literal(value) -> str:
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+def _number(text: str):
+    text = text.replace(",", "")
+    return float(text) if "." in text else int(text)
+
+class _Question:
+    """Question text plus a copy where understood words are blanked out"""
+
+    def __init__(self, question: str):
+        self.original = question.strip().rstrip("?.!")
+        self.lower = self.original.lower()
+        self.remaining = self.lower
+        self.implicit_table = False
+
+    def consume(self, start: int, end: int):
+        self.remaining = self.remaining[:start] + " " * (end - start) + self.remaining[end:]
+
+    def search(self, pattern: str, consume: bool = True):
+        match = re.search(pattern, self.remaining)
+        if match and consume:
+            self.consume(match.start(), match.end())
+        return match
+
+    def leftover_words(self) -> list:
+        return [w for w in re.findall(r"[a-z0-9_']+", self.remaining) if w not in STOPWORDS]
+
+class IntentEngine:
+    """Rule-based NL->SQL fast path for simple single-table questions.
+
+    Recognises select-all, column filters, counts, aggregates (optionally
+    grouped), top-N and date ranges, binding them to the live schema by
+    table and column name. Questions with negation or alternatives ("not",
+    "except", "or") are never matched. Each match carries a confidence; callers
+    only use matches at or above INTENT_CONFIDENCE_THRESHOLD and leave the rest to the LLM.
+    """
+
+    def __init__(self):
+        self._tables = []
+        self._fingerprint = None
+        self._lock = threading.Lock()
+
+    def load_schema(self, schema_info: dict, fingerprint: str = None):
+        """Build the table/column lexicon, skipping work if the fingerprint is unchanged"""
+        if fingerprint is not None and fingerprint == self._fingerprint:
+            return
+        tables = [_Table(name, columns) for name, columns in schema_info.items()]
+        with self._lock:
+            self._tables = tables
+            self._fingerprint = fingerprint
+
+    def match(self, question: str):
+        """Return an IntentMatch for the question, or None if no intent applies"""
+        q = _Question(question)
+        if not q.lower or WRITE_WORDS.search(q.lower):
+            return None
+        if NEGATION_WORDS.search(q.lower) or DISJUNCTION.search(re.sub(r"\bor equal to\b", "", q.lower)):
+            return None
+
+        table = self._bind_table(q)
+        if table is None:
+            return None
+
+        where = []
+        where += self._date_filters(q, table)
+        where += self._numeric_filters(q, table)
+        where += self._text_filters(q, table)
+        if UNPARSED_COMPARISON.search(q.remaining):
+            return None
+
+        result = None
+        for intent in (self._top_n, self._aggregate, self._select_all):
+            saved = q.remaining
+            result = intent(q, table, where)
+            if result is not None:
+                break
+            q.remaining = saved
+        if result is None:
+            return None
+
+        sql, intent = result
+        leftover = q.leftover_words()
+        confidence = max(0.0, 0.95 - 0.2 * len(leftover) - (0.1 if q.implicit_table else 0.0))
+        return IntentMatch(sql, confidence, intent)
+
+    # Schema binding
+
+    def _bind_table(self, q: _Question):
+        mentioned = []
+        for table in self._tables:
+            for alias in table.aliases:
+                match = re.search(rf"\b{re.escape(alias)}\b", q.remaining)
+                if match:
+                    mentioned.append((table, match))
+                    break
+        if len(mentioned) > 1:
+            # Several tables usually means a JOIN, which is left to the LLM
+            return None
+        if mentioned:
+            table, match = mentioned[0]
+            q.consume(match.start(), match.end())
+            return table
+
+        # No table named: use the one table whose columns the question mentions
+        scores = []
+        for table in self._tables:
+            hits = sum(
+                1 for column in table.columns
+                if any(re.search(rf"\b{re.escape(alias)}\b", q.remaining) for alias in column.aliases)
+            )
+            if hits:
+                scores.append((hits, table))
+        scores.sort(key=lambda item: item[0], reverse=True)
+        if not scores or (len(scores) > 1 and scores[0][0] == scores[1][0]):
+            return None
+        q.implicit_table = True
+        return scores[0][1]
+
+    def _find_column(self, q: _Question, table: _Table, kinds=None, consume: bool = True):
+        best = None
+        for column in table.columns:
+            if kinds and column.kind not in kinds:
+                continue
+            for alias in column.aliases:
+                match = re.search(rf"\b{re.escape(alias)}\b", q.remaining)
+                if match and (best is None or match.end() - match.start() > best[1].end() - best[1].start()):
+                    best = (column, match)
+                    break
+        if best and consume:
+            q.consume(best[1].start(), best[1].end())
+        return best[0] if best else None
+
+    def _column_at(self, q: _Question, table: _Table, position: int):
+        """Column whose alias starts exactly at position, preferring the longest alias"""
+        best, best_end = None, position
+        rest = q.remaining[position:]
+        for column in table.columns:
+            for alias in column.aliases:
+                match = re.match(rf"{re.escape(alias)}\b", rest)
+                if match and position + match.end() > best_end:
+                    best, best_end = column, position + match.end()
+        return best, best_end
+
+    def _columns_of_kind(self, table: _Table, kind: str) -> list:
+        return [c for c in table.columns if c.kind == kind and c.name.lower() != "id" and not c.name.lower().endswith("_id")]
+
+    # Filters
+
+    def _date_filters(self, q: _Question, table: _Table) -> list:
+        patterns = [
+            (rf"\bbetween {DATE_LITERAL} and {DATE_LITERAL}\b", "between"),
+            (rf"\bfrom {DATE_LITERAL} (?:to|until) {DATE_LITERAL}\b", "between"),
+            (rf"\b(?:after|since) {DATE_LITERAL}\b", ">="),
+            (rf"\bbefore {DATE_LITERAL}\b", "<"),
+            (rf"\b(?:in|during) (\d{{4}})\b", "year"),
+            (rf"\bon (\d{{4}}-\d{{2}}-\d{{2}})\b", "="),
+            (r"\b(?:in the )?(?:last|past) (\d+) days\b", "last_days"),
+        ]
+        for pattern, kind in patterns:
+            match = re.search(pattern, q.remaining)
+            if not match:
+                continue
+            column = self._find_column(q, table, kinds=("date",))
+            if column is None:
+                dates = self._columns_of_kind(table, "date")
+                if len(dates) != 1:
+                    return []
+                column = dates[0]
+            q.consume(match.start(), match.end())
+            col = _quote_ident(column.name)
+
+            def lower_bound(value):
+                return value if len(value) > 4 else f"{value}-01-01"
+
+            def upper_bound(value):
+                return value if len(value) > 4 else f"{value}-12-31"
+
+            if kind == "between":
+                return [f"{col} BETWEEN '{lower_bound(match.group(1))}' AND '{upper_bound(match.group(2))}'"]
+            if kind == ">=":
+                return [f"{col} >= '{lower_bound(match.group(1))}'"]
+            if kind == "<":
+                return [f"{col} < '{lower_bound(match.group(1))}'"]
+            if kind == "year":
+                return [f"{col} >= '{match.group(1)}-01-01'", f"{col} < '{int(match.group(1)) + 1}-01-01'"]
+            if kind == "=":
+                return [f"{col} = '{match.group(1)}'"]
+            return [f"{col} >= CURRENT_DATE - INTERVAL '{int(match.group(1))} days'"]
+        return []
+
+    def _numeric_filters(self, q: _Question, table: _Table) -> list:
+        conditions = []
+        for words, op in COMPARATORS:
+            pattern = rf"(?:\b(?:is|are|was|were)\s+)?{words}\s*{NUMBER_LITERAL}"
+            while True:
+                match = re.search(pattern, q.remaining)
+                if not match:
+                    break
+                # The column is named just before the comparison, or implied by older/younger
+                column = None
+                prefix = q.remaining[:match.start()]
+                for candidate in self._columns_of_kind(table, "number"):
+                    if any(re.search(rf"\b{re.escape(alias)}\s*$", prefix) for alias in candidate.aliases):
+                        column = candidate
+                        break
+                if column is None and re.search(r"older|younger", match.group(0)):
+                    column = next((c for c in table.columns if c.name.lower() == "age"), None)
+                if column is None:
+                    numbers = self._columns_of_kind(table, "number")
+                    if len(numbers) != 1:
+                        return conditions
+                    column = numbers[0]
+                else:
+                    for alias in column.aliases:
+                        alias_match = re.search(rf"\b{re.escape(alias)}\s*$", prefix)
+                        if alias_match:
+                            q.consume(alias_match.start(), alias_match.end())
+                            break
+                q.consume(match.start(), match.end())
+                conditions.append(f"{_quote_ident(column.name)} {op} {_number(match.group(1))}")
+        return conditions
+
+    def _text_filters(self, q: _Question, table: _Table) -> list:
+        conditions = []
+
+        # "<column> is 'value'", "<column> = value", "with <column> value"
+        for column in self._columns_of_kind(table, "text"):
+            for alias in column.aliases:
+                match = re.search(rf"\b{re.escape(alias)}\s+(?:is |=\s*|equals |of |named |called )?", q.remaining)
+                if not match:
+                    continue
+                value = re.match(f"{QUOTED_VALUE}|{CAPITALISED_VALUE}|{WORD_VALUE}", q.original[match.end():])
+                if value is None or value.group(0).lower() in STOPWORDS:
+                    continue
+                end = match.end() + value.end()
+                if not q.remaining[match.end():end].strip():
+                    continue
+                literal = self._original_value(q, match.end(), end)
+                q.consume(match.start(), end)
+                conditions.append(f"{_quote_ident(column.name)} = {_quote_literal(literal)}")
+                break
+
+        # "users in New York" binds to the table's only location-like column
+        match = re.search(rf"\b(?:in|from|at)\s+({QUOTED_VALUE}|{CAPITALISED_VALUE})", q.original)
+        if match and q.remaining[match.start(1):match.end(1)].strip():
+            locations = [c for c in table.columns if c.name.lower() in LOCATION_COLUMNS and c.kind == "text"]
+            if len(locations) == 1:
+                literal = self._original_value(q, match.start(1), match.end(1))
+                q.consume(match.start(), match.end())
+                conditions.append(f"{_quote_ident(locations[0].name)} = {_quote_literal(literal)}")
+        return conditions
+
+    def _original_value(self, q: _Question, start: int, end: int) -> str:
+        text = q.original[start:end].strip()
+        if len(text) >= 2 and text[0] in "'\"" and text[-1] == text[0]:
+            return text[1:-1]
+        return text
+
+    # Intents
+
+    def _top_n(self, q: _Question, table: _Table, where: list):
+        match = (
+            q.search(r"\b(?:top|first)\s+(\d+)\b")
+            or q.search(r"\b(\d+)\s+(?=(?:highest|largest|biggest|most|lowest|smallest|cheapest|latest|newest|oldest|most recent|recent)\b)")
+        )
+        if match is None:
+            # "most recent 5 orders": the count follows the ordering word
+            match = re.search(r"\b(?:highest|largest|biggest|lowest|smallest|cheapest|latest|newest|oldest|recent)\s+(\d+)\b", q.remaining)
+            if match:
+                q.consume(match.start(1), match.end(1))
+        recent = q.search(r"\b(?:latest|newest|most recent|recent)\b")
+        if match is None and recent is None:
+            return None
+        limit = int(match.group(1)) if match else 10
+
+        ascending = q.search(r"\b(?:lowest|smallest|cheapest|least)\b") is not None
+        oldest = q.search(r"\b(?:oldest|earliest)\b")
+        ranked = q.search(r"\b(?:highest|largest|biggest|most expensive|most)\b") is not None or ascending
+
+        if recent is not None:
+            column = self._find_column(q, table, kinds=("date",))
+            if column is None:
+                dates = self._columns_of_kind(table, "date")
+                if len(dates) != 1:
+                    return None
+                column = dates[0]
+            ascending = False
+        else:
+            q.search(r"\bby\b")
+            column = self._find_column(q, table, kinds=("number", "date"))
+            if column is None and oldest is not None:
+                candidates = self._columns_of_kind(table, "date")
+                if oldest.group(0) == "oldest":
+                    candidates += [c for c in table.columns if c.name.lower() == "age"]
+                if len(candidates) != 1:
+                    return None
+                column = candidates[0]
+            elif column is None:
+                # "top 5 users" names no ordering; picking a column would be a guess
+                numbers = self._columns_of_kind(table, "number")
+                if not ranked or len(numbers) != 1:
+                    return None
+                column = numbers[0]
+            if oldest is not None:
+                # Oldest is the earliest date or the largest age; on any other column it means nothing
+                if column.kind == "date":
+                    ascending = True
+                elif column.name.lower() == "age" and oldest.group(0) == "oldest":
+                    ascending = False
+                else:
+                    return None
+
+        sql = f"SELECT * FROM {_quote_ident(table.name)}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {_quote_ident(column.name)} {'ASC' if ascending else 'DESC'} LIMIT {limit};"
+        return sql, "top_n"
+
+    def _aggregate(self, q: _Question, table: _Table, where: list):
+        func = None
+        for pattern, name in AGGREGATES:
+            if q.search(pattern):
+                func = name
+                break
+        if func is None:
+            return None
+
+        group_column = None
+        group_match = re.search(r"\b(?:grouped by|group by|for each|per|by)\s+", q.remaining)
+        if group_match:
+            group_column, alias_end = self._column_at(q, table, group_match.end())
+            if group_column is None:
+                return None
+            q.consume(group_match.start(), alias_end)
+
+        if func == "COUNT":
+            value = "COUNT(*)"
+            alias = "count"
+        else:
+            column = self._find_column(q, table, kinds=("number",))
+            if column is None:
+                numbers = [c for c in self._columns_of_kind(table, "number") if c is not group_column]
+                if len(numbers) != 1:
+                    return None
+                column = numbers[0]
+            value = f"{func}({_quote_ident(column.name)})"
+            alias = f"{func.lower()}_{column.name}"
+
+        from_where = f" FROM {_quote_ident(table.name)}"
+        if where:
+            from_where += " WHERE " + " AND ".join(where)
+
+        if group_column is not None:
+            group = _quote_ident(group_column.name)
+            sql = f"SELECT {group}, {value} AS {alias}{from_where} GROUP BY {group} ORDER BY {alias} DESC;"
+            return sql, "group_aggregate"
+        return f"SELECT {value} AS {alias}{from_where};", "count" if func == "COUNT" else "aggregate"
+
+    def _select_all(self, q: _Question, table: _Table, where: list):
+        if RANKING_WORDS.search(q.remaining):
+            return None
+        sql = f"SELECT * FROM {_quote_ident(table.name)}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+            intent = "filter"
+        else:
+            intent = "select_all"
+        return sql + " LIMIT 10;", intent
+
+# Global instance
+intent_engine = IntentEngine()
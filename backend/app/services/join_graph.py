@@ -0,0 +1,160 @@
+import threading
+from app.services.lexical_index import tokenize
+
+class JoinGraph:
+    """Foreign keys as an undirected graph with the shortest join paths precomputed.
+
+    build() runs a breadth-first search from every table, up to max_hops
+    joins, and keeps the path to each table it reaches. Tables referenced by
+    more than hub_degree others (users, accounts...) can end a path but are
+    not walked through, which keeps the number of stored paths proportional to
+    the catalog instead of its square. Table names are indexed by their words,
+    so finding the tables a question mentions and the joins between them
+    never scans the catalog.
+    """
+
+    def __init__(self, max_hops: int = 3, hub_degree: int = 50, max_tables: int = 4):
+        self.max_hops = max_hops
+        self.hub_degree = hub_degree
+        self.max_tables = max_tables
+        self.source = None
+        self._edges = []       # (table, columns, referred_table, referred_columns)
+        self._adjacent = {}    # table -> [(neighbour, edge index)]
+        self._paths = {}       # (a, b) with a < b -> edge indexes from a to b
+        self._terms = {}       # word -> tables whose name contains it
+        self._name_terms = {}  # table -> words that must all appear in a question
+        self._lock = threading.Lock()
+
+    def ensure(self, snapshot):
+        """Build the graph for a catalog snapshot unless it already is"""
+        if self.source is not snapshot:
+            with self._lock:
+                if self.source is not snapshot:
+                    self.build(snapshot)
+
+    def build(self, snapshot):
+        edges = []
+        adjacent = {key: [] for key in snapshot.tables}
+        for key, table in snapshot.tables.items():
+            for fk in table.foreign_keys:
+                referred = fk["referred_table"]
+                if referred not in adjacent:
+                    continue
+                index = len(edges)
+                edges.append((key, tuple(fk["constrained_columns"]), referred, tuple(fk["referred_columns"])))
+                if referred != key:
+                    adjacent[key].append((referred, index))
+                    adjacent[referred].append((key, index))
+
+        paths = {}
+        for source in adjacent:
+            previous = {source: None}
+            frontier = [source]
+            for _ in range(self.max_hops):
+                next_frontier = []
+                for table in frontier:
+                    if table != source and len(adjacent[table]) > self.hub_degree:
+                        continue
+                    for neighbour, index in adjacent[table]:
+                        if neighbour not in previous:
+                            previous[neighbour] = (table, index)
+                            next_frontier.append(neighbour)
+                frontier = next_frontier
+            for target in previous:
+                if source < target:
+                    path, node = [], target
+                    while previous[node] is not None:
+                        node, index = previous[node]
+                        path.append(index)
+                    paths[(source, target)] = tuple(reversed(path))
+
+        terms, name_terms = {}, {}
+        for key, table in snapshot.tables.items():
+            words = set(tokenize(table.name.replace("_", " ")))
+            if not words:
+                continue
+            name_terms[key] = words
+            for word in words:
+                terms.setdefault(word, set()).add(key)
+
+        self._edges, self._adjacent, self._paths = edges, adjacent, paths
+        self._terms, self._name_terms = terms, name_terms
+        self.source = snapshot
+        print(f"🔗 Join graph: {len(adjacent)} tables, {len(edges)} foreign keys, {len(paths)} join paths")
+
+    def join_path(self, a: str, b: str):
+        """Edge indexes joining a to b, or None if they are not connected within max_hops"""
+        if a == b:
+            return ()
+        if a < b:
+            return self._paths.get((a, b))
+        path = self._paths.get((b, a))
+        return tuple(reversed(path)) if path is not None else None
+
+    def relevant_tables(self, question: str, context: list = None) -> list:
+        """Tables named in the question, then tables of retrieved schema documents, up to max_tables"""
+        words = set(tokenize(question))
+        tables = []
+        for word in sorted(words):
+            for table in sorted(self._terms.get(word, ())):
+                if table not in tables and self._name_terms[table] <= words:
+                    tables.append(table)
+        for item in context or []:
+            metadata = item.get("metadata") or {}
+            table = metadata.get("table")
+            if metadata.get("type") in ("schema", "sample_data") and table in self._adjacent and table not in tables:
+                tables.append(table)
+        return tables[:self.max_tables]
+
+    def describe(self, tables: list):
+        """One line with the joins connecting the given tables, or None if none of them connect"""
+        tree, used = [], []
+        for table in tables:
+            if table not in self._adjacent:
+                continue
+            best = None
+            for member in tree:
+                path = self.join_path(member, table)
+                if path is not None and (best is None or len(path) < len(best)):
+                    best = path
+            if best is None:
+                if not used:
+                    # Nothing joined yet: start over from this table
+                    tree = [table]
+                continue
+            for index in best:
+                if index not in used:
+                    used.append(index)
+                    for endpoint in (self._edges[index][0], self._edges[index][2]):
+                        if endpoint not in tree:
+                            tree.append(endpoint)
+        if not used:
+            return None
+        return f"Join path for {', '.join(tree)}: " + "; ".join(self._condition(index) for index in used)
+
+    def table_documents(self) -> list:
+        """A relationship knowledge item per table listing its direct joins"""
+        joins = {}
+        for index, (table, _, referred, _) in enumerate(self._edges):
+            joins.setdefault(table, []).append(index)
+            if referred != table:
+                joins.setdefault(referred, []).append(index)
+        items = []
+        for table, indexes in joins.items():
+            neighbours = sorted({self._edges[i][2] if self._edges[i][0] == table else self._edges[i][0] for i in indexes})
+            items.append({
+                "id": f"{table}_joins",
+                "content": f"{table} table joins {', '.join(neighbours)}: " + "; ".join(self._condition(i) for i in indexes),
+                "metadata": {"type": "relationship", "table": table, "tables": ",".join(dict.fromkeys([table] + neighbours))}
+            })
+        return items
+
+    def get_stats(self):
+        return {"tables": len(self._adjacent), "foreign_keys": len(self._edges), "join_paths": len(self._paths)}
+
+    def _condition(self, index: int) -> str:
+        table, columns, referred, referred_columns = self._edges[index]
+        return " AND ".join(
+            f"{table}.{column} = {referred}.{referred_column}"
+            for column, referred_column in zip(columns, referred_columns)
+        )
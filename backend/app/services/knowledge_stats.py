@@ -0,0 +1,169 @@
+import threading
+import time
+
+COUNT_PREFIX = "count:"
+
+class CountedCollection:
+    """Wraps a vector collection and keeps per-type document counts as it is written to.
+
+    Every upsert, update and delete first looks up the affected ids' metadata
+    (never documents or embeddings) to work out how the counts change. The
+    counts are stored in the collection's own metadata every save_every
+    writes or save_seconds, and by flush_counts() on shutdown. Reads are
+    passed through unchanged. A collection without stored counts, or whose
+    stored total no longer matches its size (e.g. after a crash), is counted
+    once with a metadata-only scan.
+    """
+
+    def __init__(self, collection, page_size: int = 1000, save_every: int = 100, save_seconds: float = 30.0):
+        self._collection = collection
+        self.page_size = page_size
+        self.save_every = save_every
+        self.save_seconds = save_seconds
+        self._counts = None
+        self._unsaved = 0
+        self._last_saved = time.monotonic()
+        self._lock = threading.RLock()
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def type_counts(self) -> dict:
+        """{type: documents}, without touching the documents"""
+        with self._lock:
+            return dict(self._ensure_counts())
+
+    def aggregate(self) -> dict:
+        """Recount types with a paged, metadata-only scan of the collection"""
+        counts = {}
+        offset = 0
+        while True:
+            page = self._collection.get(include=["metadatas"], limit=self.page_size, offset=offset)
+            metadatas = page.get("metadatas") or []
+            for metadata in metadatas:
+                item_type = (metadata or {}).get("type", "unknown")
+                counts[item_type] = counts.get(item_type, 0) + 1
+            if len(metadatas) < self.page_size:
+                return counts
+            offset += self.page_size
+
+    def verify(self) -> dict:
+        """Compare the counters with a fresh aggregation, and adopt the aggregation if they drifted"""
+        with self._lock:
+            expected = self.aggregate()
+            counted = self.type_counts()
+            drift = {
+                item_type: counted.get(item_type, 0) - expected.get(item_type, 0)
+                for item_type in set(counted) | set(expected)
+                if counted.get(item_type, 0) != expected.get(item_type, 0)
+            }
+            if drift:
+                print(f"⚠️ Knowledge base counters drifted, resetting: {drift}")
+                self._counts = expected
+                self._save_counts()
+            return {"consistent": not drift, "drift": drift, "breakdown": expected}
+
+    def flush_counts(self):
+        """Persist counters changed since the last save"""
+        with self._lock:
+            if self._unsaved and self._counts is not None:
+                self._save_counts()
+
+    def upsert(self, ids: list, **kwargs):
+        with self._lock:
+            self._ensure_counts()
+            previous = self._types_of(ids)
+            self._collection.upsert(ids=ids, **kwargs)
+            self._apply(previous, self._new_types(ids, kwargs.get("metadatas"), previous))
+
+    def add(self, ids: list, **kwargs):
+        with self._lock:
+            self._ensure_counts()
+            previous = self._types_of(ids)
+            self._collection.add(ids=ids, **kwargs)
+            self._apply(previous, self._new_types(ids, kwargs.get("metadatas"), previous))
+
+    def update(self, ids: list, **kwargs):
+        with self._lock:
+            self._ensure_counts()
+            previous = self._types_of(ids)
+            self._collection.update(ids=ids, **kwargs)
+            # update() never creates ids, so only existing ones can change type
+            current = {
+                item_id: item_type
+                for item_id, item_type in self._new_types(ids, kwargs.get("metadatas"), previous).items()
+                if item_id in previous
+            }
+            self._apply(previous, current)
+
+    def delete(self, ids: list = None, where: dict = None, **kwargs):
+        with self._lock:
+            self._ensure_counts()
+            if where is not None:
+                matched = self._collection.get(ids=ids, where=where, include=["metadatas"])
+                ids = matched.get("ids") or []
+            if not ids:
+                return
+            previous = self._types_of(ids)
+            self._collection.delete(ids=ids, **kwargs)
+            self._apply(previous, {})
+
+    def _types_of(self, ids: list) -> dict:
+        """{id: type} of the ids that already exist"""
+        stored = self._collection.get(ids=list(ids), include=["metadatas"])
+        return {
+            item_id: (metadata or {}).get("type", "unknown")
+            for item_id, metadata in zip(stored.get("ids") or [], stored.get("metadatas") or [])
+        }
+
+    def _new_types(self, ids: list, metadatas: list, previous: dict) -> dict:
+        if metadatas is None:
+            return {item_id: previous.get(item_id, "unknown") for item_id in ids}
+        return {item_id: (metadata or {}).get("type", "unknown") for item_id, metadata in zip(ids, metadatas)}
+
+    def _ensure_counts(self) -> dict:
+        if self._counts is None:
+            self._counts = self._load_counts()
+        return self._counts
+
+    def _apply(self, previous: dict, current: dict):
+        counts = self._counts
+        for item_type in previous.values():
+            counts[item_type] = counts.get(item_type, 0) - 1
+        for item_type in current.values():
+            counts[item_type] = counts.get(item_type, 0) + 1
+        self._counts = {item_type: count for item_type, count in counts.items() if count > 0}
+        # Each save rewrites the collection metadata (all of meta.json on the NumPy index); batch them
+        self._unsaved += 1
+        if self._unsaved >= self.save_every or time.monotonic() - self._last_saved >= self.save_seconds:
+            self._save_counts()
+
+    def _load_counts(self) -> dict:
+        metadata = getattr(self._collection, "metadata", None) or {}
+        counts = {
+            key[len(COUNT_PREFIX):]: int(value)
+            for key, value in metadata.items()
+            if key.startswith(COUNT_PREFIX)
+        }
+        total = counts.pop("total", None)
+        if total is None or total != self._collection.count():
+            # Written before counters existed, or counters not saved before a crash: count once
+            self._counts = self.aggregate()
+            self._save_counts()
+            return self._counts
+        return counts
+
+    def _save_counts(self):
+        metadata = {
+            key: value
+            for key, value in (getattr(self._collection, "metadata", None) or {}).items()
+            if not key.startswith(COUNT_PREFIX) and not key.startswith("hnsw:")
+        }
+        metadata.update({COUNT_PREFIX + item_type: count for item_type, count in self._counts.items()})
+        metadata[COUNT_PREFIX + "total"] = sum(self._counts.values())
+        try:
+            self._collection.modify(metadata=metadata)
+            self._unsaved = 0
+            self._last_saved = time.monotonic()
+        except Exception as e:
+            print(f"⚠️ Could not persist knowledge base counters: {e}")
@@ -0,0 +1,289 @@
+import hashlib
+import re
+import threading
+import time
+import numpy as np
+from app.services.query_cache import normalize_question
+
+LEGACY_DOCUMENT = re.compile(r"^Question: '(.*)' generates SQL: (.*)$", re.DOTALL)
+
+def learned_example_id(question: str, sql: str) -> str:
+    """Stable id from the normalized question and SQL (unlike hash(), the same across processes)"""
+    canonical = f"{normalize_question(question)}\0{' '.join(sql.split())}"
+    return f"learned_{hashlib.sha256(canonical.encode()).hexdigest()[:16]}"
+
+class _LearnedExample:
+    __slots__ = ("id", "question", "sql", "hits", "last_used", "created_at", "vector")
+
+    def __init__(self, example_id: str, question: str, sql: str, vector, hits: int = 1,
+                 last_used: float = None, created_at: float = None):
+        now = time.time()
+        self.id = example_id
+        self.question = question
+        self.sql = sql
+        self.vector = vector
+        self.hits = hits
+        self.last_used = last_used or now
+        self.created_at = created_at or now
+
+    @property
+    def document(self) -> str:
+        return f"Question: '{self.question}' generates SQL: {self.sql}"
+
+    @property
+    def metadata(self) -> dict:
+        return {
+            "type": "learned_example",
+            "success": True,
+            "question": self.question,
+            "hits": self.hits,
+            "last_used": self.last_used,
+            "created_at": self.created_at,
+        }
+
+class LearnedExampleStore:
+    """Successful question -> SQL pairs kept in the knowledge base, bounded and deduplicated.
+
+    A question whose embedding is within similarity_threshold of a stored
+    one counts as a repeat of that example (bumping its hit count) instead of
+    becoming a new document; if its SQL differs, the newer question, SQL and
+    vector replace the stored pair together. Writes are buffered and
+    flushed in one upsert once batch_size changes are pending or flush_seconds
+    have passed. Past max_examples, the examples with the lowest
+    hits * 0.5 ** (idle time / half_life) are evicted.
+    """
+
+    def __init__(self, rag, max_examples: int = 2000, similarity_threshold: float = 0.95,
+                 batch_size: int = 20, flush_seconds: float = 30.0, half_life_days: float = 14.0):
+        self.rag = rag
+        self.max_examples = max_examples
+        self.similarity_threshold = similarity_threshold
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.half_life = half_life_days * 86400
+
+        self._entries = {}
+        self._matrix = None       # normalized question vectors in _matrix_ids order
+        self._matrix_ids = []
+        self._dirty = set()       # new or rewritten: full upsert
+        self._touched = set()     # usage changed: metadata update
+        self._deleted = set()
+        self._first_pending_at = None
+        self._loaded = False
+        self._lock = threading.RLock()
+
+        self.stats = {"added": 0, "deduplicated": 0, "evicted": 0, "flushes": 0}
+
+    def add(self, question: str, sql: str) -> str:
+        """Record a successful pair; returns the id of the example it landed in"""
+        self.load()
+        vector = self._normalize(self.rag.embedder.encode_one(question))
+        with self._lock:
+            example = self._nearest(vector)
+            if example is not None and " ".join(example.sql.split()) != " ".join(sql.split()):
+                # Replace the whole pair: keeping the old question with the new SQL would
+                # teach a mismatched example (e.g. "older than 30" -> age > 40)
+                previous = example
+                example = _LearnedExample(
+                    learned_example_id(question, sql), question, sql, vector,
+                    hits=previous.hits + 1, created_at=previous.created_at
+                )
+                self._replace(previous, example)
+                self.stats["deduplicated"] += 1
+            elif example is not None:
+                example.hits += 1
+                example.last_used = time.time()
+                self._touched.add(example.id)
+                self.stats["deduplicated"] += 1
+            else:
+                example_id = learned_example_id(question, sql)
+                example = _LearnedExample(example_id, question, sql, vector)
+                self._entries[example_id] = example
+                self._deleted.discard(example_id)
+                self._dirty.add(example_id)
+                self._matrix = None
+                self.stats["added"] += 1
+                self._evict()
+            self._mark_pending()
+            should_flush = self._should_flush()
+        if should_flush:
+            self.flush()
+        return example.id
+
+    def touch(self, example_ids: list):
+        """Count retrieval of learned examples towards their frequency and recency"""
+        if not example_ids:
+            return
+        with self._lock:
+            now = time.time()
+            for example_id in example_ids:
+                example = self._entries.get(example_id)
+                if example is not None:
+                    example.hits += 1
+                    example.last_used = now
+                    self._touched.add(example_id)
+                    self._mark_pending()
+            should_flush = self._should_flush()
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """Write pending examples, usage updates and evictions in one batch each"""
+        with self._lock:
+            self._evict()
+            upserts = [self._entries[example_id] for example_id in self._dirty if example_id in self._entries]
+            updates = [self._entries[example_id] for example_id in self._touched - self._dirty if example_id in self._entries]
+            deletes = list(self._deleted)
+            self._dirty.clear()
+            self._touched.clear()
+            self._deleted.clear()
+            self._first_pending_at = None
+        if not (upserts or updates or deletes):
+            return
+
+        collection = self.rag.collection
+        try:
+            if upserts:
+                documents = [example.document for example in upserts]
+                metadatas = [example.metadata for example in upserts]
+                ids = [example.id for example in upserts]
+                collection.upsert(
+                    ids=ids,
+                    documents=documents,
+                    embeddings=self.rag.embedder.encode(documents).tolist(),
+                    metadatas=metadatas
+                )
+                self.rag.lexical.upsert(ids, documents, metadatas)
+            if updates:
+                collection.update(ids=[example.id for example in updates], metadatas=[example.metadata for example in updates])
+            if deletes:
+                collection.delete(ids=deletes)
+                self.rag.lexical.delete(deletes)
+            self.stats["flushes"] += 1
+            print(f"📚 Learned examples flushed: {len(upserts)} written, {len(updates)} updated, {len(deletes)} removed")
+        except Exception as e:
+            print(f"❌ Error flushing learned examples: {e}")
+            # Keep the batch pending for the next flush; rewriting is idempotent
+            with self._lock:
+                self._dirty.update(example.id for example in upserts if example.id in self._entries)
+                self._touched.update(example.id for example in updates if example.id in self._entries)
+                self._deleted.update(example_id for example_id in deletes if example_id not in self._entries)
+                self._mark_pending()
+
+    def count(self) -> int:
+        self.load()
+        return len(self._entries)
+
+    def get_stats(self):
+        return {
+            "examples": len(self._entries),
+            "max_examples": self.max_examples,
+            "pending_writes": len(self._dirty) + len(self._touched) + len(self._deleted),
+            **self.stats
+        }
+
+    def load(self):
+        """Load stored examples once, re-keying legacy hash()-based ids and merging duplicates"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            stored = self.rag.collection.get(where={"type": "learned_example"}, include=["documents", "metadatas"])
+            rows = []
+            for example_id, document, metadata in zip(stored.get("ids") or [], stored.get("documents") or [], stored.get("metadatas") or []):
+                metadata = metadata or {}
+                question = metadata.get("question")
+                match = LEGACY_DOCUMENT.match(document or "")
+                if match is None:
+                    continue
+                sql = match.group(2)
+                if question is None:
+                    question = match.group(1)
+                rows.append((example_id, question, sql, metadata))
+
+            vectors = self.rag.embedder.encode([question for _, question, _, _ in rows]) if rows else []
+            for (example_id, question, sql, metadata), vector in zip(rows, vectors):
+                vector = self._normalize(vector)
+                duplicate = self._nearest(vector)
+                stable_id = learned_example_id(question, sql)
+                if duplicate is not None:
+                    duplicate.hits += int(metadata.get("hits", 1))
+                    duplicate.last_used = max(duplicate.last_used, float(metadata.get("last_used", 0.0)))
+                    self._touched.add(duplicate.id)
+                    self._deleted.add(example_id)
+                    continue
+                example = _LearnedExample(
+                    stable_id, question, sql, vector,
+                    hits=int(metadata.get("hits", 1)),
+                    last_used=metadata.get("last_used"),
+                    created_at=metadata.get("created_at")
+                )
+                self._entries[stable_id] = example
+                self._matrix = None
+                if example_id != stable_id or "question" not in metadata:
+                    # Legacy entry: rewrite under the stable id
+                    self._deleted.add(example_id)
+                    self._dirty.add(stable_id)
+            self._deleted -= set(self._entries)
+            self._loaded = True
+            if self._dirty or self._deleted:
+                self._mark_pending()
+                print(f"📚 Migrating {len(self._deleted)} legacy learned examples")
+
+    def _nearest(self, vector: np.ndarray):
+        """Most similar stored example above the threshold, or None"""
+        if not self._entries:
+            return None
+        if self._matrix is None:
+            self._matrix_ids = list(self._entries)
+            self._matrix = np.vstack([self._entries[example_id].vector for example_id in self._matrix_ids])
+        scores = self._matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return self._entries[self._matrix_ids[best]]
+
+    def _replace(self, previous: _LearnedExample, example: _LearnedExample):
+        del self._entries[previous.id]
+        self._dirty.discard(previous.id)
+        self._touched.discard(previous.id)
+        self._entries[example.id] = example
+        self._deleted.discard(example.id)
+        if previous.id != example.id:
+            self._deleted.add(previous.id)
+        self._dirty.add(example.id)
+        self._matrix = None
+
+    def _evict(self):
+        excess = len(self._entries) - self.max_examples
+        if excess <= 0:
+            return
+        now = time.time()
+        ranked = sorted(
+            self._entries.values(),
+            key=lambda example: example.hits * 0.5 ** ((now - example.last_used) / self.half_life)
+        )
+        for example in ranked[:excess]:
+            del self._entries[example.id]
+            self._dirty.discard(example.id)
+            self._touched.discard(example.id)
+            self._deleted.add(example.id)
+        self._matrix = None
+        self.stats["evicted"] += excess
+
+    def _mark_pending(self):
+        if self._first_pending_at is None:
+            self._first_pending_at = time.monotonic()
+
+    def _should_flush(self) -> bool:
+        pending = len(self._dirty) + len(self._touched) + len(self._deleted)
+        if pending >= self.batch_size:
+            return True
+        return self._first_pending_at is not None and time.monotonic() - self._first_pending_at >= self.flush_seconds
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
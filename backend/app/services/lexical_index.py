@@ -0,0 +1,128 @@
+import math
+import re
+import threading
+from collections import Counter
+from app.services.prompt_builder import STOPWORDS
+
+def tokenize(text: str) -> list:
+    """Lower-cased terms from text and SQL identifiers.
+
+    snake_case and camelCase identifiers are split into their parts and also
+    kept whole ("user_id" -> user_id, user, id), and a trailing plural "s" is
+    dropped so "orders" matches "order_date".
+    """
+    terms = []
+    for identifier in re.findall(r"[A-Za-z0-9_]+", text or ""):
+        parts = re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+", identifier)
+        words = [identifier] if len(parts) > 1 else []
+        words.extend(parts or [identifier])
+        for word in words:
+            word = word.lower().strip("_")
+            if not word or word in STOPWORDS:
+                continue
+            if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+                word = word[:-1]
+            terms.append(word)
+    return terms
+
+class LexicalIndex:
+    """BM25 inverted index over the knowledge base documents.
+
+    Documents are indexed by their text plus the table named in their
+    metadata, so table names, column names and sampled values are all
+    searchable. The index mirrors the vector collection through rebuild(),
+    upsert() and delete(), and keeps each document's content and metadata so
+    it can answer queries on its own.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.built = False
+        self._postings = {}      # term -> {doc_id: term frequency}
+        self._lengths = {}       # doc_id -> number of terms
+        self._terms = {}         # doc_id -> Counter of terms
+        self._documents = {}     # doc_id -> {"content", "metadata"}
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def rebuild(self, ids: list, documents: list, metadatas: list):
+        with self._lock:
+            self._postings.clear()
+            self._lengths.clear()
+            self._terms.clear()
+            self._documents.clear()
+            self._total_length = 0
+            self.upsert(ids, documents, metadatas)
+            self.built = True
+
+    def upsert(self, ids: list, documents: list, metadatas: list = None):
+        metadatas = metadatas or [{}] * len(ids)
+        with self._lock:
+            for doc_id, content, metadata in zip(ids, documents, metadatas):
+                self._remove(doc_id)
+                metadata = metadata or {}
+                terms = Counter(tokenize(content) + tokenize(str(metadata.get("table") or "")))
+                for term, frequency in terms.items():
+                    self._postings.setdefault(term, {})[doc_id] = frequency
+                length = sum(terms.values())
+                self._terms[doc_id] = terms
+                self._lengths[doc_id] = length
+                self._total_length += length
+                self._documents[doc_id] = {"content": content, "metadata": metadata}
+
+    def delete(self, ids: list):
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+
+    def search(self, query: str, limit: int = 50) -> list:
+        """[(doc_id, bm25_score)] best first, only documents sharing a term with the query"""
+        with self._lock:
+            count = len(self._documents)
+            if not count:
+                return []
+            average_length = self._total_length / count or 1.0
+            scores = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        ranked = sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+        return ranked[:limit]
+
+    def document(self, doc_id: str):
+        """{"content", "metadata"} of an indexed document, or None"""
+        return self._documents.get(doc_id)
+
+    def ids_of_type(self, types: set) -> list:
+        with self._lock:
+            return [doc_id for doc_id, doc in self._documents.items() if doc["metadata"].get("type") in types]
+
+    def _remove(self, doc_id: str):
+        terms = self._terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id, 0)
+        self._documents.pop(doc_id, None)
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list:
+    """Fuse several best-first id lists into one: score = sum of 1 / (k + rank)"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return [doc_id for doc_id, _ in sorted(scores.items(), key=lambda pair: pair[1], reverse=True)]
@@ -0,0 +1,229 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+class LLMProvider:
+    """A chat model that turns a prompt into text"""
+    name = "provider"
+
+    async def acomplete(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    async def astream(self, prompt: str):
+        """Yield the completion in chunks; providers without streaming yield it whole"""
+        yield await self.acomplete(prompt)
+
+class LangChainProvider(LLMProvider):
+    """Wraps a LangChain chat model, created on first use"""
+
+    def __init__(self, name: str, client_factory):
+        self.name = name
+        self._client_factory = client_factory
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    async def acomplete(self, prompt: str) -> str:
+        response = await self.client.ainvoke(prompt)
+        return response.content if isinstance(response.content, str) else str(response.content)
+
+    async def astream(self, prompt: str):
+        async for chunk in self.client.astream(prompt):
+            yield chunk.content if isinstance(chunk.content, str) else str(chunk.content)
+
+class StubProvider(LLMProvider):
+    """Local stand-in for an LLM with configurable latency, stragglers and errors"""
+
+    def __init__(self, name: str = "stub", latency: float = 0.2, slow_rate: float = 0.0,
+                 slow_latency: float = 5.0, error_rate: float = 0.0,
+                 response: str = "SELECT * FROM users LIMIT 10;", seed: int = None):
+        self.name = name
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.response = response
+        self._random = random.Random(seed)
+
+    async def acomplete(self, prompt: str) -> str:
+        roll = self._random.random()
+        await asyncio.sleep(self.slow_latency if roll < self.slow_rate else self.latency)
+        if self._random.random() < self.error_rate:
+            raise RuntimeError(f"{self.name}: simulated provider error")
+        return self.response
+
+    async def astream(self, prompt: str):
+        text = await self.acomplete(prompt)
+        for i in range(0, len(text), 8):
+            yield text[i:i + 8]
+
+class LatencyTracker:
+    """Rolling per-model latency window used to pick hedge delays"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def record_error(self, name: str):
+        with self._lock:
+            self._errors[name] = self._errors.get(name, 0) + 1
+
+    def percentile(self, name: str, p: float):
+        """Latency at quantile p (0-1) for the model, or None without samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(p * len(samples)))
+        return samples[index]
+
+    def sample_count(self, name: str) -> int:
+        return len(self._samples.get(name, ()))
+
+    def get_stats(self):
+        stats = {}
+        for name in list(self._samples) + [n for n in self._errors if n not in self._samples]:
+            stats[name] = {
+                "samples": self.sample_count(name),
+                "errors": self._errors.get(name, 0),
+                "p50": self.percentile(name, 0.5),
+                "p95": self.percentile(name, 0.95),
+                "p99": self.percentile(name, 0.99),
+            }
+        return stats
+
+class HedgedCaller:
+    """Send a prompt to the primary provider and hedge to backups if it is slow.
+
+    If the primary has not answered within its recent latency percentile, the
+    next provider is started as well. The first valid answer wins and every
+    other in-flight call is cancelled. A failed call starts the next backup
+    immediately instead of waiting out the delay. With a scheduler, every
+    backup call is admitted (and charged to the rate budgets) on its own; a
+    backup that cannot be admitted right away is not sent.
+    """
+
+    def __init__(self, tracker: LatencyTracker, percentile: float = 0.95, min_delay: float = 0.5,
+                 default_delay: float = 5.0, min_samples: int = 20):
+        self.tracker = tracker
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+
+    def hedge_delay(self, name: str) -> float:
+        if self.tracker.sample_count(name) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, self.tracker.percentile(name, self.percentile))
+
+    async def acomplete(self, providers: list, prompt: str, validate=None, scheduler=None, tokens: int = 0):
+        """Return (text, provider_name) from the first provider with a valid answer.
+
+        The primary call is expected to be admitted by the caller already.
+        """
+        if not providers:
+            raise ValueError("No LLM providers configured")
+
+        primary = providers[0]
+        backups = list(providers[1:])
+        delay = self.hedge_delay(primary.name)
+        can_hedge = True
+        tasks = {}
+        errors = []
+
+        def launch(provider, generation=None):
+            task = asyncio.ensure_future(timed_complete(self.tracker, provider, prompt))
+            tasks[task] = provider
+            if scheduler is not None and provider is not primary:
+                task.add_done_callback(lambda _: scheduler.release(generation))
+            return task
+
+        def admit_backup():
+            """(admitted, generation) for one more upstream call"""
+            if scheduler is None:
+                return True, None
+            generation = scheduler.try_admit(tokens)
+            return generation is not None, generation
+
+        pending = {launch(primary)}
+        try:
+            while pending or backups:
+                if not pending:
+                    # Everything in flight failed; go straight to the next backup
+                    admitted, generation = admit_backup()
+                    if not admitted:
+                        print("🚦 No LLM capacity left for a failover call")
+                        break
+                    pending.add(launch(backups.pop(0), generation))
+                    continue
+
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=delay if backups and can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    admitted, generation = admit_backup()
+                    if not admitted:
+                        # Hedging would exceed the rate budgets; wait for the calls in flight
+                        print(f"🚦 {primary.name} slower than {delay:.2f}s, but no LLM capacity to hedge")
+                        can_hedge = False
+                        continue
+                    backup = backups.pop(0)
+                    print(f"⏱️ {primary.name} slower than {delay:.2f}s, hedging to {backup.name}")
+                    self.hedges_sent += 1
+                    pending.add(launch(backup, generation))
+                    continue
+
+                for task in done:
+                    provider = tasks[task]
+                    try:
+                        text = task.result()
+                    except Exception as e:
+                        print(f"❌ {provider.name} failed: {str(e)[:100]}")
+                        errors.append(e)
+                        continue
+                    if validate is not None and not validate(text):
+                        print(f"⚠️ {provider.name} returned no usable SQL")
+                        errors.append(ValueError(f"{provider.name} returned no usable SQL"))
+                        continue
+                    if provider is not primary:
+                        self.hedge_wins += 1
+                    return text, provider.name
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise errors[-1] if errors else RuntimeError("All LLM providers failed")
+
+    def get_stats(self):
+        return {"hedges_sent": self.hedges_sent, "hedge_wins": self.hedge_wins}
+
+async def timed_complete(tracker: LatencyTracker, provider: LLMProvider, prompt: str) -> str:
+    """Call a provider and record its latency (or error) in the tracker"""
+    start = time.perf_counter()
+    try:
+        text = await provider.acomplete(prompt)
+    except asyncio.CancelledError:
+        # A cancelled straggler took at least this long; dropping it would bias percentiles low
+        tracker.record(provider.name, time.perf_counter() - start)
+        raise
+    except Exception:
+        tracker.record_error(provider.name)
+        raise
+    tracker.record(provider.name, time.perf_counter() - start)
+    return text
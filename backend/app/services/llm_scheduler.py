@@ -0,0 +1,293 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+# Who is asking and how urgently; set by the API layer for each request
+current_priority = ContextVar("llm_priority", default="interactive")
+current_caller = ContextVar("llm_caller", default="anonymous")
+
+PRIORITIES = ("interactive", "batch")
+
+class SchedulerRejected(Exception):
+    """Raised when a priority class queue is full; retry_after is a suggested wait in seconds"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Refills `rate_per_minute` units per minute up to `capacity`"""
+
+    def __init__(self, rate_per_minute: float, capacity: float = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if available now)"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self._level >= amount:
+            return 0.0
+        return (amount - self._level) / self.rate
+
+    def take(self, amount: float):
+        if self.rate <= 0:
+            return
+        self._refill()
+        self._level -= min(amount, self.capacity)
+
+    @property
+    def level(self) -> float:
+        self._refill()
+        return self._level
+
+class _Waiter:
+    __slots__ = ("future", "tokens", "caller", "priority", "enqueued_at")
+
+    def __init__(self, future, tokens: int, caller: str, priority: str):
+        self.future = future
+        self.tokens = tokens
+        self.caller = caller
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+
+class LLMScheduler:
+    """Admission control in front of the LLM.
+
+    Requests wait in one queue per priority class; interactive is always
+    served before batch. Inside a class, callers take turns so one API client
+    cannot monopolise the queue. A request is admitted when a concurrency slot
+    is free and both the requests-per-minute and tokens-per-minute buckets can
+    pay for it. Full queues reject immediately with SchedulerRejected.
+    A rate of 0 disables that bucket.
+    """
+
+    def __init__(self, max_concurrency: int = 8, requests_per_minute: float = 0,
+                 tokens_per_minute: float = 0, max_queue_depth: dict = None):
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_queue_depth = max_queue_depth or {"interactive": 100, "batch": 1000}
+
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self._depth = {priority: 0 for priority in PRIORITIES}
+        self._in_flight = 0
+        self._loop = None
+        self._wakeup = None
+        self._dispatcher = None
+        self._generation = 0   # bumped when the event loop changes; stale slots are not released twice
+
+        self._waits = {priority: deque(maxlen=500) for priority in PRIORITIES}
+        self.admitted = {priority: 0 for priority in PRIORITIES}
+        self.rejected = {priority: 0 for priority in PRIORITIES}
+        self.timed_out = {priority: 0 for priority in PRIORITIES}
+
+    @asynccontextmanager
+    async def admit(self, tokens: int, priority: str = None, caller: str = None, timeout: float = None):
+        """Wait for admission, hold a concurrency slot for the block, then release it.
+
+        Raises asyncio.TimeoutError if not admitted within `timeout` seconds.
+        """
+        priority = priority or current_priority.get()
+        if priority not in self._queues:
+            priority = "interactive"
+        caller = caller or current_caller.get()
+
+        self._ensure_dispatcher()
+        self.check(priority)
+        generation = self._generation
+
+        waiter = _Waiter(self._loop.create_future(), tokens, caller, priority)
+        self._queues[priority].setdefault(caller, deque()).append(waiter)
+        self._depth[priority] += 1
+        self._wakeup.set()
+
+        try:
+            if timeout is None:
+                await waiter.future
+            else:
+                done, _ = await asyncio.wait({waiter.future}, timeout=max(0.0, timeout))
+                if not done:
+                    self.timed_out[priority] += 1
+                    raise asyncio.TimeoutError(f"Not admitted to the LLM within {timeout:.2f}s")
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                self.release(generation)
+            elif generation == self._generation:
+                waiter.future.cancel()
+                self._discard(waiter)
+            raise
+
+        try:
+            yield
+        finally:
+            self.release(generation)
+
+    def try_admit(self, tokens: int, priority: str = None):
+        """Admit at once without queueing, for extra upstream calls such as hedges.
+
+        Returns a generation to pass to release(), or None if a slot or the
+        budget is not free right now, or queued work of this priority or
+        higher would be overtaken.
+        """
+        priority = priority or current_priority.get()
+        if priority not in self._queues:
+            priority = "interactive"
+        self._ensure_dispatcher()
+        ahead = PRIORITIES[:PRIORITIES.index(priority) + 1]
+        if self._in_flight >= self.max_concurrency or any(self._depth[p] for p in ahead):
+            return None
+        if self.requests.time_until(1) > 0 or self.tokens.time_until(tokens) > 0:
+            return None
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        self._in_flight += 1
+        self.admitted[priority] += 1
+        return self._generation
+
+    def release(self, generation: int = None):
+        """Free a concurrency slot taken by admit() or try_admit()"""
+        if generation is not None and generation != self._generation:
+            return  # taken on an event loop that has since been replaced
+        self._in_flight -= 1
+        self._wakeup.set()
+
+    def check(self, priority: str = None):
+        """Raise SchedulerRejected now if admit() would, so callers can refuse before starting work"""
+        priority = priority or current_priority.get()
+        if priority not in self._queues:
+            priority = "interactive"
+        if self._depth[priority] >= self.max_queue_depth[priority]:
+            self.rejected[priority] += 1
+            raise SchedulerRejected(
+                f"LLM {priority} queue is full ({self._depth[priority]} waiting)",
+                retry_after=self._retry_after(priority)
+            )
+
+    def _retry_after(self, priority: str) -> int:
+        """Seconds a rejected caller should wait: the typical queue wait, or until the request budget refills"""
+        waits = sorted(self._waits[priority])
+        typical = waits[len(waits) // 2] if waits else 0.0
+        return max(1, math.ceil(max(typical, self.requests.time_until(1))))
+
+    def get_stats(self):
+        stats = {
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "request_budget_left": round(self.requests.level, 1) if self.requests.rate else None,
+            "token_budget_left": round(self.tokens.level, 1) if self.tokens.rate else None,
+        }
+        for priority in PRIORITIES:
+            waits = sorted(self._waits[priority])
+            stats[priority] = {
+                "queued": self._depth[priority],
+                "admitted": self.admitted[priority],
+                "rejected": self.rejected[priority],
+                "timed_out": self.timed_out[priority],
+                "wait_p50_seconds": round(waits[len(waits) // 2], 4) if waits else 0.0,
+                "wait_p95_seconds": round(waits[min(len(waits) - 1, int(0.95 * len(waits)))], 4) if waits else 0.0,
+            }
+        return stats
+
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or a new event loop (e.g. the blocking generate_sql wrapper):
+            # waiters of the old loop can no longer be dispatched, so reject them
+            self._abandon_loop()
+            self._generation += 1
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._dispatcher = None
+            self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+            self._depth = {priority: 0 for priority in PRIORITIES}
+            self._in_flight = 0
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    def _abandon_loop(self):
+        old_loop, dispatcher = self._loop, self._dispatcher
+        if old_loop is None or old_loop.is_closed():
+            return
+        waiters = [waiter for queue in self._queues.values() for waiters in queue.values() for waiter in waiters]
+        for waiter in waiters:
+            rejection = SchedulerRejected("LLM scheduler moved to another event loop", retry_after=1)
+            old_loop.call_soon_threadsafe(_reject, waiter.future, rejection)
+        if dispatcher is not None:
+            old_loop.call_soon_threadsafe(dispatcher.cancel)
+        if waiters:
+            print(f"🚦 Rejected {len(waiters)} LLM waiters left on a replaced event loop")
+
+    async def _dispatch(self):
+        generation = self._generation
+        while generation == self._generation:
+            waiter = self._next_waiter()
+            if waiter is None or self._in_flight >= self.max_concurrency:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            delay = max(self.requests.time_until(1), self.tokens.time_until(waiter.tokens))
+            if delay > 0:
+                # Sleep until the budget refills, but wake early for higher priority work
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._pop(waiter)
+            self.requests.take(1)
+            self.tokens.take(waiter.tokens)
+            self._in_flight += 1
+            self.admitted[waiter.priority] += 1
+            self._waits[waiter.priority].append(time.monotonic() - waiter.enqueued_at)
+            waiter.future.set_result(None)
+
+    def _next_waiter(self):
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            for caller in list(queue):
+                waiters = queue[caller]
+                while waiters and waiters[0].future.done():
+                    waiters.popleft()
+                    self._depth[priority] -= 1
+                if waiters:
+                    return waiters[0]
+                del queue[caller]
+        return None
+
+    def _pop(self, waiter: _Waiter):
+        queue = self._queues[waiter.priority]
+        waiters = queue[waiter.caller]
+        waiters.popleft()
+        self._depth[waiter.priority] -= 1
+        # Round-robin: this caller goes to the back of its priority class
+        if waiters:
+            queue.move_to_end(waiter.caller)
+        else:
+            del queue[waiter.caller]
+
+    def _discard(self, waiter: _Waiter):
+        waiters = self._queues[waiter.priority].get(waiter.caller)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            self._depth[waiter.priority] -= 1
+        self._wakeup.set()
+
+def _reject(future, error: Exception):
+    if not future.done():
+        future.set_exception(error)
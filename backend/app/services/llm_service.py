@@ -1,61 +1,324 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from app.services.rag_service import rag_service
+from app.services.database_registry import database_registry
+from app.services.query_cache import normalize_question
+from app.services.single_flight import SingleFlight
+from app.services.prompt_builder import PromptAssembler, estimate_tokens
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.llm_scheduler import LLMScheduler, SchedulerRejected, current_priority
+from app.services.llm_provider import (
+    LangChainProvider, StubProvider, LatencyTracker, HedgedCaller, timed_complete
+)
 from app.core.config import settings
+import asyncio
+import json
 import re
+import time
+
+class IncrementalSQLCleaner:
+    """Apply _clean_sql_response rules to a streamed LLM response chunk by chunk.
+
+    feed() returns the newly confirmed SQL text. If a markdown fence shows up
+    after plain text was already emitted, that text was an explanation rather
+    than SQL: `restarted` is set and emission starts over inside the fence.
+    The full-text cleaner remains authoritative for the final SQL.
+    """
+
+    def __init__(self):
+        self.mode = None            # None until the first line, then "plain" or "fenced"
+        self.finished = False
+        self.restarted = False
+        self._line = ""
+        self._line_emitted = 0
+        self._emitted_lines = 0
+
+    def feed(self, chunk: str) -> str:
+        """Consume a chunk of model output and return SQL text safe to show"""
+        out = []
+        self._line += chunk
+        while "\n" in self._line and not self.finished:
+            line, self._line = self._line.split("\n", 1)
+            out.append(self._finish_line(line))
+            self._line_emitted = 0
+        if not self.finished:
+            out.append(self._partial_line())
+        return "".join(out)
+
+    def flush(self) -> str:
+        """Emit whatever is left once the stream has ended"""
+        if self.finished or not self._line:
+            return ""
+        line, self._line = self._line, ""
+        return self._finish_line(line)
+
+    def _finish_line(self, line: str) -> str:
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            if self.mode == "fenced":
+                self.finished = True
+            elif self.mode == "plain" and self._emitted_lines:
+                self.restarted = True
+                self._emitted_lines = 0
+                self.mode = "fenced"
+            else:
+                self.mode = "fenced"
+            return ""
+        if not stripped:
+            return ""
+        if self.mode is None:
+            self.mode = "plain"
+        if stripped.startswith("--") and not stripped.startswith("-- "):
+            return ""
+        return self._emit(stripped, complete=True)
+
+    def _partial_line(self) -> str:
+        stripped = self._line.lstrip()
+        # Wait until the line cannot turn into a fence or a dropped comment
+        if len(stripped) < 3 or stripped[0] in "`-":
+            return ""
+        if self.mode is None:
+            self.mode = "plain"
+        return self._emit(stripped, complete=False)
+
+    def _emit(self, text: str, complete: bool) -> str:
+        prefix = ""
+        if self._line_emitted == 0 and self._emitted_lines:
+            prefix = "\n"
+        new_text = text[self._line_emitted:]
+        self._line_emitted = len(text)
+        if complete:
+            self._emitted_lines += 1
+        return prefix + new_text if new_text else ""
 
 class EnhancedLLMService:
+    # Models to try in order of preference
+    MODELS_TO_TRY = [
+        "gemini-2.5-flash",    # Latest and fastest
+        "gemini-2.5-pro",     # Latest pro version
+        "gemini-1.5-flash",  # Fallback
+    ]
+    
     def __init__(self):
         print("🚀 Initializing Enhanced LLM Service...")
-        self.llm = self._setup_llm()
-        self.rag = rag_service
+        self.prompt_assembler = PromptAssembler(settings.prompt_token_budget)
+        self.last_prompt_report = None
+        
+        # The Gemini client is created on first use; warm_up() probes models
+        # in the background and persists the winner so restarts skip probing
+        self.model_name = self._load_persisted_model()
+        self.warmed_up = False
         
-        # Test LLM connection
-        self.test_llm_connection()
+        # One provider per model; latencies drive the optional hedging mode
+        self._providers = {}
+        self.latency_tracker = LatencyTracker()
+        self.hedger = HedgedCaller(
+            self.latency_tracker,
+            percentile=settings.llm_hedge_percentile,
+            min_delay=settings.llm_hedge_min_delay,
+            default_delay=settings.llm_hedge_default_delay
+        )
+        
+        # Stop calling Gemini while it is failing; callers get the fast fallback
+        self.breaker = CircuitBreaker(
+            "llm",
+            failure_threshold=settings.llm_breaker_failure_threshold,
+            min_requests=settings.llm_breaker_min_requests,
+            window_seconds=settings.llm_breaker_window_seconds,
+            open_seconds=settings.llm_breaker_open_seconds,
+            half_open_max_calls=settings.llm_breaker_half_open_calls,
+            slow_call_seconds=settings.llm_breaker_slow_call_seconds
+        )
+        
+        # Every Gemini call on this worker is admitted by the scheduler:
+        # concurrency limit, RPM/TPM budgets, priorities and per-caller fairness
+        self.scheduler = LLMScheduler(
+            max_concurrency=settings.llm_max_concurrency,
+            requests_per_minute=settings.llm_requests_per_minute,
+            tokens_per_minute=settings.llm_tokens_per_minute,
+            max_queue_depth={
+                "interactive": settings.llm_queue_max_interactive,
+                "batch": settings.llm_queue_max_batch
+            }
+        )
+        
+        # Identical questions arriving together share one retrieval + LLM call
+        self._in_flight = SingleFlight()
         
         print("✅ Enhanced LLM Service initialized")
     
-    def _setup_llm(self):
-        """Setup LLM based on available API keys"""
+    @property
+    def rag(self):
+        """Knowledge base of the database the current request targets"""
+        return database_registry.get().rag
+    
+    @property
+    def cache(self):
+        """SQL cache of the database the current request targets"""
+        return database_registry.get().cache
+    
+    @property
+    def intents(self):
+        """Intent lexicon of the database the current request targets"""
+        return database_registry.get().intents
+    
+    @property
+    def llm(self):
+        """Gemini client for the chosen model, or None without an API key"""
+        if settings.llm_provider == "stub" or not self._has_api_key():
+            return None
+        return self._provider(self.model_name or self.MODELS_TO_TRY[0]).client
+    
+    def _llm_available(self) -> bool:
+        return settings.llm_provider == "stub" or self.llm is not None
+    
+    def _provider(self, model_name: str):
+        """Provider for one model, created on first use"""
+        provider = self._providers.get(model_name)
+        if provider is None:
+            if settings.llm_provider == "stub":
+                provider = StubProvider(
+                    name=f"stub:{model_name}",
+                    latency=settings.llm_stub_latency,
+                    slow_rate=settings.llm_stub_slow_rate,
+                    slow_latency=settings.llm_stub_slow_latency
+                )
+            else:
+                provider = LangChainProvider(model_name, lambda: self._create_llm(model_name))
+            self._providers[model_name] = provider
+        return provider
+    
+    def _provider_chain(self) -> list:
+        """Primary model first, then the models hedges may go to"""
+        primary = self.model_name or self.MODELS_TO_TRY[0]
+        if settings.llm_hedge_models:
+            backups = [m.strip() for m in settings.llm_hedge_models.split(",") if m.strip()]
+        else:
+            backups = list(self.MODELS_TO_TRY)
+        return [self._provider(primary)] + [self._provider(m) for m in backups if m != primary]
+    
+    async def _acomplete(self, prompt: str) -> str:
+        """Call the LLM once admitted by the scheduler, through the circuit breaker with an adaptive timeout"""
+        async with self.scheduler.admit(self._estimate_call_tokens(prompt)):
+            if not self.breaker.allow_request():
+                raise CircuitOpenError("LLM circuit is open")
+            
+            start = time.perf_counter()
+            try:
+                text = await asyncio.wait_for(self._acomplete_unguarded(prompt), timeout=self._adaptive_timeout())
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_success(time.perf_counter() - start)
+            return text
+    
+    def _estimate_call_tokens(self, prompt: str) -> int:
+        """Tokens charged against the TPM budget: the prompt plus the expected answer"""
+        return estimate_tokens(prompt) + settings.llm_expected_output_tokens
+    
+    def _adaptive_timeout(self) -> float:
+        """Per-call timeout: a multiple of the primary model's observed p99 latency"""
+        primary = self._provider_chain()[0].name
+        if self.latency_tracker.sample_count(primary) < 20:
+            return settings.llm_request_timeout
+        p99 = self.latency_tracker.percentile(primary, 0.99)
+        timeout = max(settings.llm_timeout_min, p99 * settings.llm_timeout_multiplier)
+        return min(settings.llm_request_timeout, timeout)
+    
+    async def _acomplete_unguarded(self, prompt: str) -> str:
+        """Send the prompt to the primary model, hedging to backups when enabled"""
+        chain = self._provider_chain()
+        if settings.llm_hedging_enabled and len(chain) > 1:
+            # Each hedge is one more upstream request: admit and charge it separately
+            text, model_name = await self.hedger.acomplete(
+                chain, prompt, validate=self._is_usable_sql,
+                scheduler=self.scheduler, tokens=self._estimate_call_tokens(prompt)
+            )
+            print(f"🏁 Answer from {model_name}")
+            return text
+        return await timed_complete(self.latency_tracker, chain[0], prompt)
+    
+    def _is_usable_sql(self, text: str) -> bool:
+        return bool(re.search(r"\b(select|with|insert|update|delete|create|alter|drop)\b", text or "", re.IGNORECASE))
+    
+    def _has_api_key(self) -> bool:
+        return bool(settings.google_api_key) and settings.google_api_key != "dummy-key-for-now"
+    
+    def _create_llm(self, model_name: str):
+        """Create a Gemini chat client without contacting the API"""
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        return ChatGoogleGenerativeAI(
+            model=model_name,
+            temperature=0,
+            google_api_key=settings.google_api_key
+        )
+    
+    def _load_persisted_model(self):
+        """Read the model chosen by a previous warm-up, if any"""
+        try:
+            with open(settings.llm_model_state_path) as f:
+                model_name = json.load(f).get("model")
+            if model_name in self.MODELS_TO_TRY:
+                print(f"💾 Using persisted model: {model_name}")
+                return model_name
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ Could not read persisted model: {e}")
+        return None
+    
+    def _persist_model(self, model_name: str):
+        try:
+            with open(settings.llm_model_state_path, "w") as f:
+                json.dump({"model": model_name}, f)
+        except Exception as e:
+            print(f"⚠️ Could not persist model choice: {e}")
+    
+    async def warm_up(self):
+        """Pick a working model (probing only when none was persisted) and build the client"""
         print(f"🔑 Checking API key: {settings.google_api_key[:20]}..." if settings.google_api_key else "🔑 No API key found")
         
-        if settings.google_api_key and settings.google_api_key != "dummy-key-for-now":
-            print("✅ Valid API key found, setting up Gemini...")
+        if settings.llm_provider == "stub":
+            print("🧪 Using stub LLM provider")
+            self.warmed_up = True
+            return
+        
+        if not self._has_api_key():
+            print("⚠️  Using dummy LLM - add real API key for AI functionality")
+            self.warmed_up = True
+            return
+        
+        if self.model_name is not None:
+            # Building the client imports langchain, keep that off the event loop
+            await asyncio.to_thread(lambda: self.llm)
+            self.warmed_up = True
+            print(f"✅ Gemini client ready with persisted model {self.model_name}")
+            return
+        
+        print("✅ Valid API key found, setting up Gemini...")
+        for model_name in self.MODELS_TO_TRY:
             try:
-                # Try different model names in order of preference
-                models_to_try = [
-                    "gemini-2.5-flash",    # Latest and fastest
-                    "gemini-2.5-pro",     # Latest pro version
-                    "gemini-1.5-flash",  # Fallback
-                ]
+                print(f"🔄 Trying model: {model_name}")
+                provider = self._provider(model_name)
+                await asyncio.to_thread(lambda: provider.client)
                 
-                for model_name in models_to_try:
-                    try:
-                        print(f"🔄 Trying model: {model_name}")
-                        llm = ChatGoogleGenerativeAI(
-                            model=model_name,
-                            temperature=0,
-                            google_api_key=settings.google_api_key
-                        )
-                        
-                        # Test the model with a simple request
-                        test_response = llm.invoke("Say hello")
-                        print(f"✅ Successfully connected to {model_name}")
-                        print(f"✅ Test response: {test_response.content}")
-                        return llm
-                        
-                    except Exception as model_error:
-                        print(f"❌ Model {model_name} failed: {str(model_error)[:100]}...")
-                        continue
+                # Test the model with a simple request
+                test_response = await provider.acomplete("Say hello")
+                print(f"✅ Successfully connected to {model_name}")
+                print(f"✅ Test response: {test_response}")
                 
-                print("❌ All models failed")
-                return None
+                self.model_name = model_name
+                self._persist_model(model_name)
+                self.warmed_up = True
+                return
                 
-            except Exception as e:
-                print(f"❌ Error creating Gemini LLM: {e}")
-                return None
-        else:
-            print("⚠️  Using dummy LLM - add real API key for AI functionality")
-            return None
+            except Exception as model_error:
+                print(f"❌ Model {model_name} failed: {str(model_error)[:100]}...")
+                continue
+        
+        print("❌ All models failed")
+        self.warmed_up = True
     
     def test_llm_connection(self):
         """Test if LLM is working"""
@@ -77,52 +340,59 @@ class EnhancedLLMService:
             return False
     
     def generate_sql(self, question: str, db_uri: str) -> str:
-        """Generate postgreSQL using RAG + Gemini"""
+        """Blocking wrapper around agenerate_sql for scripts and the shell"""
+        return asyncio.run(self.agenerate_sql(question, db_uri))
+    
+    async def agenerate_sql(self, question: str, db_uri: str) -> str:
+        """Generate postgreSQL using RAG + Gemini without blocking the event loop"""
         print(f"🎯 Starting SQL generation for: '{question}'")
         
         try:
+            # Simple questions are answered by the intent engine without an LLM call
+            if settings.intent_engine_enabled:
+                match = self._match_intent(question)
+                if match is not None:
+                    print(f"⚡ Intent '{match.intent}' matched (confidence {match.confidence:.2f})")
+                    return match.sql
+            
             # Check if LLM is available
-            if self.llm is None:
+            if not self._llm_available():
                 print("❌ LLM is None - no API key configured")
                 return f"-- No API key configured\n-- Generated from: {question}\nSELECT * FROM users LIMIT 5;"
             
-            print("✅ LLM is available, proceeding with RAG + Gemini")
+            # Serve repeated or reworded questions from the answer cache
+            fingerprint = self.rag.schema_fingerprint
+            embedding = None
+            if settings.sql_cache_enabled:
+                cached = self.cache.get_exact(question, fingerprint)
+                if cached is None:
+                    embedding = await self._aembed_for_cache(question)
+                    cached = self.cache.get_similar(embedding, fingerprint)
+                if cached is not None:
+                    print(f"⚡ Cache hit for: '{question}'")
+                    return cached
             
-            # Step 1: Retrieve relevant context using RAG
-            print(f"🔍 Retrieving context for: {question}")
-            context = self.rag.retrieve_context(question, top_k=3)
-            print(f"📚 Retrieved {len(context)} context items")
-            
-            if len(context) > 0:
-                print("📋 Context preview:")
-                for i, item in enumerate(context[:2]):
-                    print(f"   {i+1}. {item['content'][:100]}...")
-            else:
-                print("⚠️ No context retrieved from RAG")
-            
-            # Step 2: Build enhanced prompt with context
-            prompt = self._build_rag_prompt(question, context)
-            print(f"📝 Built prompt (length: {len(prompt)} chars)")
-            print(f"📝 Prompt preview: {prompt[:200]}...")
+            # While the circuit is open, skip retrieval and the LLM entirely
+            if self.breaker.is_open():
+                print("🔌 LLM circuit open, returning fallback")
+                return self._fallback_sql(question)
             
-            # Step 3: Generate SQL with Gemini
-            print("🤖 Calling Gemini API...")
-            response = self.llm.invoke(prompt)
-            print(f"🤖 RAW Gemini response: '{response.content}'")
-            print(f"🤖 Response type: {type(response.content)}")
+            flight_key = (database_registry.get().name, fingerprint, normalize_question(question))
+            return await self._in_flight.do(
+                flight_key,
+                lambda: self._agenerate_and_cache(question, fingerprint, embedding)
+            )
             
-            # Step 4: Clean and return SQL
-            sql = self._clean_sql_response(response.content)
-            print(f"✅ CLEANED SQL: '{sql}'")
-            print(f"✅ SQL length: {len(sql)} chars")
-            
-            # Check if it's actually AI-generated or fallback
-            if "Fallback query for:" in sql:
-                print("⚠️ This is a FALLBACK query, not AI-generated!")
-            else:
-                print("🎉 This is AI-GENERATED SQL!")
-            
-            return sql
+        except asyncio.TimeoutError:
+            print(f"⏰ SQL generation exceeded {settings.llm_request_timeout}s deadline")
+            fallback = self._fallback_sql(question)
+            print(f"🔄 Returning fallback: {fallback}")
+            return fallback
+        
+        except SchedulerRejected as e:
+            # Overload is reported to the caller rather than hidden behind a fallback
+            print(f"🚦 {e}")
+            raise
             
         except Exception as e:
             print(f"❌ EXCEPTION in generate_sql:")
@@ -136,37 +406,262 @@ class EnhancedLLMService:
             print(f"🔄 Returning fallback: {fallback}")
             return fallback
     
-    def _build_rag_prompt(self, question: str, context: list) -> str:
-        """Build enhanced prompt with retrieved context"""
-        print(f"🔨 Building prompt with {len(context)} context items")
+    async def _agenerate_and_cache(self, question: str, fingerprint: str, embedding=None) -> str:
+        """Generate SQL under the request deadline and store it in the cache"""
+        sql = await asyncio.wait_for(
+            self._agenerate_with_llm(question),
+            timeout=settings.llm_request_timeout
+        )
+        
+        if settings.sql_cache_enabled:
+            self.cache.put(question, fingerprint, sql, embedding)
+        return sql
+    
+    async def _aembed_for_cache(self, question: str):
+        """Embed the question for semantic cache lookups, or None if unavailable"""
+        try:
+            return await self.rag.aembed_query(question)
+        except Exception as e:
+            print(f"⚠️ Could not embed question for cache lookup: {e}")
+            return None
+    
+    async def _agenerate_with_llm(self, question: str) -> str:
+        """Run retrieval, prompt building and the Gemini call for one question"""
+        print("✅ LLM is available, proceeding with RAG + Gemini")
         
-        # Format context
-        context_sections = []
-        for item in context:
-            context_sections.append(f"- {item['content']}")
+        # Step 1: Retrieve relevant context using RAG
+        print(f"🔍 Retrieving context for: {question}")
+        context = await self.rag.aretrieve_context(question, top_k=3)
+        print(f"📚 Retrieved {len(context)} context items")
         
-        context_text = "\n".join(context_sections)
+        if len(context) > 0:
+            print("📋 Context preview:")
+            for i, item in enumerate(context[:2]):
+                print(f"   {i+1}. {item['content'][:100]}...")
+        else:
+            print("⚠️ No context retrieved from RAG")
         
-        prompt = f"""You are a PostgreSQL expert. Generate accurate SQL queries based on the provided database knowledge.
-
-RELEVANT DATABASE KNOWLEDGE:
-{context_text}
-
-IMPORTANT RULES:
-1. Return ONLY the SQL query, no explanations or markdown
-2. Use proper PostgreSQL syntax
-3. Include appropriate JOINs when querying multiple tables
-4. Add LIMIT clause for SELECT * queries (typically LIMIT 10)
-5. Use table aliases for better readability
-6. For aggregations, use proper GROUP BY clauses
-7. Use single quotes for string literals
-8. End query with semicolon
-
-USER QUESTION: {question}
-
-SQL QUERY:"""
+        return await self._agenerate_from_context(question, context)
+    
+    async def _agenerate_from_context(self, question: str, context: list) -> str:
+        """Build the prompt from retrieved context, call Gemini and clean the SQL"""
+        # Step 2: Build enhanced prompt with context
+        prompt = self._build_rag_prompt(question, context)
+        print(f"📝 Built prompt (length: {len(prompt)} chars)")
+        print(f"📝 Prompt preview: {prompt[:200]}...")
+        
+        # Step 3: Generate SQL with Gemini once the scheduler admits the call
+        print("🤖 Calling Gemini API...")
+        content = await self._acomplete(prompt)
+        print(f"🤖 RAW Gemini response: '{content}'")
         
-        print(f"✅ Prompt built successfully")
+        # Step 4: Clean and return SQL
+        sql = self._clean_sql_response(content)
+        print(f"✅ CLEANED SQL: '{sql}'")
+        print(f"✅ SQL length: {len(sql)} chars")
+        
+        # Check if it's actually AI-generated or fallback
+        if "Fallback query for:" in sql:
+            print("⚠️ This is a FALLBACK query, not AI-generated!")
+        else:
+            print("🎉 This is AI-GENERATED SQL!")
+        
+        return sql
+    
+    async def astream_sql(self, question: str, db_uri: str):
+        """Stream generation as (event, data) pairs: context, token*, reset?, done"""
+        print(f"🎯 Starting streaming SQL generation for: '{question}'")
+        
+        if settings.intent_engine_enabled:
+            match = self._match_intent(question)
+            if match is not None:
+                print(f"⚡ Intent '{match.intent}' matched (confidence {match.confidence:.2f})")
+                yield "done", {"sql": match.sql, "status": "success", "cached": False, "intent": match.intent}
+                return
+        
+        if not self._llm_available():
+            print("❌ LLM is None - no API key configured")
+            sql = f"-- No API key configured\n-- Generated from: {question}\nSELECT * FROM users LIMIT 5;"
+            yield "done", {"sql": sql, "status": "success", "cached": False}
+            return
+        
+        fingerprint = self.rag.schema_fingerprint
+        embedding = None
+        if settings.sql_cache_enabled:
+            cached = self.cache.get_exact(question, fingerprint)
+            if cached is None:
+                embedding = await self._aembed_for_cache(question)
+                cached = self.cache.get_similar(embedding, fingerprint)
+            if cached is not None:
+                print(f"⚡ Cache hit for: '{question}'")
+                yield "done", {"sql": cached, "status": "success", "cached": True}
+                return
+        
+        if self.breaker.is_open():
+            print("🔌 LLM circuit open, returning fallback")
+            yield "done", {"sql": self._fallback_sql(question), "status": "success", "cached": False, "error": "LLM circuit open"}
+            return
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + min(settings.llm_request_timeout, self._adaptive_timeout())
+        
+        try:
+            context = await asyncio.wait_for(
+                self.rag.aretrieve_context(question, top_k=3),
+                timeout=settings.llm_request_timeout
+            )
+            yield "context", {"items": context}
+            
+            prompt = self._build_rag_prompt(question, context)
+            cleaner = IncrementalSQLCleaner()
+            raw_parts = []
+            
+            async with self.scheduler.admit(self._estimate_call_tokens(prompt), timeout=deadline - loop.time()):
+                if not self.breaker.allow_request():
+                    raise CircuitOpenError("LLM circuit is open")
+                started = loop.time()
+                try:
+                    print("🤖 Streaming from Gemini API...")
+                    provider = self._provider_chain()[0]
+                    stream = provider.astream(prompt).__aiter__()
+                    while True:
+                        try:
+                            text = await asyncio.wait_for(stream.__anext__(), timeout=deadline - loop.time())
+                        except StopAsyncIteration:
+                            break
+                        raw_parts.append(text)
+                        delta = cleaner.feed(text)
+                        if cleaner.restarted:
+                            cleaner.restarted = False
+                            yield "reset", {}
+                        if delta:
+                            yield "token", {"text": delta}
+                except (asyncio.CancelledError, GeneratorExit):
+                    self.breaker.release()
+                    raise
+                except Exception:
+                    self.breaker.record_failure()
+                    raise
+                self.breaker.record_success(loop.time() - started)
+            
+            delta = cleaner.flush()
+            if delta:
+                yield "token", {"text": delta}
+            
+            sql = self._clean_sql_response("".join(raw_parts))
+            if settings.sql_cache_enabled:
+                self.cache.put(question, fingerprint, sql, embedding)
+            yield "done", {"sql": sql, "status": "success", "cached": False}
+            
+        except SchedulerRejected:
+            print("🚦 LLM queue full, rejecting streaming request")
+            raise
+        except asyncio.TimeoutError:
+            print(f"⏰ Streaming generation exceeded {settings.llm_request_timeout}s deadline")
+            yield "done", {
+                "sql": self._fallback_sql(question),
+                "status": "success",
+                "cached": False,
+                "error": f"Generation exceeded {settings.llm_request_timeout}s deadline"
+            }
+        except Exception as e:
+            print(f"❌ EXCEPTION in astream_sql: {e}")
+            yield "done", {"sql": self._fallback_sql(question), "status": "success", "cached": False, "error": str(e)}
+    
+    async def agenerate_sql_batch(self, questions: list, db_uri: str) -> list:
+        """Generate SQL for many questions, returning (sql, status, error) in input order"""
+        print(f"📦 Starting batch SQL generation for {len(questions)} questions")
+        
+        # Batch work queues behind interactive requests in the scheduler
+        priority_token = current_priority.set("batch")
+        try:
+            return await self._agenerate_batch(questions)
+        finally:
+            current_priority.reset(priority_token)
+    
+    async def _agenerate_batch(self, questions: list) -> list:
+        fingerprint = self.rag.schema_fingerprint
+        results = [None] * len(questions)
+        
+        # Duplicate questions in one batch are generated once
+        positions = {}
+        for i, question in enumerate(questions):
+            positions.setdefault(normalize_question(question), []).append(i)
+        
+        pending = []
+        for key, indexes in positions.items():
+            question = questions[indexes[0]]
+            match = self._match_intent(question) if settings.intent_engine_enabled else None
+            if match is not None:
+                for i in indexes:
+                    results[i] = (match.sql, "success", None)
+                continue
+            if not self._llm_available():
+                sql = f"-- No API key configured\n-- Generated from: {question}\nSELECT * FROM users LIMIT 5;"
+                for i in indexes:
+                    results[i] = (sql, "success", None)
+                continue
+            cached = self.cache.get_exact(question, fingerprint) if settings.sql_cache_enabled else None
+            if cached is not None:
+                for i in indexes:
+                    results[i] = (cached, "success", None)
+            else:
+                pending.append(key)
+        
+        if pending:
+            # One batched encoder pass and one vector query for every remaining question
+            pending_questions = [questions[positions[key][0]] for key in pending]
+            contexts, embeddings = await self.rag.aretrieve_context_batch(pending_questions, top_k=3)
+            
+            batch_semaphore = asyncio.Semaphore(settings.batch_max_concurrency)
+            
+            async def generate_one(n: int, key: str):
+                question = pending_questions[n]
+                embedding = embeddings[n] if embeddings is not None else None
+                if settings.sql_cache_enabled:
+                    cached = self.cache.get_similar(embedding, fingerprint)
+                    if cached is not None:
+                        return key, (cached, "success", None)
+                try:
+                    async with batch_semaphore:
+                        sql = await asyncio.wait_for(
+                            self._agenerate_from_context(question, contexts[n]),
+                            timeout=settings.llm_request_timeout
+                        )
+                    if settings.sql_cache_enabled:
+                        self.cache.put(question, fingerprint, sql, embedding)
+                    return key, (sql, "success", None)
+                except asyncio.TimeoutError:
+                    error = f"Generation exceeded {settings.llm_request_timeout}s deadline"
+                    return key, (self._fallback_sql(question), "error", error)
+                except Exception as e:
+                    print(f"❌ Batch item failed for '{question[:50]}': {e}")
+                    return key, (self._fallback_sql(question), "error", str(e))
+            
+            generated = await asyncio.gather(*[generate_one(n, key) for n, key in enumerate(pending)])
+            for key, result in generated:
+                for i in positions[key]:
+                    results[i] = result
+        
+        print(f"✅ Batch complete: {sum(1 for r in results if r[1] == 'success')}/{len(results)} succeeded")
+        return results
+    
+    def _build_rag_prompt(self, question: str, context: list) -> str:
+        """Build enhanced prompt with retrieved context within the token budget"""
+        print(f"🔨 Building prompt with {len(context)} context items")
+        
+        required = [
+            item for item in (self.rag.join_context(question, context), self.rag.value_context(question, context))
+            if item is not None
+        ]
+        prompt, report = self.prompt_assembler.assemble(question, context, self.rag.schema_info, required=required)
+        self.last_prompt_report = report
+        
+        print(
+            f"✅ Prompt built: ~{report['tokens']}/{report['budget']} tokens, "
+            f"{report['items_used']} items used, {report['items_dropped']} dropped, "
+            f"{report['duplicates_removed']} duplicates, {report['columns_pruned']} columns pruned"
+        )
         return prompt
     
     def _clean_sql_response(self, response: str) -> str:
@@ -201,44 +696,36 @@ SQL QUERY:"""
         print(f"✅ SQL cleaned: '{sql}'")
         return sql
     
-    # Replace your existing _fallback_sql method with this updated version:
-
+    def _match_intent(self, question: str, threshold: float = None):
+        """Run the intent engine against the live schema; None below the threshold"""
+        if threshold is None:
+            threshold = settings.intent_confidence_threshold
+        try:
+            self.intents.load_schema(self.rag.schema_info, self.rag.schema_fingerprint)
+            match = self.intents.match(question)
+        except Exception as e:
+            print(f"⚠️ Intent engine failed: {e}")
+            return None
+        if match is None or match.confidence < threshold:
+            return None
+        return match
+    
     def _fallback_sql(self, question: str) -> str:
         """Generate fallback SQL when RAG/LLM fails"""
         print(f"🔄 Generating fallback SQL for: '{question}'")
         
-        question_lower = question.lower()
-        
-        # Handle DROP TABLE operations
-        if ("delete" in question_lower or "drop" in question_lower) and "table" in question_lower:
-            if "all" in question_lower:
-                fallback = """-- Drop all tables (CASCADE handles dependencies)
-    DROP TABLE IF EXISTS orders CASCADE;
-    DROP TABLE IF EXISTS users CASCADE;
-    DROP TABLE IF EXISTS query_history CASCADE;"""
-            else:
-                fallback = "-- Example: DROP TABLE table_name CASCADE;\nSELECT 'Specify which table to drop' as message;"
-        elif "users" in question_lower and "city" in question_lower:
-            fallback = "SELECT * FROM users WHERE city = 'New York' LIMIT 10;"
-        elif "orders" in question_lower and ("amount" in question_lower or "price" in question_lower):
-            fallback = "SELECT * FROM orders WHERE amount > 100 ORDER BY amount DESC LIMIT 10;"
-        elif "count" in question_lower and "users" in question_lower:
-            fallback = "SELECT COUNT(*) as user_count FROM users;"
-        elif "join" in question_lower or ("users" in question_lower and "orders" in question_lower):
-            fallback = "SELECT u.name, o.product, o.amount FROM users u JOIN orders o ON u.id = o.user_id LIMIT 10;"
-        elif "under" in question_lower and "age" in question_lower:
-            # Handle age-related queries
-            age_match = re.search(r'under\s+(\d+)', question_lower)
-            if age_match:
-                age = age_match.group(1)
-                fallback = f"SELECT * FROM users WHERE age < {age} LIMIT 10;"
-            else:
-                fallback = "SELECT * FROM users WHERE age < 25 LIMIT 10;"
+        # Best-effort intent match, below the fast-path threshold but not a guess
+        match = self._match_intent(question, threshold=settings.intent_fallback_min_confidence)
+        if match is not None:
+            fallback = f"-- Fallback query for: {question} (intent: {match.intent}, confidence {match.confidence:.2f})\n{match.sql}"
         else:
-            fallback = f"-- Fallback query for: {question}\nSELECT * FROM users LIMIT 10;"
+            tables = sorted(self.rag.schema_info)
+            table = "users" if not tables or "users" in tables else tables[0]
+            fallback = f"-- Fallback query for: {question}\nSELECT * FROM {table} LIMIT 10;"
         
         print(f"📋 Generated fallback: {fallback}")
         return fallback
+    
     def learn_from_query(self, question: str, sql: str, success: bool):
         """Learn from query execution results"""
         print(f"📚 Learning from query - Success: {success}")
@@ -251,9 +738,20 @@ SQL QUERY:"""
     def get_llm_status(self):
         """Get current LLM status"""
         return {
-            "llm_available": self.llm is not None,
+            "llm_available": self._has_api_key(),
             "api_key_configured": settings.google_api_key != "dummy-key-for-now",
-            "rag_available": self.rag is not None
+            "model": self.model_name,
+            "warmed_up": self.warmed_up,
+            "rag_available": self.rag is not None,
+            "cache": self.cache.get_stats(),
+            "in_flight_generations": self._in_flight.in_flight(),
+            "last_prompt": self.last_prompt_report,
+            "provider": settings.llm_provider,
+            "hedging": {"enabled": settings.llm_hedging_enabled, **self.hedger.get_stats()},
+            "model_latency": self.latency_tracker.get_stats(),
+            "circuit_breaker": self.breaker.get_state(),
+            "scheduler": self.scheduler.get_stats(),
+            "llm_timeout_seconds": self._adaptive_timeout()
         }
 
 # Global instance
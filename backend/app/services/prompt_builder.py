@@ -0,0 +1,154 @@
+import re
+
+# Rough size of a token for English text and SQL identifiers
+CHARS_PER_TOKEN = 4
+
+PROMPT_TEMPLATE = """You are a PostgreSQL expert. Generate accurate SQL queries based on the provided database knowledge.
+
+RELEVANT DATABASE KNOWLEDGE:
+{context_text}
+
+IMPORTANT RULES:
+1. Return ONLY the SQL query, no explanations or markdown
+2. Use proper PostgreSQL syntax
+3. Include appropriate JOINs when querying multiple tables
+4. Add LIMIT clause for SELECT * queries (typically LIMIT 10)
+5. Use table aliases for better readability
+6. For aggregations, use proper GROUP BY clauses
+7. Use single quotes for string literals
+8. End query with semicolon
+
+USER QUESTION: {question}
+
+SQL QUERY:"""
+
+STOPWORDS = {
+    "the", "a", "an", "of", "in", "from", "with", "where", "is", "are", "and", "to", "for",
+    "by", "on", "show", "list", "get", "all", "me", "what", "which", "how", "many", "table",
+    "this", "that", "use", "used", "contains", "columns", "select", "limit"
+}
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate; close enough to budget prompts without a tokenizer"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def format_columns(columns: list) -> str:
+    """Describe columns the way schema documents do: name (TYPE, NOT NULL, PRIMARY KEY)"""
+    column_details = []
+    for col in columns:
+        col_desc = f"{col['name']} ({col['type']}"
+        if not col.get('nullable', True):
+            col_desc += ", NOT NULL"
+        if col['name'] == 'id':
+            col_desc += ", PRIMARY KEY"
+        col_desc += ")"
+        column_details.append(col_desc)
+    return ", ".join(column_details)
+
+def _words(text: str) -> set:
+    words = set()
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        words.add(word)
+        # Crude singularisation so "users" matches "user_id"
+        if len(word) > 3 and word.endswith("s"):
+            words.add(word[:-1])
+    return words
+
+class PromptAssembler:
+    """Build the RAG prompt under an explicit token budget.
+
+    Context items are deduplicated, schema documents are pruned to the
+    columns relevant to the question, and items are added by relevance until
+    the budget is spent. assemble() returns the prompt and a usage report.
+    """
+
+    def __init__(self, token_budget: int = 1500, max_unmatched_columns: int = 12):
+        self.token_budget = token_budget
+        self.max_unmatched_columns = max_unmatched_columns
+        self.template_tokens = estimate_tokens(PROMPT_TEMPLATE.format(context_text="", question=""))
+
+    def assemble(self, question: str, context: list, schema_info: dict = None, required: list = None):
+        """Return (prompt, report) for the question and retrieved context.
+
+        required items (such as the join path) go in first, ahead of ranking.
+        """
+        question_words = _words(question)
+        report = {
+            "budget": self.token_budget,
+            "items_in": len(context),
+            "duplicates_removed": 0,
+            "columns_pruned": 0,
+            "items_dropped": 0,
+        }
+
+        items = self._deduplicate(context, report)
+        items = [self._prune_schema_item(item, question_words, schema_info, report) for item in items]
+
+        # Lexical overlap with the question, with retrieval rank as a tie-breaker
+        scored = []
+        for rank, item in enumerate(items):
+            overlap = len(question_words & _words(item["content"]))
+            scored.append((overlap + 1.0 / (rank + 1), item))
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        scored = [(None, item) for item in required or []] + scored
+
+        question_tokens = estimate_tokens(question)
+        used = self.template_tokens + question_tokens
+        sections = []
+        for _score, item in scored:
+            line = f"- {item['content']}"
+            cost = estimate_tokens(line) + 1
+            if used + cost > self.token_budget:
+                report["items_dropped"] += 1
+                continue
+            sections.append(line)
+            used += cost
+
+        prompt = PROMPT_TEMPLATE.format(context_text="\n".join(sections), question=question)
+        report["items_used"] = len(sections)
+        report["tokens"] = estimate_tokens(prompt)
+        return prompt, report
+
+    def _deduplicate(self, context: list, report: dict) -> list:
+        unique = []
+        for item in context:
+            content = item["content"].strip()
+            if any(content == kept["content"].strip() or content in kept["content"] for kept in unique):
+                report["duplicates_removed"] += 1
+                continue
+            # A longer item that contains an earlier one replaces it
+            before = len(unique)
+            unique = [kept for kept in unique if kept["content"].strip() not in content]
+            report["duplicates_removed"] += before - len(unique)
+            unique.append(item)
+        return unique
+
+    def _prune_schema_item(self, item: dict, question_words: set, schema_info: dict, report: dict) -> dict:
+        metadata = item.get("metadata") or {}
+        table = metadata.get("table")
+        if metadata.get("type") != "schema" or not schema_info or table not in schema_info:
+            return item
+
+        columns = schema_info[table]
+        relevant, any_mentioned = [], False
+        for col in columns:
+            name = col["name"].lower()
+            mentioned = bool(_words(name.replace("_", " ")) & question_words)
+            any_mentioned = any_mentioned or mentioned
+            if mentioned or name == "id" or name.endswith("_id"):
+                relevant.append(col)
+        if not any_mentioned:
+            # Nothing but keys matched: keep the leading columns instead
+            relevant = columns[:self.max_unmatched_columns]
+        if len(relevant) >= len(columns):
+            return item
+
+        omitted = len(columns) - len(relevant)
+        report["columns_pruned"] += omitted
+        tail = re.search(r"\. (This table is used for .*)$", item["content"])
+        content = f"{table} table contains columns: {format_columns(relevant)} (+{omitted} more columns)."
+        if tail:
+            content += f" {tail.group(1)}"
+        return {"content": content, "metadata": metadata}
@@ -0,0 +1,167 @@
+import re
+import sys
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from app.core.config import settings
+
+def normalize_question(question: str) -> str:
+    """Normalize a question for exact-match lookups"""
+    question = question.lower().strip()
+    question = re.sub(r"[^\w\s]", " ", question)
+    return re.sub(r"\s+", " ", question).strip()
+
+class _CacheEntry:
+    __slots__ = ("sql", "embedding", "created_at", "size")
+
+    def __init__(self, sql: str, embedding, size: int):
+        self.sql = sql
+        self.embedding = embedding
+        self.created_at = time.monotonic()
+        self.size = size
+
+class SemanticQueryCache:
+    """Two-tier NL->SQL cache: exact normalized question, then embedding similarity.
+
+    Entries belong to a schema fingerprint; when the fingerprint changes all
+    entries from the previous schema are dropped.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 16 * 1024 * 1024,
+                 ttl_seconds: float = 3600.0, similarity_threshold: float = 0.92):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self._entries = OrderedDict()
+        self._fingerprint = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, question: str, fingerprint: str, embedding=None):
+        """Return cached SQL for the question, or None on a miss"""
+        sql = self.get_exact(question, fingerprint)
+        if sql is not None:
+            return sql
+        return self.get_similar(embedding, fingerprint)
+
+    def get_exact(self, question: str, fingerprint: str):
+        """Tier one: look up the normalized question (misses are not counted)"""
+        key = normalize_question(question)
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry):
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry.sql
+
+    def get_similar(self, embedding, fingerprint: str):
+        """Tier two: nearest neighbour on the question embedding"""
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            match = self._nearest(embedding) if embedding is not None else None
+            if match is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(match)
+            self.semantic_hits += 1
+            return self._entries[match].sql
+
+    def put(self, question: str, fingerprint: str, sql: str, embedding=None):
+        """Store SQL for the question under the given schema fingerprint"""
+        key = normalize_question(question)
+        if embedding is not None:
+            embedding = self._normalize(embedding)
+        size = sys.getsizeof(key) + sys.getsizeof(sql) + (embedding.nbytes if embedding is not None else 0)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _CacheEntry(sql, embedding, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        """Get hit/miss counters and current size"""
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "schema_fingerprint": self._fingerprint
+        }
+
+    def _check_fingerprint(self, fingerprint: str):
+        if fingerprint != self._fingerprint:
+            if self._entries:
+                print(f"🧹 Schema changed, invalidating {len(self._entries)} cached queries")
+            self._entries.clear()
+            self._bytes = 0
+            self._fingerprint = fingerprint
+
+    def _expired(self, entry: _CacheEntry) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl_seconds
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _nearest(self, embedding):
+        query = self._normalize(embedding)
+        best_key, best_score = None, self.similarity_threshold
+        expired = []
+        for key, entry in self._entries.items():
+            if entry.embedding is None:
+                continue
+            if self._expired(entry):
+                expired.append(key)
+                continue
+            score = float(np.dot(query, entry.embedding))
+            if score >= best_score:
+                best_key, best_score = key, score
+        for key in expired:
+            self._remove(key)
+        return best_key
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+# Global instance
+query_cache = SemanticQueryCache(
+    max_entries=settings.sql_cache_max_entries,
+    max_bytes=settings.sql_cache_max_bytes,
+    ttl_seconds=settings.sql_cache_ttl_seconds,
+    similarity_threshold=settings.sql_cache_similarity_threshold
+)
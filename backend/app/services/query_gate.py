@@ -0,0 +1,207 @@
+from app.core.config import settings
+import json
+import re
+
+READ_KEYWORDS = {"select", "values", "table"}
+STATEMENT_VERBS = READ_KEYWORDS | {"insert", "update", "delete", "merge"}
+SET_OPERATIONS = {"union", "intersect", "except"}
+
+def mask_sql(sql: str) -> str:
+    """Blank out string literals, quoted identifiers and comments, keeping offsets.
+
+    Keyword and parenthesis scans on the masked text cannot be fooled by a
+    'LIMIT' inside a string or a ';' inside a comment.
+    """
+    out = list(sql)
+    i, n = 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        end = None
+        if ch == "-" and sql.startswith("--", i):
+            end = sql.find("\n", i)
+            end = n if end == -1 else end
+        elif ch == "/" and sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            end = n if end == -1 else end + 2
+        elif ch in ("'", '"'):
+            end = i + 1
+            while end < n:
+                if sql[end] == ch:
+                    # Doubled quote is an escaped quote
+                    if end + 1 < n and sql[end + 1] == ch:
+                        end += 2
+                        continue
+                    end += 1
+                    break
+                end += 1
+        elif ch == "$":
+            tag = re.match(r"\$[A-Za-z_]*\$", sql[i:])
+            if tag:
+                close = sql.find(tag.group(0), i + len(tag.group(0)))
+                end = n if close == -1 else close + len(tag.group(0))
+        if end is None:
+            i += 1
+            continue
+        for j in range(i, end):
+            if out[j] != "\n":
+                out[j] = " "
+        i = end
+    return "".join(out)
+
+def strip_terminator(sql: str, masked: str = None) -> str:
+    """The statement up to (not including) its terminating semicolon"""
+    masked = mask_sql(sql) if masked is None else masked
+    end = masked.find(";")
+    return (sql if end == -1 else sql[:end]).rstrip()
+
+def _top_level_words(masked: str) -> list:
+    """Lower-cased words that are not nested inside parentheses"""
+    words, depth = [], 0
+    for token in re.finditer(r"[()]|[A-Za-z_]+", masked):
+        value = token.group(0)
+        if value == "(":
+            depth += 1
+        elif value == ")":
+            depth = max(0, depth - 1)
+        elif depth == 0:
+            words.append(value.lower())
+    return words
+
+def _unwrap(masked: str) -> str:
+    """Drop the statement's leading parentheses: (SELECT ...) UNION (SELECT ...) starts with SELECT"""
+    inner = masked.lstrip()
+    while inner.startswith("("):
+        inner = inner[1:].lstrip()
+    return inner
+
+def statement_verb(masked: str):
+    """The statement's top-level verb, looking past leading parentheses and a WITH list:
+    WITH x AS (...) DELETE ... is a delete"""
+    words = _top_level_words(_unwrap(masked))
+    if not words:
+        return None
+    if words[0] != "with":
+        return words[0]
+    # CTE bodies are parenthesised, so the first verb at depth 0 belongs to the main statement
+    return next((word for word in words[1:] if word in STATEMENT_VERBS), None)
+
+class QueryGate:
+    """Pre-execution analysis of a SELECT before it reaches the database.
+
+    analyze() parses the statement, injects a LIMIT when a SELECT has none,
+    and asks the PostgreSQL planner (EXPLAIN without ANALYZE, so nothing runs)
+    for its estimated cost and row count. Estimates above warn_cost are
+    flagged; above max_cost or max_rows the query is rejected.
+    """
+
+    def __init__(self, default_limit: int = 1000, warn_cost: float = 1e5, max_cost: float = 1e7,
+                 max_rows: float = 1e6, explain_timeout_ms: int = 2000):
+        self.default_limit = default_limit
+        self.warn_cost = warn_cost
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.explain_timeout_ms = explain_timeout_ms
+
+    def analyze(self, sql: str, engine, inject_limit: bool = True, max_rows: float = None):
+        """Return (sql_to_run, report); report["verdict"] is ok, flagged, rejected, unverified or skipped"""
+        if max_rows is None:
+            max_rows = self.max_rows
+        report = {
+            "verdict": "ok",
+            "estimated_cost": None,
+            "estimated_rows": None,
+            "limit_injected": False,
+            "reasons": [],
+        }
+
+        masked = mask_sql(sql)
+        statements = [s for s in masked.split(";") if s.strip()]
+        if len(statements) > 1:
+            report["verdict"] = "rejected"
+            report["reasons"].append("Only a single statement can be executed")
+            return sql, report
+        if not statements:
+            report["verdict"] = "skipped"
+            report["reasons"].append("No SQL statement found")
+            return sql, report
+
+        verb = statement_verb(masked)
+        if verb not in STATEMENT_VERBS:
+            # Not something the gate understands, so nothing vouches for its cost
+            report["verdict"] = "unverified"
+            report["reasons"].append(f"Unrecognized statement ({verb or 'no verb'}), cost not checked")
+            return sql, report
+        if verb not in READ_KEYWORDS:
+            report["verdict"] = "skipped"
+            report["reasons"].append("Only SELECT queries are analyzed")
+            return sql, report
+
+        words = _top_level_words(masked)
+        if inject_limit and "limit" not in words and "fetch" not in words:
+            # A plain SELECT takes a trailing LIMIT; parenthesised queries, set operations,
+            # VALUES and TABLE are wrapped in a subquery instead
+            plain = verb == "select" and not masked.lstrip().startswith("(") and not SET_OPERATIONS & set(words)
+            sql = self._inject_limit(sql, masked) if plain else self._wrap_limit(sql, masked)
+            report["limit_injected"] = True
+            report["reasons"].append(f"Added LIMIT {self.default_limit}")
+
+        try:
+            plan = self._explain(sql, engine)
+        except Exception as e:
+            report["verdict"] = "unverified"
+            report["reasons"].append(f"EXPLAIN failed: {str(e).splitlines()[0][:200]}")
+            return sql, report
+        if plan is None:
+            report["verdict"] = "unverified"
+            report["reasons"].append(f"Cost estimates are not available for {engine.dialect.name}")
+            return sql, report
+
+        cost = float(plan.get("Total Cost", 0.0))
+        rows = float(plan.get("Plan Rows", 0.0))
+        report["estimated_cost"] = cost
+        report["estimated_rows"] = rows
+
+        if cost > self.max_cost:
+            report["verdict"] = "rejected"
+            report["reasons"].append(f"Estimated cost {cost:,.0f} exceeds limit of {self.max_cost:,.0f}")
+        if rows > max_rows:
+            report["verdict"] = "rejected"
+            report["reasons"].append(f"Estimated {rows:,.0f} rows exceeds limit of {max_rows:,.0f}")
+        if report["verdict"] == "ok" and cost > self.warn_cost:
+            report["verdict"] = "flagged"
+            report["reasons"].append(f"Estimated cost {cost:,.0f} is above {self.warn_cost:,.0f}")
+        return sql, report
+
+    def _inject_limit(self, sql: str, masked: str) -> str:
+        # LIMIT goes on its own line so a trailing -- comment cannot swallow it
+        return f"{strip_terminator(sql, masked)}\nLIMIT {self.default_limit};"
+
+    def _wrap_limit(self, sql: str, masked: str) -> str:
+        # The closing parenthesis goes on its own line for the same reason
+        return f"SELECT * FROM (\n{strip_terminator(sql, masked)}\n) AS _gated\nLIMIT {self.default_limit};"
+
+    def _explain(self, sql: str, engine):
+        """Top plan node from EXPLAIN (FORMAT JSON), or None if the dialect has no cost model"""
+        if engine.dialect.name != "postgresql":
+            return None
+        statement = strip_terminator(sql)
+        with engine.connect() as conn:
+            trans = conn.begin()
+            try:
+                conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(self.explain_timeout_ms)}")
+                # exec_driver_sql: no bind-parameter parsing of ':name' in the user's SQL
+                result = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}").scalar()
+            finally:
+                trans.rollback()
+        if isinstance(result, str):
+            result = json.loads(result)
+        return result[0]["Plan"]
+
+# Global instance
+query_gate = QueryGate(
+    default_limit=settings.sql_gate_default_limit,
+    warn_cost=settings.sql_gate_warn_cost,
+    max_cost=settings.sql_gate_max_cost,
+    max_rows=settings.sql_gate_max_rows,
+    explain_timeout_ms=settings.sql_gate_explain_timeout_ms
+)
@@ -1,91 +1,358 @@
-import chromadb
-from sentence_transformers import SentenceTransformer
+import asyncio
+import threading
 import json
+import hashlib
 import decimal
 import datetime
-from sqlalchemy import create_engine, inspect, text
+import numpy as np
+from sqlalchemy import text
 from app.core.config import settings
+from app.services.prompt_builder import format_columns
+from app.services.embedding_engine import embedding_engine
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from app.services.learned_examples import LearnedExampleStore
+from app.services.knowledge_stats import CountedCollection
+from app.services.schema_catalog import schema_catalog
+from app.services.table_sampler import table_sampler
+from app.services.join_graph import JoinGraph
+from app.services.value_index import value_index
+
+# Documents that rarely share words with a question but are always worth ranking.
+# Relationship documents are per table and name their tables, so BM25 finds them.
+GENERAL_TYPES = {"pattern", "example", "tip"}
 
 class RAGService:
-    def __init__(self):
-        print("🔧 Initializing RAG Service...")
-        
-        # Initialize ChromaDB client
-        self.client = chromadb.PersistentClient(path="./chroma_db")
+    def __init__(self, catalog=None, sampler=None, values=None, collection_name: str = "sql_knowledge",
+                 index_path: str = None):
+        print(f"🔧 Initializing RAG Service ({collection_name})...")
         
-        # Create or get collection
-        try:
-            self.collection = self.client.get_collection("sql_knowledge")
-            print("📚 Found existing knowledge base")
-        except:
-            self.collection = self.client.create_collection("sql_knowledge")
-            print("📚 Created new knowledge base")
+        # ChromaDB, the sentence transformer and the schema fingerprint are all
+        # loaded on first use (or by warm_up) so importing this module is cheap
+        self._client = None
+        self._collection = None
+        self.embedder = embedding_engine
+        self.lexical = LexicalIndex()
+        # Catalog, sampler, value dictionary and collection all belong to one database
+        self.catalog = catalog or schema_catalog
+        self.sampler = sampler or table_sampler
+        self.values = values or value_index
+        self.collection_name = collection_name
+        self.index_path = index_path or settings.vector_index_path
+        self.joins = JoinGraph(
+            max_hops=settings.join_path_max_hops,
+            hub_degree=settings.join_path_hub_degree,
+            max_tables=settings.join_path_max_tables
+        )
+        self.learned = LearnedExampleStore(
+            self,
+            max_examples=settings.learned_examples_max,
+            similarity_threshold=settings.learned_examples_similarity,
+            batch_size=settings.learned_examples_batch_size,
+            flush_seconds=settings.learned_examples_flush_seconds,
+            half_life_days=settings.learned_examples_half_life_days
+        )
+        self._schema_fingerprint = None
+        self._lock = threading.RLock()
+        self.ready = False
+    
+    @property
+    def collection(self):
+        """Vector collection (Chroma, or the in-process NumPy index), opened on first use"""
+        if self._collection is None:
+            with self._lock:
+                if self._collection is not None:
+                    return self._collection
+                if settings.vector_backend == "numpy":
+                    from app.services.vector_index import NumpyVectorIndex
+                    
+                    collection = NumpyVectorIndex(self.index_path, dtype=settings.vector_index_dtype)
+                    print(f"📚 Loaded in-process vector index with {collection.count()} items")
+                else:
+                    import chromadb
+                    
+                    # Initialize ChromaDB client
+                    self._client = chromadb.PersistentClient(path="./chroma_db")
+                    
+                    # Create or get collection
+                    try:
+                        collection = self._client.get_collection(self.collection_name)
+                        print("📚 Found existing knowledge base")
+                    except:
+                        collection = self._client.create_collection(self.collection_name)
+                        print("📚 Created new knowledge base")
+                
+                # Every write goes through the wrapper so per-type counts stay current;
+                # it is published only once wrapped so no caller sees the bare collection
+                self._collection = CountedCollection(collection)
+        return self._collection
+    
+    @property
+    def encoder(self):
+        """Sentence transformer behind the shared embedding engine"""
+        return self.embedder.model
+    
+    @property
+    def schema_info(self):
+        """{table: columns} from the shared catalog snapshot"""
+        return self.catalog.snapshot.schema_info
+    
+    @property
+    def join_graph(self):
+        """Foreign-key graph of the current catalog snapshot"""
+        self.joins.ensure(self.catalog.snapshot)
+        return self.joins
+    
+    @property
+    def schema_fingerprint(self):
+        """Fingerprint of the live schema, used to invalidate cached answers"""
+        if self._schema_fingerprint is None:
+            self._schema_fingerprint = self.compute_schema_fingerprint(self.schema_info)
+        return self._schema_fingerprint
+    
+    @schema_fingerprint.setter
+    def schema_fingerprint(self, value):
+        self._schema_fingerprint = value
+    
+    def warm_up(self):
+        """Load the encoder, fingerprint the schema, sync the knowledge base and load learned examples"""
+        print("🔥 Warming up RAG Service...")
+        self.encoder  # loads the model
+        self.refresh_schema_fingerprint()
+        self.populate_knowledge_base(self.schema_info)
+        self.learned.load()
+        self.ready = True
+        print("✅ RAG Service warm")
+    
+    def compute_schema_fingerprint(self, schema_info=None):
+        """Hash table names, column names, types and nullability"""
+        if schema_info is None:
+            schema_info = self._get_schema_info()
         
-        # Initialize sentence transformer
-        print("🤖 Loading sentence transformer model...")
-        self.encoder = SentenceTransformer('all-MiniLM-L6-v2')
+        canonical = []
+        for table_name in sorted(schema_info):
+            columns = sorted(
+                (col['name'], str(col['type']), bool(col.get('nullable', True)))
+                for col in schema_info[table_name]
+            )
+            canonical.append([table_name, columns])
         
-        # Populate knowledge base
-        self.populate_knowledge_base()
+        return hashlib.sha256(json.dumps(canonical).encode()).hexdigest()[:16]
     
-    def populate_knowledge_base(self):
-        """Populate vector DB with database knowledge"""
+    def refresh_schema_fingerprint(self):
+        """Reload the catalog snapshot and fingerprint, returning True if it changed"""
+        fingerprint = self.compute_schema_fingerprint(self.catalog.refresh().schema_info)
+        changed = fingerprint != self._schema_fingerprint
+        self.schema_fingerprint = fingerprint
+        if changed:
+            print(f"🔄 Schema fingerprint changed: {fingerprint}")
+        return changed
+    
+    def populate_knowledge_base(self, schema_info=None):
+        """Sync the vector DB with the live schema, re-indexing only what changed.
+
+        Each table's schema and sample documents carry a fingerprint of its
+        columns and constraints; tables whose fingerprint matches are skipped,
+        dropped tables lose their documents. Samples are also refreshed for
+        tables whose rows changed or that a previous sync did not get to
+        (recorded as sampled_version on the schema document). Returns a
+        summary of the sync.
+        """
+        print("🔄 Syncing knowledge base...")
         
-        # Check if already populated
-        if self.collection.count() > 0:
-            print("✅ Knowledge base already populated with", self.collection.count(), "items")
-            return
+        # Get dynamic schema information
+        if schema_info is None:
+            schema_info = self._get_schema_info()
+        snapshot = self.catalog.snapshot
+        constraints = snapshot.constraints
+        fingerprints = {
+            table_name: self.compute_table_fingerprint(columns, constraints.get(table_name))
+            for table_name, columns in schema_info.items()
+        }
         
-        print("🔄 Populating knowledge base...")
+        stored = self._stored_schema_metadata()
+        changed = [table_name for table_name, fingerprint in fingerprints.items() if stored.get(table_name, {}).get("fingerprint") != fingerprint]
+        removed = [table_name for table_name in stored if table_name not in fingerprints]
         
-        # Get dynamic schema information
-        schema_info = self._get_schema_info()
-        sample_data = self._get_sample_data()
+        # Tables without a modification counter are sampled once per schema change
+        data_versions = self.sampler.data_versions(snapshot)
+        sample_versions = {table_name: data_versions.get(table_name, "static") for table_name in fingerprints}
+        to_sample = [
+            table_name for table_name in fingerprints
+            if table_name in changed or stored[table_name].get("sampled_version") != sample_versions[table_name]
+        ]
         
         knowledge_items = []
+        stale_ids = []
+        for table_name in removed:
+            stale_ids.extend([f"{table_name}_schema", f"{table_name}_samples"])
+        
+        # Add sample data context
+        print(f"📝 Sampling {len(to_sample)} tables...")
+        sample_data, sampling_pending = self.sampler.sample(snapshot, to_sample)
+        sampled_unchanged = []
+        for table_name in to_sample:
+            if table_name not in sample_data:
+                if table_name in changed:
+                    # The old samples predate the schema change
+                    stale_ids.append(f"{table_name}_samples")
+                continue
+            if table_name not in changed:
+                sampled_unchanged.append(table_name)
+            samples = [self._convert_row_to_json(row) for row in sample_data[table_name]]
+            if not samples:
+                stale_ids.append(f"{table_name}_samples")
+                continue
+            try:
+                sample_str = json.dumps(samples[:3], default=str)
+                knowledge_items.append({
+                    "id": f"{table_name}_samples",
+                    "content": f"Sample data from {table_name} table: {sample_str}",
+                    "metadata": {"type": "sample_data", "table": table_name, "fingerprint": fingerprints[table_name]}
+                })
+            except Exception as e:
+                print(f"⚠️ Warning: Could not serialize sample data for {table_name}: {e}")
         
         # Add schema information
-        print("📊 Adding schema information...")
-        for table_name, columns in schema_info.items():
-            column_details = []
-            for col in columns:
-                col_desc = f"{col['name']} ({col['type']}"
-                if not col['nullable']:
-                    col_desc += ", NOT NULL"
-                if col['name'] == 'id':
-                    col_desc += ", PRIMARY KEY"
-                col_desc += ")"
-                column_details.append(col_desc)
-            
+        print(f"📊 Adding schema information for {len(changed)} changed tables...")
+        for table_name in changed:
+            columns = schema_info[table_name]
+            metadata = {"type": "schema", "table": table_name, "fingerprint": fingerprints[table_name]}
+            if table_name in sample_data:
+                metadata["sampled_version"] = sample_versions[table_name]
             knowledge_items.append({
                 "id": f"{table_name}_schema",
-                "content": f"{table_name} table contains columns: {', '.join(column_details)}. This table is used for storing {self._get_table_description(table_name)}.",
-                "metadata": {"type": "schema", "table": table_name}
+                "content": f"{table_name} table contains columns: {format_columns(columns)}. This table is used for storing {self._get_table_description(table_name)}.",
+                "metadata": metadata
             })
         
-        # Add sample data context
-        print("📝 Adding sample data...")
-        for table_name, samples in sample_data.items():
-            if samples:
-                try:
-                    sample_str = json.dumps(samples[:3], default=str)
-                    knowledge_items.append({
-                        "id": f"{table_name}_samples",
-                        "content": f"Sample data from {table_name} table: {sample_str}",
-                        "metadata": {"type": "sample_data", "table": table_name}
-                    })
-                except Exception as e:
-                    print(f"⚠️ Warning: Could not serialize sample data for {table_name}: {e}")
+        # Relationships, patterns, examples and tips are re-indexed only when their text changes
+        static_items = self._changed_items(self._static_knowledge_items())
+        knowledge_items.extend(static_items)
         
-        # Add relationship information
+        # One relationship document per table, from the foreign-key graph
         print("🔗 Adding table relationships...")
-        knowledge_items.extend([
-            {
-                "id": "users_orders_relationship",
-                "content": "users and orders tables are related through user_id. orders.user_id is a foreign key referencing users.id. To get user information with their orders, use JOIN: SELECT u.name, o.product FROM users u JOIN orders o ON u.id = o.user_id",
-                "metadata": {"type": "relationship", "tables": "users,orders"}
+        relationship_items = self.join_graph.table_documents()
+        stale_ids.extend(self._stale_relationship_ids({item["id"] for item in relationship_items}))
+        relationship_items = self._changed_items(relationship_items)
+        knowledge_items.extend(relationship_items)
+        
+        if knowledge_items:
+            self._upsert_items(knowledge_items)
+        if sampled_unchanged:
+            # Record the resampling on the unchanged schema documents, metadata only
+            try:
+                self.collection.update(
+                    ids=[f"{table_name}_schema" for table_name in sampled_unchanged],
+                    metadatas=[
+                        {**stored[table_name], "sampled_version": sample_versions[table_name]}
+                        for table_name in sampled_unchanged
+                    ]
+                )
+            except Exception as e:
+                print(f"⚠️ Could not record sampled tables: {e}")
+        if stale_ids:
+            try:
+                self.collection.delete(ids=stale_ids)
+                self.lexical.delete(stale_ids)
+            except Exception as e:
+                print(f"⚠️ Could not delete stale knowledge items: {e}")
+        self._ensure_lexical_index()
+        
+        value_sync = None
+        if settings.value_index_enabled:
+            try:
+                value_sync = self.values.refresh(snapshot, {
+                    table_name: f"{fingerprints[table_name]}:{sample_versions[table_name]}"
+                    for table_name in fingerprints
+                })
+            except Exception as e:
+                print(f"⚠️ Could not refresh value dictionary: {e}")
+        
+        summary = {
+            "tables": len(fingerprints),
+            "changed_tables": changed,
+            "removed_tables": removed,
+            "unchanged_tables": len(fingerprints) - len(changed),
+            "tables_sampled": len(sample_data),
+            "sampling_pending": sampling_pending,
+            "static_items_updated": len(static_items),
+            "relationships_updated": len(relationship_items),
+            "items_upserted": len(knowledge_items),
+            "items_deleted": len(stale_ids),
+            "value_dictionary": value_sync
+        }
+        print(
+            f"✅ Knowledge base synced: {len(changed)} tables changed, {len(removed)} removed, "
+            f"{summary['unchanged_tables']} unchanged, {len(sample_data)} sampled ({len(sampling_pending)} pending), "
+            f"{len(static_items)} static items updated"
+        )
+        return summary
+    
+    def _ensure_lexical_index(self):
+        """Build the BM25 index from the collection once; later writes keep it in sync"""
+        if self.lexical.built:
+            return
+        with self._lock:
+            if self.lexical.built:
+                return
+            try:
+                stored = self.collection.get(include=["documents", "metadatas"])
+                self.lexical.rebuild(stored.get("ids") or [], stored.get("documents") or [], stored.get("metadatas") or [])
+                print(f"🔤 Built lexical index over {len(self.lexical)} documents")
+            except Exception as e:
+                print(f"⚠️ Could not build lexical index: {e}")
+    
+    def compute_table_fingerprint(self, columns: list, constraints: dict = None):
+        """Hash one table's columns, types, nullability, defaults and key constraints"""
+        canonical = [
+            sorted(
+                (col['name'], str(col['type']), bool(col.get('nullable', True)), str(col.get('default')))
+                for col in columns
+            ),
+            constraints or {}
+        ]
+        return hashlib.sha256(json.dumps(canonical, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    
+    def _stored_schema_metadata(self):
+        """{table: metadata} of the schema documents in the collection (fingerprint, sampled_version)"""
+        try:
+            stored = self.collection.get(where={"type": "schema"}, include=["metadatas"])
+        except Exception as e:
+            print(f"⚠️ Could not read stored schema metadata: {e}")
+            return {}
+        return {
+            metadata["table"]: metadata
+            for metadata in stored.get("metadatas") or []
+            if metadata and metadata.get("table")
+        }
+    
+    def _stale_relationship_ids(self, current_ids: set):
+        """Stored relationship documents the foreign-key graph no longer produces"""
+        try:
+            stored = self.collection.get(where={"type": "relationship"}, include=["metadatas"])
+        except Exception as e:
+            print(f"⚠️ Could not read stored relationships: {e}")
+            return []
+        return [item_id for item_id in stored.get("ids") or [] if item_id not in current_ids]
+    
+    def _changed_items(self, items: list):
+        """Items whose content differs from what is stored under the same id"""
+        for item in items:
+            item["metadata"]["content_hash"] = hashlib.sha256(item["content"].encode()).hexdigest()[:16]
+        try:
+            stored = self.collection.get(ids=[item["id"] for item in items], include=["metadatas"])
+            stored_hashes = {
+                item_id: (metadata or {}).get("content_hash")
+                for item_id, metadata in zip(stored.get("ids") or [], stored.get("metadatas") or [])
             }
-        ])
+        except Exception as e:
+            print(f"⚠️ Could not read stored knowledge items: {e}")
+            stored_hashes = {}
+        return [item for item in items if stored_hashes.get(item["id"]) != item["metadata"]["content_hash"]]
+    
+    def _static_knowledge_items(self):
+        """Hand-written query patterns, examples and PostgreSQL tips"""
+        knowledge_items = []
         
         # Add common query patterns
         print("🎯 Adding query patterns...")
@@ -183,9 +450,16 @@ class RAGService:
         
         knowledge_items.extend(postgres_tips)
         
+        return knowledge_items
+    
+    def _upsert_items(self, knowledge_items: list):
+        """Embed and upsert knowledge items, falling back to one at a time on error"""
+        # Embed with our own engine (cached by content) instead of Chroma's default function
+        documents = [item["content"] for item in knowledge_items]
+        embeddings = self.embedder.encode(documents).tolist()
+        
         try:
             # Prepare data for ChromaDB
-            documents = [item["content"] for item in knowledge_items]
             metadatas = [item["metadata"] for item in knowledge_items]
             ids = [item["id"] for item in knowledge_items]
             
@@ -203,20 +477,22 @@ class RAGService:
                 cleaned_metadatas.append(cleaned_metadata)
             
             # Add to ChromaDB
-            self.collection.add(
+            self.collection.upsert(
                 documents=documents,
+                embeddings=embeddings,
                 metadatas=cleaned_metadatas,
                 ids=ids
             )
             
-            print(f"✅ Added {len(knowledge_items)} items to knowledge base")
+            self.lexical.upsert(ids, documents, cleaned_metadatas)
+            print(f"✅ Upserted {len(knowledge_items)} items into knowledge base")
             
         except Exception as e:
-            print(f"❌ Error adding to knowledge base: {e}")
+            print(f"❌ Error upserting into knowledge base: {e}")
             # Fallback: try adding items one by one
             print("🔄 Trying to add items individually...")
             success_count = 0
-            for item in knowledge_items:
+            for item, embedding in zip(knowledge_items, embeddings):
                 try:
                     # Clean metadata for individual item
                     cleaned_metadata = {}
@@ -228,11 +504,13 @@ class RAGService:
                         else:
                             cleaned_metadata[key] = str(value)
                     
-                    self.collection.add(
+                    self.collection.upsert(
                         documents=[item["content"]],
+                        embeddings=[embedding],
                         metadatas=[cleaned_metadata],
                         ids=[item["id"]]
                     )
+                    self.lexical.upsert([item["id"]], [item["content"]], [cleaned_metadata])
                     success_count += 1
                 except Exception as item_error:
                     print(f"⚠️ Failed to add item {item['id']}: {item_error}")
@@ -240,49 +518,13 @@ class RAGService:
             print(f"✅ Successfully added {success_count} items individually")
     
     def _get_schema_info(self):
-        """Get schema information from database"""
+        """Get schema information from the catalog snapshot"""
         try:
-            engine = create_engine(settings.database_url)
-            inspector = inspect(engine)
-            
-            schema_info = {}
-            for table_name in inspector.get_table_names():
-                columns = inspector.get_columns(table_name)
-                schema_info[table_name] = columns
-            
-            return schema_info
+            return self.catalog.snapshot.schema_info
         except Exception as e:
             print(f"❌ Error getting schema: {e}")
             return {}
     
-    def _get_sample_data(self):
-        """Get sample data from each table"""
-        try:
-            engine = create_engine(settings.database_url)
-            sample_data = {}
-            
-            with engine.connect() as conn:
-                # Get sample from users
-                try:
-                    result = conn.execute(text("SELECT * FROM users LIMIT 3"))
-                    sample_data["users"] = [self._convert_row_to_json(dict(row._mapping)) for row in result]
-                except Exception as e:
-                    print(f"⚠️ Could not get sample data from users: {e}")
-                    sample_data["users"] = []
-                
-                # Get sample from orders
-                try:
-                    result = conn.execute(text("SELECT * FROM orders LIMIT 3"))
-                    sample_data["orders"] = [self._convert_row_to_json(dict(row._mapping)) for row in result]
-                except Exception as e:
-                    print(f"⚠️ Could not get sample data from orders: {e}")
-                    sample_data["orders"] = []
-            
-            return sample_data
-        except Exception as e:
-            print(f"❌ Error getting sample data: {e}")
-            return {"users": [], "orders": []}
-    
     def _convert_row_to_json(self, row):
         """Convert database row to JSON-serializable format"""
         converted = {}
@@ -311,22 +553,26 @@ class RAGService:
     
     def retrieve_context(self, query: str, top_k: int = 5):
         """Retrieve relevant context for user query"""
+        embedding = None
+        if settings.retrieval_mode != "lexical":
+            try:
+                embedding = self.embedder.encode_one(query)
+            except Exception as e:
+                print(f"❌ Error embedding query: {e}")
+                if settings.retrieval_mode == "dense":
+                    return []
+        return self.retrieve_context_for_embedding(query, embedding, top_k)
+    
+    def retrieve_context_for_embedding(self, query: str, embedding, top_k: int = 5):
+        """Retrieve context for a query that has already been embedded (None: lexical only)"""
         try:
             print(f"🔍 Searching knowledge base for: '{query[:50]}...'")
             
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=top_k
-            )
-            
-            context = []
-            if results['documents'] and results['documents'][0]:
-                for doc, metadata in zip(results['documents'][0], results['metadatas'][0]):
-                    context.append({
-                        "content": doc,
-                        "metadata": metadata
-                    })
-                
+            if settings.retrieval_mode == "dense" and embedding is not None:
+                context = self._query_collection([embedding], top_k)[0]
+            else:
+                context = self._hybrid_context(query, embedding, top_k)
+            if context:
                 print(f"✅ Found {len(context)} relevant context items")
             else:
                 print("⚠️ No context found in knowledge base")
@@ -336,46 +582,176 @@ class RAGService:
             print(f"❌ Error retrieving context: {e}")
             return []
     
-    def add_successful_query(self, question: str, sql: str):
-        """Learn from successful queries"""
+    def _hybrid_context(self, query: str, embedding, top_k: int):
+        """Hybrid retrieval for one question; see _hybrid_contexts"""
+        return self._hybrid_contexts([query], [embedding], top_k)[0]
+    
+    def _hybrid_contexts(self, queries: list, embeddings: list, top_k: int):
+        """BM25 narrows the candidates, dense similarity re-ranks them, RRF fuses both.
+
+        Without an embedding the BM25 ranking is used as is. Questions sharing
+        no term with any document fall back to a full dense search. A batch
+        encodes the union of all candidates once, scores every question with
+        one matrix product and runs at most one vector query.
+        """
+        self._ensure_lexical_index()
+        contexts = [None] * len(queries)
+        lexical_rankings = {}
+        dense_fallback = []
+        for i, (query, embedding) in enumerate(zip(queries, embeddings)):
+            lexical_ids = [doc_id for doc_id, _ in self.lexical.search(query, settings.lexical_candidates)]
+            if embedding is None:
+                self.learned.touch(lexical_ids[:top_k])
+                contexts[i] = [dict(self.lexical.document(doc_id)) for doc_id in lexical_ids[:top_k]]
+            elif not lexical_ids:
+                dense_fallback.append(i)
+            else:
+                lexical_rankings[i] = lexical_ids
+        
+        if dense_fallback:
+            for i, context in zip(dense_fallback, self._query_collection([embeddings[i] for i in dense_fallback], top_k)):
+                contexts[i] = context
+        if not lexical_rankings:
+            return contexts
+        
+        general_ids = self.lexical.ids_of_type(GENERAL_TYPES)
+        candidates = {i: list(dict.fromkeys(ids + general_ids)) for i, ids in lexical_rankings.items()}
+        union = list(dict.fromkeys(doc_id for ids in candidates.values() for doc_id in ids))
+        position = {doc_id: row for row, doc_id in enumerate(union)}
+        
+        # Candidate vectors come from the embedding cache filled at indexing time
+        vectors = self.embedder.encode([self.lexical.document(doc_id)["content"] for doc_id in union])
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        order = list(lexical_rankings)
+        query_vectors = np.asarray([np.asarray(embeddings[i], dtype=np.float32).ravel() for i in order])
+        query_vectors = query_vectors / np.maximum(np.linalg.norm(query_vectors, axis=1, keepdims=True), 1e-12)
+        scores = vectors @ query_vectors.T
+        
+        for column, i in enumerate(order):
+            rows = np.asarray([position[doc_id] for doc_id in candidates[i]])
+            dense_ids = [union[row] for row in rows[np.argsort(-scores[rows, column])]]
+            fused = reciprocal_rank_fusion([lexical_rankings[i], dense_ids], k=settings.rrf_k)
+            self.learned.touch(fused[:top_k])
+            contexts[i] = [dict(self.lexical.document(doc_id)) for doc_id in fused[:top_k]]
+        return contexts
+    
+    def _query_collection(self, embeddings, top_k: int):
+        """One vector query for many embeddings; returns a context list per embedding"""
+        results = self.collection.query(
+            query_embeddings=[list(map(float, vector)) for vector in embeddings],
+            n_results=top_k
+        )
+        
+        for ids in results.get('ids') or []:
+            self.learned.touch(ids)
+        
+        contexts = []
+        documents = results.get('documents') or []
+        metadatas = results.get('metadatas') or []
+        for i in range(len(embeddings)):
+            docs = documents[i] if i < len(documents) else []
+            metas = metadatas[i] if i < len(metadatas) else []
+            contexts.append([
+                {"content": doc, "metadata": metadata}
+                for doc, metadata in zip(docs, metas)
+            ])
+        return contexts
+    
+    def retrieve_context_batch(self, queries: list, top_k: int = 5):
+        """Retrieve context for many queries with one encoder pass and one vector query"""
+        if not queries:
+            return [], []
         try:
-            query_id = f"learned_{hash(question + sql)}"
+            print(f"🔍 Batch searching knowledge base for {len(queries)} queries")
             
-            # Check if already exists
-            try:
-                existing = self.collection.get(ids=[query_id])
-                if existing['ids']:
-                    return  # Already learned this query
-            except:
-                pass
+            embeddings = self.embedder.encode(queries)
+            if settings.retrieval_mode == "dense":
+                contexts = self._query_collection(embeddings, top_k)
+            else:
+                contexts = self._hybrid_contexts(queries, list(embeddings), top_k)
             
-            self.collection.add(
-                documents=[f"Question: '{question}' generates SQL: {sql}"],
-                metadatas=[{"type": "learned_example", "success": True}],
-                ids=[query_id]
-            )
-            print(f"✅ Learned new query pattern from: '{question[:30]}...'")
+            print(f"✅ Retrieved context for {len(contexts)} queries")
+            return contexts, embeddings
+        except Exception as e:
+            print(f"❌ Error retrieving batch context: {e}")
+            return [[] for _ in queries], None
+    
+    async def aretrieve_context_batch(self, queries: list, top_k: int = 5):
+        """Batch retrieval without blocking the event loop"""
+        return await asyncio.to_thread(self.retrieve_context_batch, queries, top_k)
+    
+    async def aembed_query(self, query: str):
+        """Embed a question, micro-batched with concurrent requests; None until the model is loaded"""
+        if not self.embedder.loaded:
+            return None
+        return await self.embedder.aencode(query)
+    
+    async def aretrieve_context(self, query: str, top_k: int = 5):
+        """Retrieve context without blocking the event loop; lexical only until the model is loaded"""
+        embedding = None
+        if settings.retrieval_mode != "lexical" and self.embedder.loaded:
+            try:
+                embedding = await self.embedder.aencode(query)
+            except Exception as e:
+                print(f"❌ Error embedding query: {e}")
+        return await asyncio.to_thread(self.retrieve_context_for_embedding, query, embedding, top_k)
+    
+    def join_context(self, question: str, context: list):
+        """Context item with the join path between the tables the question touches, or None"""
+        try:
+            graph = self.join_graph
+            description = graph.describe(graph.relevant_tables(question, context))
+        except Exception as e:
+            print(f"⚠️ Could not find join path: {e}")
+            return None
+        if description is None:
+            return None
+        return {"content": description, "metadata": {"type": "join_path"}}
+    
+    def value_context(self, question: str, context: list):
+        """Context item with the stored values that literals in the question refer to, or None"""
+        if not settings.value_index_enabled:
+            return None
+        try:
+            tables = self.join_graph.relevant_tables(question, context)
+            # Prefer the tables the question is about, then any table
+            matches = (tables and self.values.match(question, tables)) or self.values.match(question)
+            description = self.values.describe(matches)
+        except Exception as e:
+            print(f"⚠️ Could not match column values: {e}")
+            return None
+        if description is None:
+            return None
+        return {"content": description, "metadata": {"type": "value_hint"}}
+    
+    def flush(self):
+        """Write buffered learned examples and knowledge base counters, e.g. on shutdown"""
+        self.learned.flush()
+        if self._collection is not None:
+            self._collection.flush_counts()
+    
+    def add_successful_query(self, question: str, sql: str):
+        """Learn from successful queries (deduplicated and written in batches by the learned-example store)"""
+        try:
+            self.learned.add(question, sql)
+            print(f"✅ Learned query pattern from: '{question[:30]}...'")
         except Exception as e:
             print(f"❌ Error adding learned query: {e}")
     
-    def get_knowledge_stats(self):
-        """Get statistics about the knowledge base"""
+    def get_knowledge_stats(self, verify: bool = False):
+        """Get statistics about the knowledge base from the maintained per-type counters.
+
+        verify=True also recounts the types with a metadata-only scan and
+        repairs the counters if they drifted.
+        """
         try:
-            total_items = self.collection.count()
-            
-            # Get breakdown by type
-            all_items = self.collection.get()
-            type_counts = {}
-            
-            if all_items['metadatas']:
-                for metadata in all_items['metadatas']:
-                    item_type = metadata.get('type', 'unknown')
-                    type_counts[item_type] = type_counts.get(item_type, 0) + 1
-            
-            return {
-                "total_items": total_items,
-                "breakdown": type_counts
+            stats = {
+                "total_items": self.collection.count(),
+                "breakdown": self.collection.type_counts()
             }
+            if verify:
+                stats["verification"] = self.collection.verify()
+            return stats
         except Exception as e:
             print(f"❌ Error getting knowledge stats: {e}")
             return {"total_items": 0, "breakdown": {}}
@@ -0,0 +1,63 @@
+import datetime
+import decimal
+import json
+import uuid
+
+def json_value(value):
+    """json.dumps default for database values"""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return str(value)
+
+def _dumps(value) -> str:
+    return json.dumps(value, default=json_value, separators=(",", ":"))
+
+async def ndjson_stream(columns: list, batches, gate: dict = None):
+    """NDJSON: a {"columns", "gate"} line, one JSON array per row in column order, then a
+    {"status", "row_count"} line (with "error" if the query failed part way)"""
+    row_count = 0
+    try:
+        yield _dumps({"columns": columns, "gate": gate}) + "\n"
+        try:
+            async for _, rows in batches:
+                if rows:
+                    row_count += len(rows)
+                    # One chunk per fetch keeps writes large and memory bounded by fetch_size
+                    yield "".join(_dumps(list(row)) + "\n" for row in rows)
+        except Exception as e:
+            print(f"SQL Streaming Error: {str(e)}")
+            yield _dumps({"status": "error", "error": str(e), "row_count": row_count}) + "\n"
+            return
+        yield _dumps({"status": "success", "row_count": row_count}) + "\n"
+    finally:
+        # Release the cursor's connection right away if the client went away
+        await batches.aclose()
+
+async def json_stream(columns: list, batches, gate: dict = None):
+    """One JSON document shaped like QueryExecuteResponse ({"results": [{column: value}], ...}),
+    written a fetch at a time"""
+    row_count = 0
+    try:
+        yield '{"columns":' + _dumps(columns) + ',"gate":' + _dumps(gate) + ',"results":['
+        error = None
+        try:
+            async for _, rows in batches:
+                if rows:
+                    chunk = ",".join(_dumps(dict(zip(columns, row))) for row in rows)
+                    yield ("," if row_count else "") + chunk
+                    row_count += len(rows)
+        except Exception as e:
+            print(f"SQL Streaming Error: {str(e)}")
+            error = str(e)
+        status = "success" if error is None else "error"
+        yield '],"row_count":' + str(row_count) + ',"status":' + _dumps(status) + ',"error":' + _dumps(error) + "}"
+    finally:
+        await batches.aclose()
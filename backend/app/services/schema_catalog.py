@@ -0,0 +1,273 @@
+import threading
+import time
+from sqlalchemy import inspect, text
+from app.core.config import settings
+from app.db.database import engine
+
+PG_COLUMNS = """
+SELECT n.nspname AS table_schema, c.relname AS table_name, a.attname AS column_name,
+       format_type(a.atttypid, a.atttypmod) AS data_type, NOT a.attnotnull AS nullable,
+       pg_get_expr(d.adbin, d.adrelid) AS column_default, c.reltuples AS estimated_rows
+FROM pg_attribute a
+JOIN pg_class c ON c.oid = a.attrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+WHERE c.relkind IN ('r', 'p') AND NOT c.relispartition
+  AND a.attnum > 0 AND NOT a.attisdropped
+  AND n.nspname = ANY(:schemas)
+ORDER BY n.nspname, c.relname, a.attnum
+"""
+
+PG_CONSTRAINTS = """
+SELECT n.nspname AS table_schema, c.relname AS table_name, con.contype AS kind,
+       rn.nspname AS referred_schema, rc.relname AS referred_table,
+       ARRAY(SELECT a.attname FROM unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+             JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+             ORDER BY k.ord) AS columns,
+       ARRAY(SELECT a.attname FROM unnest(con.confkey) WITH ORDINALITY AS k(attnum, ord)
+             JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.attnum
+             ORDER BY k.ord) AS referred_columns
+FROM pg_constraint con
+JOIN pg_class c ON c.oid = con.conrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+LEFT JOIN pg_class rc ON rc.oid = con.confrelid
+LEFT JOIN pg_namespace rn ON rn.oid = rc.relnamespace
+WHERE con.contype IN ('p', 'f') AND n.nspname = ANY(:schemas)
+ORDER BY n.nspname, c.relname, con.conname
+"""
+
+PG_INDEXES = """
+SELECT n.nspname AS table_schema, t.relname AS table_name, i.relname AS index_name,
+       ix.indisunique AS is_unique,
+       ARRAY(SELECT a.attname FROM unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+             JOIN pg_attribute a ON a.attrelid = ix.indrelid AND a.attnum = k.attnum
+             ORDER BY k.ord) AS columns
+FROM pg_index ix
+JOIN pg_class t ON t.oid = ix.indrelid
+JOIN pg_class i ON i.oid = ix.indexrelid
+JOIN pg_namespace n ON n.oid = t.relnamespace
+WHERE t.relkind IN ('r', 'p') AND NOT ix.indisprimary AND n.nspname = ANY(:schemas)
+ORDER BY n.nspname, t.relname, i.relname
+"""
+
+class TableInfo:
+    """One table of the snapshot: columns, keys and indexes"""
+    __slots__ = ("schema", "name", "key", "columns", "primary_key", "foreign_keys", "indexes", "estimated_rows")
+
+    def __init__(self, schema: str, name: str, key: str):
+        self.schema = schema
+        self.name = name
+        self.key = key
+        self.columns = []
+        self.primary_key = []
+        self.foreign_keys = []   # {"constrained_columns", "referred_table", "referred_columns"}
+        self.indexes = []        # {"name", "columns", "unique"}
+        self.estimated_rows = None  # planner estimate, where the dialect has one
+
+class CatalogSnapshot:
+    """Immutable view of the catalog at one point in time.
+
+    Tables in the default schema are keyed by their bare name and tables in
+    other schemas by "schema.table", which is also how they are written in SQL.
+    """
+
+    def __init__(self, tables: dict, schemas: list, default_schema: str, elapsed: float = 0.0):
+        self.tables = tables
+        self.schemas = schemas
+        self.default_schema = default_schema
+        self.loaded_at = time.time()
+        self.elapsed = elapsed
+        self.schema_info = {key: table.columns for key, table in tables.items()}
+
+    @property
+    def constraints(self) -> dict:
+        """{table: {"primary_key": [...], "foreign_keys": [...]}} in the form the table fingerprint uses"""
+        return {
+            key: {
+                "primary_key": table.primary_key,
+                "foreign_keys": sorted(
+                    [fk["constrained_columns"], fk["referred_table"], fk["referred_columns"]]
+                    for fk in table.foreign_keys
+                )
+            }
+            for key, table in self.tables.items()
+        }
+
+    def key_for(self, schema: str, name: str) -> str:
+        """Snapshot key of a table given its schema and name"""
+        return name if schema in (None, self.default_schema) else f"{schema}.{name}"
+
+    def quoted_name(self, key: str, preparer) -> str:
+        """Schema-qualified, quoted table name for use in SQL"""
+        table = self.tables[key]
+        if table.schema and table.schema != self.default_schema:
+            return f"{preparer.quote_schema(table.schema)}.{preparer.quote(table.name)}"
+        return preparer.quote(table.name)
+
+    def describe(self) -> list:
+        """Tables as plain dicts for API responses"""
+        return [
+            {
+                "name": key,
+                "schema": table.schema,
+                "columns": [
+                    {
+                        "name": col["name"],
+                        "type": col["type"],
+                        "nullable": col["nullable"],
+                        "primary_key": col["primary_key"]
+                    }
+                    for col in table.columns
+                ],
+                "foreign_keys": table.foreign_keys,
+                "indexes": table.indexes
+            }
+            for key, table in self.tables.items()
+        ]
+
+class SchemaCatalog:
+    """Loads and caches the catalog snapshot that schema endpoints and the RAG service share.
+
+    On PostgreSQL the whole catalog for the selected schemas is read with
+    three set-based pg_catalog queries (columns, constraints, indexes)
+    instead of several inspector round trips per table. Other dialects use
+    SQLAlchemy's bulk get_multi_* reflection. The snapshot is kept until
+    refresh() is called.
+    """
+
+    def __init__(self, engine, schemas: list = None):
+        self.engine = engine
+        self.schemas = [schema for schema in (schemas or []) if schema]
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._load()
+        return self._snapshot
+
+    def refresh(self) -> CatalogSnapshot:
+        """Reload the catalog; the previous snapshot stays in use until the new one is ready"""
+        snapshot = self._load()
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def _load(self) -> CatalogSnapshot:
+        start = time.perf_counter()
+        if self.engine.dialect.name == "postgresql":
+            tables, schemas, default_schema = self._load_postgres()
+        else:
+            tables, schemas, default_schema = self._load_reflection()
+        snapshot = CatalogSnapshot(tables, schemas, default_schema, time.perf_counter() - start)
+        print(f"🗂️ Loaded catalog: {len(tables)} tables in {', '.join(s or 'default' for s in schemas)} ({snapshot.elapsed:.2f}s)")
+        return snapshot
+
+    def _load_postgres(self):
+        with self.engine.connect() as conn:
+            default_schema = conn.execute(text("SELECT current_schema()")).scalar()
+            schemas = self.schemas or [default_schema]
+            params = {"schemas": schemas}
+            column_rows = conn.execute(text(PG_COLUMNS), params).fetchall()
+            constraint_rows = conn.execute(text(PG_CONSTRAINTS), params).fetchall()
+            index_rows = conn.execute(text(PG_INDEXES), params).fetchall()
+
+        tables = {}
+
+        def key_of(schema, name):
+            return name if schema == default_schema else f"{schema}.{name}"
+
+        for row in column_rows:
+            key = key_of(row.table_schema, row.table_name)
+            if key not in tables:
+                tables[key] = TableInfo(row.table_schema, row.table_name, key)
+                # reltuples is -1 (PostgreSQL 14+) or 0 for tables never analyzed
+                tables[key].estimated_rows = row.estimated_rows if row.estimated_rows and row.estimated_rows > 0 else None
+            tables[key].columns.append({
+                "name": row.column_name,
+                "type": row.data_type.upper(),
+                "nullable": bool(row.nullable),
+                "default": row.column_default,
+                "primary_key": False
+            })
+        for row in constraint_rows:
+            table = tables.get(key_of(row.table_schema, row.table_name))
+            if table is None:
+                continue
+            if row.kind == "p":
+                table.primary_key = list(row.columns)
+            else:
+                table.foreign_keys.append({
+                    "constrained_columns": list(row.columns),
+                    "referred_table": key_of(row.referred_schema, row.referred_table),
+                    "referred_columns": list(row.referred_columns)
+                })
+        for row in index_rows:
+            key = key_of(row.table_schema, row.table_name)
+            if key in tables:
+                tables[key].indexes.append({"name": row.index_name, "columns": list(row.columns), "unique": bool(row.is_unique)})
+
+        _mark_primary_keys(tables)
+        return tables, schemas, default_schema
+
+    def _load_reflection(self):
+        inspector = inspect(self.engine)
+        default_schema = inspector.default_schema_name
+        schemas = self.schemas or [default_schema]
+        tables = {}
+        for schema in schemas:
+            reflect_schema = None if schema == default_schema else schema
+            if hasattr(inspector, "get_multi_columns"):
+                # SQLAlchemy 2.0: one reflection pass per schema for all tables
+                columns = inspector.get_multi_columns(schema=reflect_schema)
+                primary_keys = inspector.get_multi_pk_constraint(schema=reflect_schema)
+                foreign_keys = inspector.get_multi_foreign_keys(schema=reflect_schema)
+                indexes = inspector.get_multi_indexes(schema=reflect_schema)
+            else:
+                names = inspector.get_table_names(schema=reflect_schema)
+                columns = {(reflect_schema, name): inspector.get_columns(name, schema=reflect_schema) for name in names}
+                primary_keys = {(reflect_schema, name): inspector.get_pk_constraint(name, schema=reflect_schema) for name in names}
+                foreign_keys = {(reflect_schema, name): inspector.get_foreign_keys(name, schema=reflect_schema) for name in names}
+                indexes = {(reflect_schema, name): inspector.get_indexes(name, schema=reflect_schema) for name in names}
+
+            for (_, name), table_columns in columns.items():
+                key = name if reflect_schema is None else f"{schema}.{name}"
+                table = tables[key] = TableInfo(schema, name, key)
+                table.columns = [
+                    {
+                        "name": col["name"],
+                        "type": str(col["type"]),
+                        "nullable": bool(col.get("nullable", True)),
+                        "default": col.get("default"),
+                        "primary_key": False
+                    }
+                    for col in table_columns
+                ]
+                table.primary_key = list((primary_keys.get((reflect_schema, name)) or {}).get("constrained_columns") or [])
+                for fk in foreign_keys.get((reflect_schema, name)) or []:
+                    referred_schema = fk.get("referred_schema")
+                    referred = fk["referred_table"] if referred_schema in (None, default_schema) else f"{referred_schema}.{fk['referred_table']}"
+                    table.foreign_keys.append({
+                        "constrained_columns": list(fk.get("constrained_columns") or []),
+                        "referred_table": referred,
+                        "referred_columns": list(fk.get("referred_columns") or [])
+                    })
+                table.indexes = [
+                    {"name": index.get("name"), "columns": list(index.get("column_names") or []), "unique": bool(index.get("unique"))}
+                    for index in indexes.get((reflect_schema, name)) or []
+                ]
+
+        _mark_primary_keys(tables)
+        return tables, schemas, default_schema
+
+def _mark_primary_keys(tables: dict):
+    for table in tables.values():
+        primary_key = set(table.primary_key)
+        for col in table.columns:
+            col["primary_key"] = col["name"] in primary_key
+
+# Global instance
+schema_catalog = SchemaCatalog(engine, settings.schema_catalog_schemas.split(","))
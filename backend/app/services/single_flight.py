@@ -0,0 +1,51 @@
+import asyncio
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one in-flight task.
+
+    The first caller for a key starts the work; callers that arrive while it
+    is running await the same task and receive its result or its exception.
+    A caller being cancelled only detaches that caller - the shared task is
+    cancelled once every waiter has gone away.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, func):
+        """Run func() once per key among concurrent callers and return its result"""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task: self._forget(key, call))
+        else:
+            print(f"🔗 Joining in-flight request for: '{str(key)[:50]}'")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            # Only this waiter was cancelled; stop the shared work if nobody else wants it
+            if call.waiters == 1 and not call.task.done():
+                # Unlist it first so a caller arriving before the task finishes starts fresh work
+                self._forget(key, call)
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def in_flight(self) -> int:
+        """Number of distinct keys currently being computed"""
+        return len(self._calls)
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
@@ -0,0 +1,134 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from sqlalchemy import text
+from app.core.config import settings
+from app.db.database import engine
+
+# Columns whose values are too large or opaque to be useful sample context
+WIDE_TYPES = ("BYTEA", "BLOB", "BINARY", "JSON", "XML", "TSVECTOR", "GEOMETRY", "GEOGRAPHY", "[]")
+
+PG_DATA_VERSIONS = """
+SELECT schemaname AS table_schema, relname AS table_name,
+       n_tup_ins + n_tup_upd + n_tup_del AS modifications
+FROM pg_stat_user_tables
+WHERE schemaname = ANY(:schemas)
+"""
+
+class TableSampler:
+    """Collects a few sample rows from many tables in parallel, within a time budget.
+
+    Tables are sampled over a bounded thread pool. Each query reads only the
+    narrow columns (binary, JSON, XML, spatial and array columns are left
+    out), truncates long values, and on PostgreSQL runs under its own
+    statement_timeout; tables the planner estimates to be large are read with
+    TABLESAMPLE SYSTEM instead of from the first heap pages. Tables not
+    reached before the budget runs out are reported as pending so the next
+    sync can pick them up.
+    """
+
+    def __init__(self, engine, rows: int = 3, max_workers: int = 4, statement_timeout_ms: int = 2000,
+                 budget_seconds: float = 30.0, tablesample_min_rows: int = 100000, max_value_chars: int = 100):
+        self.engine = engine
+        self.rows = rows
+        self.max_workers = max_workers
+        self.statement_timeout_ms = statement_timeout_ms
+        self.budget_seconds = budget_seconds
+        self.tablesample_min_rows = tablesample_min_rows
+        self.max_value_chars = max_value_chars
+
+    def data_versions(self, snapshot) -> dict:
+        """{table: version} that changes when a table's rows change; empty if the dialect cannot tell"""
+        if self.engine.dialect.name != "postgresql":
+            return {}
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(text(PG_DATA_VERSIONS), {"schemas": snapshot.schemas}).fetchall()
+        except Exception as e:
+            print(f"⚠️ Could not read table modification counters: {e}")
+            return {}
+        return {snapshot.key_for(row.table_schema, row.table_name): str(row.modifications) for row in rows}
+
+    def sample(self, snapshot, tables: list):
+        """Return ({table: rows}, [tables not sampled]) for the given catalog tables"""
+        tables = [table_name for table_name in tables if table_name in snapshot.tables]
+        samples = {}
+        if not tables:
+            return samples, []
+
+        start = time.monotonic()
+        deadline = start + self.budget_seconds
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="sampler")
+        futures = {executor.submit(self._sample_table, snapshot, table_name, deadline): table_name for table_name in tables}
+        try:
+            for future in as_completed(futures, timeout=self.budget_seconds):
+                table_name = futures[future]
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    print(f"⚠️ Could not get sample data from {table_name}: {e}")
+                    continue
+                if rows is not None:
+                    samples[table_name] = rows
+        except FuturesTimeout:
+            print(f"⏱️ Sampling budget of {self.budget_seconds}s used up")
+        finally:
+            # Queued tables are dropped; running ones end within their statement timeout
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        pending = [table_name for table_name in tables if table_name not in samples]
+        print(f"📝 Sampled {len(samples)}/{len(tables)} tables in {time.monotonic() - start:.2f}s")
+        return samples, pending
+
+    def _sample_table(self, snapshot, table_name: str, deadline: float):
+        """Sample rows of one table, or None if the budget ran out before it started"""
+        remaining_ms = (deadline - time.monotonic()) * 1000
+        if remaining_ms <= 0:
+            return None
+
+        table = snapshot.tables[table_name]
+        columns = [col["name"] for col in table.columns if not any(t in str(col["type"]).upper() for t in WIDE_TYPES)]
+        if not columns:
+            return []
+
+        preparer = self.engine.dialect.identifier_preparer
+        select = f"SELECT {', '.join(preparer.quote(name) for name in columns)} FROM {snapshot.quoted_name(table_name, preparer)}"
+        is_postgres = self.engine.dialect.name == "postgresql"
+
+        with self.engine.connect() as conn:
+            trans = conn.begin()
+            try:
+                if is_postgres:
+                    timeout = max(1, int(min(self.statement_timeout_ms, remaining_ms)))
+                    conn.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout}")
+                rows = []
+                if is_postgres and (table.estimated_rows or 0) >= self.tablesample_min_rows:
+                    # Pick whole pages at random, with room for pages holding fewer rows than average
+                    percent = min(100.0, max(0.01, 100.0 * self.rows * 50 / table.estimated_rows))
+                    rows = conn.execute(text(f"{select} TABLESAMPLE SYSTEM ({percent:.4f}) LIMIT {int(self.rows)}")).fetchall()
+                if len(rows) < self.rows:
+                    rows = conn.execute(text(f"{select} LIMIT {int(self.rows)}")).fetchall()
+            finally:
+                trans.rollback()
+
+        return [
+            {key: self._truncate(value) for key, value in row._mapping.items()}
+            for row in rows
+        ]
+
+    def _truncate(self, value):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return None
+        if isinstance(value, str) and len(value) > self.max_value_chars:
+            return value[:self.max_value_chars] + "..."
+        return value
+
+# Global instance
+table_sampler = TableSampler(
+    engine,
+    rows=settings.sample_rows,
+    max_workers=settings.sample_max_workers,
+    statement_timeout_ms=settings.sample_statement_timeout_ms,
+    budget_seconds=settings.sample_budget_seconds,
+    tablesample_min_rows=settings.sample_tablesample_min_rows,
+    max_value_chars=settings.sample_max_value_chars
+)
@@ -0,0 +1,298 @@
+import bisect
+import json
+import os
+import re
+import threading
+import time
+from sqlalchemy import text
+from app.core.config import settings
+from app.db.database import engine
+from app.services.prompt_builder import STOPWORDS
+
+# Column types whose values are never worth grounding literals against
+SKIP_TYPES = ("INT", "NUMERIC", "DECIMAL", "FLOAT", "REAL", "DOUBLE", "MONEY", "SERIAL", "BOOL",
+              "DATE", "TIME", "INTERVAL", "UUID", "BYTEA", "BLOB", "BINARY", "JSON", "XML", "TSVECTOR", "[]")
+
+PG_COLUMN_STATS = """
+SELECT schemaname AS table_schema, tablename AS table_name, attname AS column_name,
+       n_distinct, most_common_vals::text::text[] AS common_values, most_common_freqs AS frequencies
+FROM pg_stats
+WHERE schemaname = ANY(:schemas) AND tablename = ANY(:tables) AND most_common_vals IS NOT NULL
+"""
+
+def normalize_value(value: str) -> str:
+    return " ".join(re.findall(r"[\w'&.-]+", value.lower()))
+
+def trigrams(value: str) -> set:
+    padded = f"  {value} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class ValueIndex:
+    """Distinct values of low-cardinality text columns, for grounding literals in questions.
+
+    refresh() collects {value: frequency} per column offline: from pg_stats
+    most-common values on PostgreSQL (no table scan), or a bounded GROUP BY
+    elsewhere. Only tables whose version changed are collected again, and the
+    result is saved to a JSON file. match() looks question phrases up by exact
+    value, by prefix (bisect over the sorted values) and by trigram similarity,
+    so request time never touches the database.
+    """
+
+    def __init__(self, engine, path: str = None, max_distinct: int = 100, max_value_chars: int = 64,
+                 match_threshold: float = 0.5, max_matches: int = 5, budget_seconds: float = 30.0):
+        self.engine = engine
+        self.path = path
+        self.max_distinct = max_distinct
+        self.max_value_chars = max_value_chars
+        self.match_threshold = match_threshold
+        self.max_matches = max_matches
+        self.budget_seconds = budget_seconds
+        self._tables = {}     # table -> {"version": str, "columns": {column: [[value, frequency], ...]}}
+        self._entries = []    # (table, column, value, frequency, normalized, trigram count)
+        self._exact = {}      # normalized -> [entry index]
+        self._sorted = []     # (normalized, entry index), sorted, for prefix lookups
+        self._trigrams = {}   # trigram -> [entry index]
+        self._lock = threading.RLock()
+        self._loaded = False
+
+    def refresh(self, snapshot, versions: dict) -> dict:
+        """Collect values for tables whose version changed and drop removed tables"""
+        self._load()
+        with self._lock:
+            stale = [table_name for table_name, version in versions.items()
+                     if self._tables.get(table_name, {}).get("version") != version]
+            removed = [table_name for table_name in self._tables if table_name not in versions]
+        if not stale and not removed:
+            return {"tables_refreshed": 0, "tables_removed": 0, "values": len(self._entries)}
+
+        if self.engine.dialect.name == "postgresql":
+            collected = self._collect_postgres(snapshot, stale)
+        else:
+            collected = self._collect_scan(snapshot, stale)
+
+        with self._lock:
+            for table_name in stale:
+                # Tables not reached keep their old values and are retried next time
+                if table_name in collected:
+                    self._tables[table_name] = {"version": versions[table_name], "columns": collected[table_name]}
+            for table_name in removed:
+                del self._tables[table_name]
+            self._rebuild_lookup()
+            self._save()
+        summary = {"tables_refreshed": len(collected), "tables_removed": len(removed), "values": len(self._entries)}
+        print(f"🔤 Value dictionary: {summary['tables_refreshed']} tables refreshed, {summary['values']} values")
+        return summary
+
+    def match(self, question: str, tables: list = None) -> list:
+        """Known column values the question's phrases refer to, best first"""
+        self._load()
+        words = re.findall(r"[\w'&.-]+", question.lower())
+        spans = []
+        for size in (3, 2, 1):
+            for start in range(len(words) - size + 1):
+                span_words = words[start:start + size]
+                if all(word in STOPWORDS or word.isdigit() for word in span_words):
+                    continue
+                span = " ".join(span_words)
+                if len(span) >= 3:
+                    spans.append((span, start, start + size))
+
+        allowed = set(tables) if tables else None
+        found = []
+        with self._lock:
+            for span, start, end in spans:
+                for index, score in self._lookup(span).items():
+                    table, column, value, frequency, _, _ = self._entries[index]
+                    if allowed is not None and table not in allowed:
+                        continue
+                    found.append((score, frequency, span, start, end, table, column, value))
+
+        # Best matches first, one per phrase and per column
+        found.sort(key=lambda match: (match[0], match[1]), reverse=True)
+        matches, used_words, used_columns = [], set(), set()
+        for score, frequency, span, start, end, table, column, value in found:
+            if used_words & set(range(start, end)) or (table, column) in used_columns:
+                continue
+            used_words.update(range(start, end))
+            used_columns.add((table, column))
+            matches.append({"phrase": span, "table": table, "column": column, "value": value,
+                            "frequency": frequency, "score": round(score, 3)})
+            if len(matches) >= self.max_matches:
+                break
+        return matches
+
+    def describe(self, matches: list):
+        """One context line with the matched values, or None"""
+        if not matches:
+            return None
+        values = "; ".join(
+            f"{match['table']}.{match['column']} = '{match['value'].replace(chr(39), chr(39) * 2)}'"
+            for match in matches
+        )
+        return f"Exact column values for literals in the question: {values}"
+
+    def get_stats(self):
+        self._load()
+        return {"tables": len(self._tables), "values": len(self._entries), "trigrams": len(self._trigrams)}
+
+    def _lookup(self, span: str) -> dict:
+        """{entry index: score} for exact, prefix and trigram matches of a phrase"""
+        scores = {}
+        for index in self._exact.get(span, ()):
+            scores[index] = 1.0
+        if len(span) >= 4:
+            position = bisect.bisect_left(self._sorted, (span,))
+            end = min(position + 50, len(self._sorted))
+            while position < end and self._sorted[position][0].startswith(span):
+                normalized, index = self._sorted[position]
+                scores.setdefault(index, len(span) / len(normalized))
+                position += 1
+        grams = trigrams(span)
+        shared = {}
+        for gram in grams:
+            postings = self._trigrams.get(gram, ())
+            if len(postings) > 5000:
+                continue  # too common to tell values apart
+            for index in postings:
+                shared[index] = shared.get(index, 0) + 1
+        for index, count in shared.items():
+            similarity = count / (len(grams) + self._entries[index][5] - count)
+            if similarity > scores.get(index, 0.0):
+                scores[index] = similarity
+        return {index: score for index, score in scores.items() if score >= self.match_threshold}
+
+    def _eligible_columns(self, snapshot, table_name: str) -> list:
+        return [
+            col["name"] for col in snapshot.tables[table_name].columns
+            if not any(t in str(col["type"]).upper() for t in SKIP_TYPES)
+        ]
+
+    def _collect_postgres(self, snapshot, tables: list) -> dict:
+        """{table: {column: [[value, frequency]]}} from pg_stats in one query"""
+        by_name = {}
+        for table_name in tables:
+            if table_name in snapshot.tables:
+                table = snapshot.tables[table_name]
+                by_name[(table.schema, table.name)] = table_name
+        collected = {table_name: {} for table_name in by_name.values()}
+        if not by_name:
+            return collected
+        try:
+            with self.engine.connect() as conn:
+                rows = conn.execute(text(PG_COLUMN_STATS), {
+                    "schemas": sorted({schema for schema, _ in by_name}),
+                    "tables": sorted({name for _, name in by_name})
+                }).fetchall()
+        except Exception as e:
+            print(f"⚠️ Could not read column statistics: {e}")
+            return {}
+
+        eligible = {table_name: set(self._eligible_columns(snapshot, table_name)) for table_name in collected}
+        for row in rows:
+            table_name = by_name.get((row.table_schema, row.table_name))
+            if table_name is None or row.column_name not in eligible[table_name]:
+                continue
+            # n_distinct < 0 is a fraction of the rows, i.e. not low cardinality
+            if row.n_distinct < 0 or row.n_distinct > self.max_distinct:
+                continue
+            values = [
+                [value, round(float(frequency), 6)]
+                for value, frequency in zip(row.common_values or [], row.frequencies or [])
+                if value is not None and len(value) <= self.max_value_chars
+            ]
+            if values:
+                collected[table_name][row.column_name] = values
+        return collected
+
+    def _collect_scan(self, snapshot, tables: list) -> dict:
+        """{table: {column: [[value, frequency]]}} with one bounded GROUP BY per column"""
+        collected = {}
+        deadline = time.monotonic() + self.budget_seconds
+        preparer = self.engine.dialect.identifier_preparer
+        with self.engine.connect() as conn:
+            for table_name in tables:
+                if table_name not in snapshot.tables:
+                    continue
+                if time.monotonic() > deadline:
+                    print(f"⏱️ Value dictionary budget of {self.budget_seconds}s used up")
+                    break
+                quoted_table = snapshot.quoted_name(table_name, preparer)
+                columns = {}
+                try:
+                    for column in self._eligible_columns(snapshot, table_name):
+                        quoted = preparer.quote(column)
+                        rows = conn.execute(text(
+                            f"SELECT {quoted}, COUNT(*) FROM {quoted_table} WHERE {quoted} IS NOT NULL "
+                            f"GROUP BY {quoted} ORDER BY COUNT(*) DESC LIMIT {int(self.max_distinct) + 1}"
+                        )).fetchall()
+                        if not rows or len(rows) > self.max_distinct:
+                            continue
+                        total = sum(count for _, count in rows)
+                        values = [
+                            [str(value), round(count / total, 6)]
+                            for value, count in rows
+                            if len(str(value)) <= self.max_value_chars
+                        ]
+                        if values:
+                            columns[column] = values
+                except Exception as e:
+                    print(f"⚠️ Could not collect values from {table_name}: {e}")
+                    conn.rollback()
+                    continue
+                collected[table_name] = columns
+        return collected
+
+    def _rebuild_lookup(self):
+        entries, exact, ordered, grams_index = [], {}, [], {}
+        for table_name, table in self._tables.items():
+            for column, values in table["columns"].items():
+                for value, frequency in values:
+                    normalized = normalize_value(value)
+                    if not normalized:
+                        continue
+                    index = len(entries)
+                    grams = trigrams(normalized)
+                    entries.append((table_name, column, value, frequency, normalized, len(grams)))
+                    exact.setdefault(normalized, []).append(index)
+                    ordered.append((normalized, index))
+                    for gram in grams:
+                        grams_index.setdefault(gram, []).append(index)
+        ordered.sort()
+        self._entries, self._exact, self._sorted, self._trigrams = entries, exact, ordered, grams_index
+
+    def _load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path) as f:
+                        self._tables = json.load(f).get("tables") or {}
+                    self._rebuild_lookup()
+                except Exception as e:
+                    print(f"⚠️ Could not load value dictionary: {e}")
+                    self._tables = {}
+            self._loaded = True
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path + ".tmp", "w") as f:
+                json.dump({"tables": self._tables}, f)
+            os.replace(self.path + ".tmp", self.path)
+        except Exception as e:
+            print(f"⚠️ Could not save value dictionary: {e}")
+
+# Global instance
+value_index = ValueIndex(
+    engine,
+    path=settings.value_index_path,
+    max_distinct=settings.value_index_max_distinct,
+    max_value_chars=settings.value_index_max_value_chars,
+    match_threshold=settings.value_match_threshold,
+    max_matches=settings.value_match_limit,
+    budget_seconds=settings.sample_budget_seconds
+)
@@ -0,0 +1,279 @@
+import json
+import os
+import threading
+import numpy as np
+
+class NumpyVectorIndex:
+    """In-process exact vector index with the subset of the Chroma collection API RAGService uses.
+
+    Vectors are normalized and kept in one contiguous float32 (or float16)
+    matrix, so a query is a single matrix-vector product followed by
+    argpartition for the top k. `where` filters become boolean row masks that
+    are computed once and reused until the index changes. On disk the matrix
+    is a versioned .npy file opened memory-mapped, next to a JSON file with
+    ids, documents, metadata and the name of its matrix file; replacing the
+    JSON file is the single step that commits a save. float16 halves memory,
+    but queries are slower because NumPy has to upcast the rows to compute
+    the scores.
+    """
+
+    def __init__(self, path: str = None, dtype: str = "float32"):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.RLock()
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self._rows = {}
+        self._matrix = None      # capacity may exceed the row count
+        self._size = 0
+        self._masks = {}
+        self._matrix_file = "vectors.npy"
+        self._version = 0
+        self.metadata = {}
+        if path:
+            self._load()
+
+    def count(self) -> int:
+        return self._size
+
+    def upsert(self, ids: list, embeddings: list, documents: list = None, metadatas: list = None):
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+        with self._lock:
+            self._writable(len(ids), vectors.shape[1])
+            for item_id, vector, document, metadata in zip(ids, vectors, documents, metadatas):
+                row = self._rows.get(item_id)
+                if row is None:
+                    row = self._size
+                    self._rows[item_id] = row
+                    self._ids.append(item_id)
+                    self._documents.append(document)
+                    self._metadatas.append(dict(metadata or {}))
+                    self._size += 1
+                else:
+                    self._documents[row] = document
+                    self._metadatas[row] = dict(metadata or {})
+                self._matrix[row] = vector
+            self._masks.clear()
+            self._save()
+
+    add = upsert
+
+    def update(self, ids: list, metadatas: list = None, documents: list = None):
+        """Replace metadata (and optionally documents) of existing ids, leaving vectors as they are"""
+        with self._lock:
+            for position, item_id in enumerate(ids):
+                row = self._rows.get(item_id)
+                if row is None:
+                    continue
+                if metadatas is not None:
+                    self._metadatas[row] = dict(metadatas[position] or {})
+                if documents is not None:
+                    self._documents[row] = documents[position]
+            self._masks.clear()
+            self._save(vectors=False)
+
+    def delete(self, ids: list = None, where: dict = None):
+        with self._lock:
+            if where is not None:
+                mask = self._mask(where)
+                ids = list(ids or []) + [self._ids[row] for row in np.flatnonzero(mask)]
+            rows = [self._rows[item_id] for item_id in set(ids or []) if item_id in self._rows]
+            if not rows:
+                return
+            self._writable(0, self._matrix.shape[1])
+            # Swap-remove from the highest row down so moved rows stay valid
+            for row in sorted(rows, reverse=True):
+                last = self._size - 1
+                del self._rows[self._ids[row]]
+                if row != last:
+                    self._matrix[row] = self._matrix[last]
+                    self._ids[row] = self._ids[last]
+                    self._documents[row] = self._documents[last]
+                    self._metadatas[row] = self._metadatas[last]
+                    self._rows[self._ids[row]] = row
+                self._ids.pop()
+                self._documents.pop()
+                self._metadatas.pop()
+                self._size -= 1
+            self._masks.clear()
+            self._save()
+
+    def modify(self, metadata: dict = None):
+        """Replace the index-level metadata, stored alongside the documents"""
+        with self._lock:
+            self.metadata = dict(metadata or {})
+            self._save(vectors=False)
+
+    def get(self, ids: list = None, where: dict = None, include: list = None, limit: int = None, offset: int = None):
+        with self._lock:
+            if ids is not None:
+                rows = [self._rows[item_id] for item_id in ids if item_id in self._rows]
+            else:
+                rows = range(self._size)
+            if where is not None:
+                mask = self._mask(where)
+                rows = [row for row in rows if mask[row]]
+            rows = list(rows)[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+            return {
+                "ids": [self._ids[row] for row in rows],
+                "documents": [self._documents[row] for row in rows],
+                "metadatas": [self._metadatas[row] for row in rows],
+            }
+
+    def query(self, query_embeddings: list, n_results: int = 5, where: dict = None, include: list = None):
+        """Top n_results by cosine similarity for each query; distances are 1 - similarity"""
+        queries = self._normalize(np.asarray(query_embeddings, dtype=np.float32))
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            size = self._size
+            matrix = self._matrix[:size] if self._matrix is not None else None
+            mask = self._mask(where) if where is not None else None
+            ids, documents, metadatas = self._ids, self._documents, self._metadatas
+
+            if matrix is None or size == 0:
+                for key in result:
+                    result[key] = [[] for _ in queries]
+                return result
+
+            scores = self._scores(matrix, queries)
+            if mask is not None:
+                scores[~mask] = -np.inf
+            available = int(mask.sum()) if mask is not None else size
+            k = min(n_results, available)
+
+            for column in scores.T:
+                if k <= 0:
+                    top = np.empty(0, dtype=np.int64)
+                else:
+                    top = np.argpartition(-column, k - 1)[:k]
+                    top = top[np.argsort(-column[top])]
+                result["ids"].append([ids[row] for row in top])
+                result["documents"].append([documents[row] for row in top])
+                result["metadatas"].append([metadatas[row] for row in top])
+                result["distances"].append([float(1.0 - column[row]) for row in top])
+        return result
+
+    def _scores(self, matrix: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Similarity of every row with every query as an (n, q) float32 array"""
+        if matrix.dtype == np.float32:
+            # One product for all queries: (n, dim) @ (dim, q) -> (n, q)
+            return matrix @ queries.T
+        # NumPy has no fast float16 matmul; upcast in blocks to keep temporaries small
+        scores = np.empty((matrix.shape[0], queries.shape[0]), dtype=np.float32)
+        for start in range(0, matrix.shape[0], 8192):
+            block = matrix[start:start + 8192].astype(np.float32)
+            scores[start:start + 8192] = block @ queries.T
+        return scores
+
+    def nbytes(self) -> int:
+        """Bytes held by the vector matrix rows in use"""
+        if self._matrix is None:
+            return 0
+        return self._size * self._matrix.shape[1] * self._matrix.itemsize
+
+    def _mask(self, where: dict) -> np.ndarray:
+        key = json.dumps(where, sort_keys=True, default=str)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = np.fromiter((_matches(metadata, where) for metadata in self._metadatas), dtype=bool, count=self._size)
+            self._masks[key] = mask
+        return mask
+
+    def _writable(self, extra_rows: int, dim: int):
+        """Make sure the matrix is an in-memory array with room for extra_rows"""
+        needed = self._size + extra_rows
+        if self._matrix is None:
+            self._matrix = np.zeros((max(needed, 64), dim), dtype=self.dtype)
+            return
+        if self._matrix.shape[1] != dim:
+            raise ValueError(f"Embedding dimension {dim} does not match index dimension {self._matrix.shape[1]}")
+        capacity = self._matrix.shape[0]
+        if needed > capacity:
+            capacity = max(needed, capacity * 2, 64)
+        if isinstance(self._matrix, np.memmap) or capacity > self._matrix.shape[0]:
+            # Copy out of the read-only memory map, growing geometrically
+            matrix = np.zeros((capacity, dim), dtype=self.dtype)
+            matrix[:self._size] = self._matrix[:self._size]
+            self._matrix = matrix
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _load(self):
+        meta_path = os.path.join(self.path, "meta.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self._matrix_file = meta.get("vectors", "vectors.npy")
+        self._version = meta.get("version", 0)
+        matrix_path = os.path.join(self.path, self._matrix_file)
+        if not os.path.exists(matrix_path):
+            return
+        self._ids = meta["ids"]
+        self._documents = meta["documents"]
+        self._metadatas = meta["metadatas"]
+        self.metadata = meta.get("metadata") or {}
+        self._rows = {item_id: row for row, item_id in enumerate(self._ids)}
+        self._size = len(self._ids)
+        matrix = np.load(matrix_path, mmap_mode="r")
+        self._matrix = matrix if matrix.dtype == self.dtype else np.asarray(matrix, dtype=self.dtype)
+
+    def _save(self, vectors: bool = True):
+        if not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        meta_path = os.path.join(self.path, "meta.json")
+        previous = self._matrix_file
+        if vectors:
+            # A new matrix goes to a new file; the old one stays valid until meta.json points away from it
+            self._version += 1
+            self._matrix_file = f"vectors-{self._version}.npy"
+            with open(os.path.join(self.path, self._matrix_file), "wb") as f:
+                np.save(f, np.ascontiguousarray(self._matrix[:self._size]))
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({
+                "ids": self._ids, "documents": self._documents, "metadatas": self._metadatas,
+                "metadata": self.metadata, "vectors": self._matrix_file, "version": self._version
+            }, f)
+        # The one rename that commits the save: a crash before it leaves the previous index intact
+        os.replace(meta_path + ".tmp", meta_path)
+        if vectors and previous != self._matrix_file:
+            try:
+                os.remove(os.path.join(self.path, previous))
+            except OSError:
+                pass  # never written, or still mapped on platforms that forbid it
+
+def _matches(metadata: dict, where: dict) -> bool:
+    """Evaluate a Chroma-style where clause ($and, $or, $eq, $ne, $in, $nin) against metadata"""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(_matches(metadata, clause) for clause in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            if op == "$eq" and value != expected:
+                return False
+            if op == "$ne" and value == expected:
+                return False
+            if op == "$in" and value not in expected:
+                return False
+            if op == "$nin" and value in expected:
+                return False
+    return True
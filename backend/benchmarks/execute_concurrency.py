@@ -0,0 +1,100 @@
+"""Check that slow queries on /api/execute-sql do not block each other.
+
+Start the server first, then run from the backend directory:
+    python -m benchmarks.execute_concurrency [--url http://127.0.0.1:8000] [--database NAME]
+        [--concurrency 1 4 16] [--sleep 1.0] [--sql "..."]
+
+Each call runs a deliberately slow query: pg_sleep on PostgreSQL, a
+recursive CTE of similar duration on SQLite. The single-call latency is
+measured first; for each concurrency level N the script fires N calls at once
+and reports the wall time next to N x latency. If queries ran one after the
+other the wall time would be close to N x latency; with the async pool it
+should stay close to one latency until the pool (pool_size + max_overflow)
+is exhausted.
+"""
+import argparse
+import json
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+SQLITE_STEPS_PER_SECOND = 2_000_000
+
+def api(url: str, path: str, database: str = None, body: dict = None, timeout: float = 300.0):
+    if database:
+        path += "?" + urllib.parse.urlencode({"database": database})
+    request = urllib.request.Request(url.rstrip("/") + "/api" + path)
+    if body is not None:
+        request.data = json.dumps(body).encode()
+        request.add_header("Content-Type", "application/json")
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.load(response)
+
+def dialect(url: str, database: str = None) -> str:
+    """Dialect of the target database, opening it through a cheap query first"""
+    api(url, "/execute-sql", database, {"sql": "SELECT 1"})
+    stats = api(url, "/databases")["databases"]
+    name = database or "default"
+    return next((db["dialect"] for db in stats["active"] if db["name"] == name), "unknown")
+
+def slow_sql(dialect_name: str, seconds: float) -> str:
+    if dialect_name == "postgresql":
+        return f"SELECT pg_sleep({seconds})"
+    if dialect_name == "mysql":
+        return f"SELECT SLEEP({seconds})"
+    steps = int(SQLITE_STEPS_PER_SECOND * seconds)
+    return (
+        "WITH RECURSIVE counter(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM counter "
+        f"WHERE x < {steps}) SELECT count(*) FROM counter"
+    )
+
+def timed_call(url: str, database: str, sql: str):
+    start = time.perf_counter()
+    response = api(url, "/execute-sql", database, {"sql": sql})
+    return time.perf_counter() - start, response.get("status"), response.get("error")
+
+def run(url: str, database: str, sql: str, concurrency: int):
+    """Fire `concurrency` calls at once; returns (wall seconds, per-call seconds, errors)"""
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(lambda _: timed_call(url, database, sql), range(concurrency)))
+        wall = time.perf_counter() - start
+    errors = [error for _, status, error in results if status != "success"]
+    return wall, [elapsed for elapsed, _, _ in results], errors
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--database", default=None)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--sleep", type=float, default=1.0, help="target seconds per query")
+    parser.add_argument("--sql", default=None, help="slow query to run instead of the built-in one")
+    args = parser.parse_args()
+
+    sql = args.sql
+    if sql is None:
+        dialect_name = dialect(args.url, args.database)
+        sql = slow_sql(dialect_name, args.sleep)
+        print(f"🗄️  {args.database or 'default'} ({dialect_name}): {sql}")
+
+    latency, status, error = timed_call(args.url, args.database, sql)
+    if status != "success":
+        raise SystemExit(f"❌ Slow query failed: {error}")
+    print(f"⏱️  single call: {latency:.2f}s")
+
+    for concurrency in args.concurrency:
+        wall, elapsed, errors = run(args.url, args.database, sql, concurrency)
+        serial = concurrency * latency
+        print(
+            f"⏱️  {concurrency:>3} concurrent: wall {wall:6.2f}s vs {serial:6.2f}s serial "
+            f"({serial / wall:4.1f}x overlap), slowest call {max(elapsed):.2f}s"
+            + (f", ❌ {len(errors)} failed: {errors[0]}" if errors else "")
+        )
+
+    stats = api(args.url, "/databases")["databases"]
+    for db in stats["active"]:
+        if db["name"] == (args.database or "default"):
+            execution = db["execution"]
+            print(f"📊 peak active queries {execution['peak_active']}, "
+                  f"max pool wait {execution['max_pool_wait_seconds']:.3f}s, async pool: {db['async_pool']}")
@@ -0,0 +1,89 @@
+"""Compare the unbudgeted RAG prompt with the token-budgeted assembler on wide schemas.
+
+Run from the backend directory:
+    python -m benchmarks.prompt_size [--tables 100 300 1000] [--columns 60] [--top-k 5] [--llm]
+
+--llm also times a real Gemini call for both prompts (needs GOOGLE_API_KEY and .env).
+"""
+import argparse
+import asyncio
+import random
+import time
+from app.services.prompt_builder import PromptAssembler, PROMPT_TEMPLATE, estimate_tokens, format_columns, _words
+
+COLUMN_WORDS = ["name", "email", "status", "amount", "price", "created", "updated", "city", "country",
+                "code", "quantity", "total", "score", "category", "region", "owner", "type", "level"]
+TYPES = ["INTEGER", "VARCHAR(100)", "NUMERIC(10, 2)", "DATE", "TIMESTAMP", "BOOLEAN", "TEXT"]
+
+def build_schema(table_count: int, column_count: int, rng: random.Random) -> dict:
+    schema = {}
+    for t in range(table_count):
+        columns = [{"name": "id", "type": "INTEGER", "nullable": False}]
+        for c in range(column_count - 1):
+            word = rng.choice(COLUMN_WORDS)
+            columns.append({"name": f"{word}_{c}", "type": rng.choice(TYPES), "nullable": True})
+        schema[f"table_{t}"] = columns
+    return schema
+
+def knowledge_items(schema: dict) -> list:
+    return [
+        {
+            "content": f"{table} table contains columns: {format_columns(columns)}. This table is used for storing data records.",
+            "metadata": {"type": "schema", "table": table},
+        }
+        for table, columns in schema.items()
+    ]
+
+def retrieve(question: str, items: list, top_k: int) -> list:
+    """Stand-in for vector retrieval: rank by word overlap"""
+    words = _words(question)
+    ranked = sorted(items, key=lambda item: len(words & _words(item["content"])), reverse=True)
+    return ranked[:top_k]
+
+def naive_prompt(question: str, context: list) -> str:
+    return PROMPT_TEMPLATE.format(
+        context_text="\n".join(f"- {item['content']}" for item in context),
+        question=question
+    )
+
+async def time_llm(prompt: str) -> float:
+    from app.services.llm_service import enhanced_llm_service
+
+    start = time.perf_counter()
+    await enhanced_llm_service.llm.ainvoke(prompt)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tables", type=int, nargs="+", default=[100, 300, 1000])
+    parser.add_argument("--columns", type=int, default=60)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=1500)
+    parser.add_argument("--llm", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    assembler = PromptAssembler(args.budget)
+    print(f"{'tables':>7} {'naive tok':>10} {'budget tok':>11} {'pruned cols':>12} {'assemble ms':>12}")
+    for table_count in args.tables:
+        schema = build_schema(table_count, args.columns, rng)
+        items = knowledge_items(schema)
+        question = "total amount by status for table_7 where city is Chicago"
+        context = retrieve(question, items, args.top_k)
+
+        naive = naive_prompt(question, context)
+        start = time.perf_counter()
+        for _ in range(100):
+            prompt, report = assembler.assemble(question, context, schema)
+        assemble_ms = (time.perf_counter() - start) * 10
+
+        print(f"{table_count:>7} {estimate_tokens(naive):>10} {report['tokens']:>11} "
+              f"{report['columns_pruned']:>12} {assemble_ms:>12.3f}")
+
+        if args.llm:
+            naive_s = asyncio.run(time_llm(naive))
+            budget_s = asyncio.run(time_llm(prompt))
+            print(f"{'':>7} LLM latency: naive {naive_s:.2f}s, budgeted {budget_s:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Measure cold-start time: module import, and server start until /ready.
+
+Run from the backend directory:
+    python -m benchmarks.startup [--port 8765] [--timeout 120]
+"""
+import argparse
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+def measure_import():
+    """Time `import main` in a fresh interpreter"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], check=True, capture_output=True)
+    return time.perf_counter() - start
+
+def measure_server(port: int, timeout: float):
+    """Start uvicorn and time until / answers and until /ready returns 200"""
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    accepting_after = None
+    ready_after = None
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                if accepting_after is None:
+                    urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1)
+                    accepting_after = time.perf_counter() - start
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1)
+                ready_after = time.perf_counter() - start
+                break
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.05)
+    finally:
+        server.terminate()
+        server.wait()
+    return accepting_after, ready_after
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    print(f"⏱️  import main:        {measure_import():.2f}s")
+    accepting, ready = measure_server(args.port, args.timeout)
+    print(f"⏱️  accepting traffic:  {accepting:.2f}s" if accepting else "❌ server never accepted traffic")
+    print(f"⏱️  /ready returned 200: {ready:.2f}s" if ready else "❌ server never became ready")
@@ -0,0 +1,134 @@
+"""Compare query latency and memory of the NumPy vector index with ChromaDB.
+
+Run from the backend directory:
+    python -m benchmarks.vector_index [--sizes 1000 5000 20000] [--dim 384] [--queries 200] [--top-k 5]
+
+Vectors are random unit vectors with a "type" metadata field, so the numbers
+measure the index, not the embedding model. Chroma is skipped if chromadb is
+not installed. Memory is the resident-set growth while building each index
+(Linux only), plus the on-disk size.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from app.services.vector_index import NumpyVectorIndex
+
+TYPES = ["schema", "sample_data", "pattern", "example", "tip", "learned_example"]
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+def dir_bytes(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+def make_data(size: int, dim: int, rng: np.random.Generator):
+    vectors = rng.standard_normal((size, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"doc_{i}" for i in range(size)]
+    documents = [f"document {i}" for i in range(size)]
+    metadatas = [{"type": TYPES[i % len(TYPES)]} for i in range(size)]
+    return ids, vectors, documents, metadatas
+
+def time_queries(collection, queries: np.ndarray, top_k: int, where: dict = None):
+    """Per-query latencies in milliseconds"""
+    latencies = []
+    for query in queries:
+        kwargs = {"query_embeddings": [query.tolist()], "n_results": top_k}
+        if where is not None:
+            kwargs["where"] = where
+        start = time.perf_counter()
+        collection.query(**kwargs)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def build_numpy(path: str, dtype: str, data):
+    ids, vectors, documents, metadatas = data
+    index = NumpyVectorIndex(path, dtype=dtype)
+    index.upsert(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+    return index
+
+def build_chroma(path: str, data):
+    import chromadb
+
+    ids, vectors, documents, metadatas = data
+    client = chromadb.PersistentClient(path=path)
+    collection = client.create_collection("benchmark")
+    for start in range(0, len(ids), 5000):
+        end = start + 5000
+        collection.add(
+            ids=ids[start:end],
+            embeddings=vectors[start:end].tolist(),
+            documents=documents[start:end],
+            metadatas=metadatas[start:end]
+        )
+    return collection
+
+def report(name: str, size: int, build_s: float, memory: int, disk: int, plain: list, filtered: list):
+    print(
+        f"{name:>14} {size:>7} {build_s:>8.2f} {memory / 1e6:>9.1f} {disk / 1e6:>9.1f} "
+        f"{np.percentile(plain, 50):>8.3f} {np.percentile(plain, 95):>8.3f} {np.percentile(filtered, 50):>10.3f}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        import chromadb  # noqa: F401
+        backends = ["numpy-float32", "numpy-float16", "chroma"]
+    except ImportError:
+        print("chromadb not installed, benchmarking the NumPy index only")
+        backends = ["numpy-float32", "numpy-float16"]
+
+    rng = np.random.default_rng(42)
+    where = {"type": "schema"}
+    print(f"{'backend':>14} {'size':>7} {'build s':>8} {'mem MB':>9} {'disk MB':>9} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'filt p50':>10}")
+
+    for size in args.sizes:
+        data = make_data(size, args.dim, rng)
+        queries = make_data(args.queries, args.dim, rng)[1]
+        for backend in backends:
+            workdir = tempfile.mkdtemp(prefix="vector_bench_")
+            try:
+                before = rss_bytes()
+                start = time.perf_counter()
+                if backend == "chroma":
+                    collection = build_chroma(workdir, data)
+                else:
+                    collection = build_numpy(workdir, backend.split("-")[1], data)
+                build_s = time.perf_counter() - start
+                memory = rss_bytes() - before
+
+                time_queries(collection, queries[:10], args.top_k)  # warm up
+                plain = time_queries(collection, queries, args.top_k)
+                filtered = time_queries(collection, queries, args.top_k, where)
+                report(backend, size, build_s, memory, dir_bytes(workdir), plain, filtered)
+
+                if backend != "chroma":
+                    # Reopen from disk: the matrix is memory-mapped, not read
+                    start = time.perf_counter()
+                    reopened = NumpyVectorIndex(workdir, dtype=backend.split("-")[1])
+                    open_ms = (time.perf_counter() - start) * 1000
+                    mmap_plain = time_queries(reopened, queries, args.top_k)
+                    print(f"{'':>14} reopen {open_ms:.1f} ms (memory-mapped), p50 {np.percentile(mmap_plain, 50):.3f} ms")
+                del collection
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
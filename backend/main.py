@@ -1,23 +1,64 @@
-
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.api.endpoints.sql_generator import router
 from app.db.database import engine, test_connection
 from app.db.models import Base
 from contextlib import asynccontextmanager
+import asyncio
+import time
+
+# Readiness of each component, filled in by the background warm-up
+warmup_state = {
+    "database": False,
+    "rag": False,
+    "llm": False,
+    "started_at": None,
+    "ready_after_seconds": None,
+    "errors": {}
+}
+
+def _init_database():
+    if not test_connection():
+        raise RuntimeError("Database connection failed")
+    print("✅ Database connection successful")
+
+    # Create database tables
+    Base.metadata.create_all(bind=engine)
+
+async def warm_up():
+    """Run the heavy initialisers after the server has started accepting traffic"""
+    from app.services.llm_service import enhanced_llm_service
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+    warmup_state["started_at"] = time.time()
+
+    async def run_step(name, step):
+        try:
+            await step()
+            warmup_state[name] = True
+        except Exception as e:
+            print(f"❌ Warm-up step '{name}' failed: {e}")
+            warmup_state["errors"][name] = str(e)
+
+    await asyncio.gather(
+        run_step("database", lambda: run_in_threadpool(_init_database)),
+        run_step("rag", lambda: run_in_threadpool(enhanced_llm_service.rag.warm_up)),
+        run_step("llm", enhanced_llm_service.warm_up),
+    )
+
+    warmup_state["ready_after_seconds"] = round(time.time() - warmup_state["started_at"], 3)
+    print(f"🔥 Warm-up finished in {warmup_state['ready_after_seconds']}s")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    if test_connection():
-        print("✅ Database connection successful")
-    else:
-        print("❌ Database connection failed")
+    # Startup: accept traffic immediately and warm up in the background
+    warmup_task = asyncio.create_task(warm_up())
     yield
-    # Shutdown (if needed)
+    # Shutdown
+    warmup_task.cancel()
+    from app.services.database_registry import database_registry
+    await database_registry.aclose()
 
 app = FastAPI(
     title="NaturaltoSQL API",
@@ -41,6 +82,15 @@ app.include_router(router, prefix="/api", tags=["SQL Generator"])
 async def root():
     return {"message": "NaturaltoSQL API is running"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the database, RAG and LLM are warm"""
+    is_ready = all(warmup_state[name] for name in ("database", "rag", "llm"))
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={"ready": is_ready, **warmup_state}
+    )
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -51,10 +51,14 @@ const loadSchema = async () => {
     setIsLoading(true);
     setError('');
     try {
-      const response = await sqlApi.generateSql(naturalQuery);
+      setGeneratedSql('');
+      setActiveTab('sql');
+      const response = await sqlApi.generateSqlStream(naturalQuery, {
+        onToken: text => setGeneratedSql(prev => prev + text),
+        onReset: () => setGeneratedSql('')
+      });
       if (response.status === 'success') {
         setGeneratedSql(response.sql);
-        setActiveTab('sql');
       } else {
         setError(response.error || 'Failed to generate SQL');
       }
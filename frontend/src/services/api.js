@@ -67,6 +67,58 @@ export const sqlApi = {
     }
   },
 
+  // Stream SQL generation over Server-Sent Events. Partial SQL arrives through
+  // onToken; onReset means previously streamed text should be discarded.
+  generateSqlStream: async (naturalQuery, { onContext, onToken, onReset } = {}) => {
+    const response = await fetch(`${API_BASE}/generate-sql/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Accept': 'text/event-stream',
+      },
+      body: JSON.stringify({ natural_query: naturalQuery })
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Failed to generate SQL (status ${response.status})`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = null;
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let event = 'message';
+        let data = '';
+        rawEvent.split('\n').forEach(line => {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        });
+        const payload = data ? JSON.parse(data) : {};
+
+        if (event === 'context' && onContext) onContext(payload.items);
+        else if (event === 'token' && onToken) onToken(payload.text);
+        else if (event === 'reset' && onReset) onReset();
+        else if (event === 'done') result = payload;
+        else if (event === 'error') throw new Error(payload.error || 'Failed to generate SQL');
+      }
+    }
+
+    if (!result) {
+      throw new Error('SQL stream ended before completion');
+    }
+    return result;
+  },
+
   executeSql: async (sql) => {
     try {
       const response = await api.post('/execute-sql', { sql });